@@ -0,0 +1,67 @@
+import argparse
+import random
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from database.db_manager import DatabaseManager
+
+# (category_id, share of expense rows, median amount) for the default categories.
+EXPENSE_PROFILE = [
+    (1, 0.38, 45.0),     # food
+    (2, 0.22, 30.0),     # transportation
+    (3, 0.12, 90.0),     # entertainment
+    (4, 0.07, 150.0),    # health
+    (5, 0.05, 400.0),    # education
+    (6, 0.04, 2500.0),   # housing
+    (7, 0.12, 60.0),     # other
+]
+INCOME_CATEGORY = 8
+INCOME_SHARE = 0.06
+
+WORDS = ['مطعم', 'قهوة', 'بقالة', 'وقود', 'تاكسي', 'سينما', 'صيدلية', 'كتب', 'إيجار',
+         'فاتورة', 'هدية', 'اشتراك', 'lunch', 'coffee', 'groceries', 'fuel', 'uber', 'rent']
+
+
+def generate_expenses(rows, seed=42, start=date(2015, 1, 1), days=365 * 10):
+    rng = random.Random(seed)
+    categories = [category_id for category_id, share, median in EXPENSE_PROFILE]
+    weights = [share for category_id, share, median in EXPENSE_PROFILE]
+    medians = {category_id: median for category_id, share, median in EXPENSE_PROFILE}
+
+    for _ in range(rows):
+        day = start + timedelta(days=rng.randrange(days))
+        if rng.random() < INCOME_SHARE:
+            amount = round(rng.lognormvariate(8.5, 0.4), 2)
+            yield (amount, INCOME_CATEGORY, day.isoformat(), 'راتب', 'income')
+            continue
+
+        category_id = rng.choices(categories, weights)[0]
+        amount = round(medians[category_id] * rng.lognormvariate(0, 0.6), 2)
+        description = ' '.join(rng.sample(WORDS, rng.randint(1, 3)))
+        yield (max(amount, 0.01), category_id, day.isoformat(), description, 'expense')
+
+
+def create_database(path, rows, seed=42):
+    path = Path(path)
+    if path.exists():
+        path.unlink()
+    db = DatabaseManager(str(path.resolve()), profile='bulk-import')
+    try:
+        return db.add_expenses_bulk(generate_expenses(rows, seed), chunk_size=20000)
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fill a fresh expenses database with synthetic rows')
+    parser.add_argument('path', help='database file to create (overwritten)')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    stats = create_database(args.path, args.rows, args.seed)
+    print(f"Wrote {stats['rows']} rows to {args.path} in {stats['seconds']:.1f}s "
+          f"({stats['rows_per_sec']:.0f} rows/sec)")
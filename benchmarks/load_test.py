@@ -0,0 +1,139 @@
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from benchmarks.generate import create_database
+
+ROOT = Path(__file__).parent.parent
+
+# (weight, name); each name maps to one request in make_request.
+REQUEST_MIX = [
+    (40, 'page'),
+    (20, 'summary'),
+    (10, 'categories'),
+    (30, 'add'),
+]
+
+
+def make_request(name, rng):
+    if name == 'page':
+        return 'GET', f'/expenses?limit=50&category_id={rng.randint(1, 8)}', None
+    if name == 'summary':
+        return 'GET', f'/summary?year={rng.randint(2015, 2024)}&month={rng.randint(1, 12)}', None
+    if name == 'categories':
+        return 'GET', '/categories', None
+    record = {'amount': round(rng.uniform(1, 200), 2), 'category_id': rng.randint(1, 7),
+              'date': f'2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+              'description': 'load test'}
+    return 'POST', '/expenses', json.dumps(record).encode('utf-8')
+
+
+async def send(reader, writer, host, method, path, body):
+    body = body or b''
+    writer.write((f'{method} {path} HTTP/1.1\r\nHost: {host}\r\n'
+                  f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n').encode('latin-1')
+                 + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def client(host, port, deadline, seed, latencies, errors):
+    rng = random.Random(seed)
+    names = [name for _, name in REQUEST_MIX]
+    weights = [weight for weight, _ in REQUEST_MIX]
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            started = time.perf_counter()
+            status = await send(reader, writer, host, *make_request(name, rng))
+            latencies.setdefault(name, []).append(time.perf_counter() - started)
+            if status >= 400:
+                errors.append((name, status))
+    finally:
+        writer.close()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def run_load(host, port, connections, seconds):
+    latencies, errors = {}, []
+    started = time.perf_counter()
+    deadline = started + seconds
+    await asyncio.gather(*(client(host, port, deadline, seed, latencies, errors)
+                           for seed in range(connections)))
+    return latencies, errors, time.perf_counter() - started
+
+
+def start_server(db_path, pool_size):
+    process = subprocess.Popen(
+        [sys.executable, str(ROOT / 'main.py'), '--serve', '--db', str(db_path), '--port', '0',
+         '--pool-size', str(pool_size)],
+        stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line.startswith('Serving'):
+        process.kill()
+        raise RuntimeError(f'service did not start: {line!r}')
+    host, port = line.rsplit('//', 1)[1].strip().rsplit(':', 1)
+    return process, host, int(port)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load-test the --serve HTTP/JSON service')
+    parser.add_argument('--url', help='host:port of a running service (default: start one)')
+    parser.add_argument('--rows', type=int, default=100000, help='rows in the generated ledger')
+    parser.add_argument('--connections', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--pool-size', type=int, default=4)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        process = None
+        if args.url:
+            host, port = args.url.rsplit(':', 1)
+            port = int(port)
+        else:
+            db_path = Path(workdir) / 'load.db'
+            create_database(db_path, args.rows)
+            process, host, port = start_server(db_path, args.pool_size)
+        try:
+            latencies, errors, seconds = asyncio.run(
+                run_load(host, port, args.connections, args.seconds))
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    every = [value for values in latencies.values() for value in values]
+    print(f'{len(every)} requests over {args.connections} connections in {seconds:.1f}s: '
+          f'{len(every) / seconds:.0f} req/s, {len(errors)} errors')
+    print(f"{'request':<12} {'count':>8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, values in sorted(latencies.items()) + [('all', every)]:
+        print(f'{name:<12} {len(values):8d} {len(values) / seconds:8.0f} '
+              f'{percentile(values, 0.5) * 1000:8.2f} {percentile(values, 0.99) * 1000:8.2f}')
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,57 @@
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from database.db_manager import DatabaseManager
+
+# The listing as it was returned before ExpenseColumns: one sqlite3.Row per
+# expense with the category name and colour joined in.
+ROW_QUERY = '''
+    SELECT e.id, e.amount, c.name, c.color, e.date, e.description, e.type
+    FROM expenses e JOIN categories c ON e.category_id = c.id
+    ORDER BY e.date DESC, e.id DESC
+'''
+
+
+def measure(load):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = load()
+    seconds = time.perf_counter() - started
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, peak, seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Memory used by the full expense listing')
+    parser.add_argument('database', help='existing ledger, e.g. one made by benchmarks/generate.py')
+    args = parser.parse_args()
+
+    db = DatabaseManager(args.database, cache_capacity=0)
+    try:
+        rows, *row_stats = measure(lambda: db.connection.execute(ROW_QUERY).fetchall())
+        count = len(rows)
+        del rows
+        columns, *column_stats = measure(db.get_all_expenses)
+        nbytes = columns.nbytes()
+    finally:
+        db.close()
+
+    print(f'rows: {count}')
+    print(f"{'layout':<16} {'retained MB':>12} {'peak MB':>9} {'bytes/row':>10} {'load s':>8}")
+    for name, (current, peak, seconds) in (('sqlite3.Row', row_stats),
+                                           ('ExpenseColumns', column_stats)):
+        print(f'{name:<16} {current / 2**20:12.1f} {peak / 2**20:9.1f} '
+              f'{current / max(count, 1):10.1f} {seconds:8.2f}')
+    print(f'ExpenseColumns.nbytes(): {nbytes / 2**20:.1f} MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from database.db_manager import DatabaseManager, ExpenseFilter
+from benchmarks.generate import create_database, generate_expenses
+
+YEAR, MONTH = 2022, 6
+
+
+def time_call(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def summarize(timings):
+    return {'median': statistics.median(timings), 'min': min(timings), 'runs': len(timings)}
+
+
+def db_benchmarks(db):
+    def add_and_delete():
+        db.delete_expense(db.add_expense(12.5, 1, f'{YEAR}-{MONTH:02d}-15', 'benchmark'))
+
+    def bulk_and_delete():
+        first = db.connection.execute('SELECT COALESCE(MAX(id), 0) FROM expenses').fetchone()[0]
+        db.add_expenses_bulk(generate_expenses(1000, seed=7))
+        db.connection.execute('DELETE FROM expenses WHERE id > ?', (first,))
+        db.connection.commit()
+
+    # Key of the row a deep offset would land on, so both paging styles start at the same depth.
+    deep_row = db.connection.execute(
+        'SELECT date, id FROM expenses ORDER BY date DESC, id DESC LIMIT 1 OFFSET 100000').fetchone()
+    deep_key = tuple(deep_row) if deep_row else None
+
+    return {
+        'db.add_expense+delete_expense': add_and_delete,
+        'db.add_expenses_bulk_1000+delete': bulk_and_delete,
+        'db.get_all_expenses': db.get_all_expenses,
+        'db.get_expenses_slice_first': lambda: db.get_expenses_slice(0, 200),
+        'db.get_expenses_slice_deep': lambda: db.get_expenses_slice(100000, 200),
+        'db.get_expenses_page_first': lambda: db.get_expenses_page(None, 200),
+        'db.get_expenses_page_deep': lambda: db.get_expenses_page(deep_key, 200),
+        'db.count_expenses_range': lambda: db.count_expenses(
+            ExpenseFilter(category_id=1, start=f'{YEAR - 2}-03-15', end=f'{YEAR}-09-10')),
+        'db.get_expenses_by_month': lambda: db.get_expenses_by_month(YEAR, MONTH),
+        'db.get_category_summary': lambda: db.get_category_summary(YEAR, MONTH),
+        'db.get_balance': lambda: db.get_balance(f'{YEAR}-{MONTH:02d}-20'),
+        'db.get_daily_balances_month': lambda: db.get_daily_balances(*db.month_range(YEAR, MONTH)),
+        'db.get_categories': db.get_categories,
+        'db.iter_expenses_year': lambda: sum(len(batch) for batch in db.iter_expenses(YEAR)),
+        'db.verify_category_totals': db.verify_category_totals,
+        'db.search_expenses_prefix': lambda: db.search_expenses('co', 100),
+        'db.search_expenses_words': lambda: db.search_expenses('coffee rent', 100),
+    }
+
+
+def run_db_benchmarks(db_path, repeat):
+    # The query cache is disabled so every call reaches SQLite.
+    db = DatabaseManager(str(db_path), cache_capacity=0)
+    try:
+        results = {name: summarize(time_call(func, repeat))
+                   for name, func in db_benchmarks(db).items()}
+    finally:
+        db.close()
+
+    results.update(run_analytics_benchmarks(db_path, repeat))
+
+    cached = DatabaseManager(str(db_path))
+    try:
+        cached.get_category_summary(YEAR, MONTH)
+        results['db.get_category_summary_cached'] = summarize(
+            time_call(lambda: cached.get_category_summary(YEAR, MONTH), repeat))
+    finally:
+        cached.close()
+    return results
+
+
+def run_analytics_benchmarks(db_path, repeat):
+    from utils.analytics import ExpenseSnapshot
+
+    db = DatabaseManager(str(db_path))
+    try:
+        snapshot = ExpenseSnapshot.load(db)
+        load = summarize(time_call(lambda: ExpenseSnapshot.load(db), repeat))
+    finally:
+        db.close()
+
+    def dashboard():
+        snapshot._matrices.clear()
+        snapshot.dashboard()
+
+    return {
+        'analytics.load_snapshot': load,
+        'analytics.dashboard': summarize(time_call(dashboard, repeat)),
+    }
+
+
+def run_gui_benchmarks(db_path, repeat):
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtCore import QEventLoop
+    from PyQt5.QtWidgets import QApplication
+    from gui.main_window import MainWindow
+
+    app = QApplication.instance() or QApplication([])
+
+    def wait_until(predicate, timeout=60):
+        deadline = time.perf_counter() + timeout
+        while not predicate():
+            if time.perf_counter() > deadline:
+                raise TimeoutError('GUI did not settle')
+            app.processEvents(QEventLoop.AllEvents, 10)
+
+    def cold_start():
+        loaded = []
+        started = MainWindow(str(db_path))
+        started.expenses_model.page_loaded.connect(loaded.append)
+        started.show()
+        wait_until(lambda: loaded)
+        started.close()
+
+    window = MainWindow(str(db_path))
+    window.show()
+    window.ensure_tab(window.tab_charts)
+    window.ensure_tab(window.tab_reports)
+    for combo in (window.year_combo, window.report_year_combo):
+        combo.setCurrentText(str(YEAR))
+    for combo in (window.month_combo, window.report_month_combo):
+        combo.setCurrentIndex(MONTH - 1)
+    wait_until(lambda: not window.executor.is_busy())
+
+    model = window.expenses_model
+
+    def load_data():
+        window.load_data()
+        wait_until(lambda: model.rowCount() > 0 or not model.canFetchMore())
+        wait_until(lambda: not window.executor.is_busy())
+
+    def refresh(method):
+        def run():
+            method()
+            wait_until(lambda: not window.executor.is_busy())
+        return run
+
+    try:
+        return {
+            'gui.cold_start': summarize(time_call(cold_start, repeat)),
+            'gui.load_data': summarize(time_call(load_data, repeat)),
+            'gui.update_charts': summarize(time_call(refresh(window.update_charts), repeat)),
+            'gui.update_reports': summarize(time_call(refresh(window.update_reports), repeat)),
+        }
+    finally:
+        window.close()
+
+
+def compare(results, baseline, threshold, min_delta=0.0005):
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get('results', {}).get(name)
+        if previous is None or previous['median'] <= 0:
+            continue
+        ratio = current['median'] / previous['median']
+        # Sub-millisecond timings jitter by more than any sensible threshold.
+        if ratio > 1 + threshold and current['median'] - previous['median'] > min_delta:
+            regressions.append((name, previous['median'], current['median'], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time DatabaseManager and MainWindow refresh paths')
+    parser.add_argument('--rows', type=int, default=100000, help='synthetic rows to generate (10k-10M)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--db', help='benchmark an existing database instead of generating one')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline', help='results file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='fail when a median is this much slower than the baseline (0.25 = 25%%)')
+    parser.add_argument('--min-delta-ms', type=float, default=0.5,
+                        help='ignore slowdowns smaller than this many milliseconds')
+    parser.add_argument('--no-gui', action='store_true', help='skip the MainWindow benchmarks')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.db:
+            db_path = Path(args.db).resolve()
+        else:
+            db_path = Path(workdir) / 'bench.db'
+            stats = create_database(db_path, args.rows, args.seed)
+            print(f"Generated {stats['rows']} rows in {stats['seconds']:.1f}s")
+
+        results = run_db_benchmarks(db_path, args.repeat)
+        if not args.no_gui:
+            results.update(run_gui_benchmarks(db_path, args.repeat))
+
+    report = {
+        'meta': {
+            'rows': None if args.db else args.rows,
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as handle:
+        json.dump(report, handle, indent=2, sort_keys=True)
+
+    for name, result in sorted(results.items()):
+        print(f"{name:<40} median {result['median'] * 1000:10.3f} ms   min {result['min'] * 1000:10.3f} ms")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as handle:
+            regressions = compare(results, json.load(handle), args.threshold,
+                                  args.min_delta_ms / 1000)
+        for name, before, after, ratio in regressions:
+            print(f'REGRESSION {name}: {before * 1000:.3f} ms -> {after * 1000:.3f} ms ({ratio:.2f}x)')
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,49 @@
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from database.db_manager import DatabaseManager, DURABILITY_MODES
+from benchmarks.generate import create_database, generate_expenses
+
+
+def run_mode(path, durability, records):
+    db = DatabaseManager(str(path), cache_capacity=0, durability=durability)
+    try:
+        started = time.perf_counter()
+        ids = [db.add_expense(*record) for record in records]
+        for expense_id in ids[::4]:
+            db.delete_expense(expense_id)
+        db.flush()
+        seconds = time.perf_counter() - started
+        return db.write_info(), seconds
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Single-row write throughput per durability mode (add_expense / delete_expense)')
+    parser.add_argument('--rows', type=int, default=100000, help='rows in the generated ledger')
+    parser.add_argument('--writes', type=int, default=5000, help='add_expense calls per mode')
+    args = parser.parse_args()
+
+    records = list(generate_expenses(args.writes, seed=11))
+    with tempfile.TemporaryDirectory() as workdir:
+        template = Path(workdir) / 'template.db'
+        create_database(template, args.rows)
+        print(f"{'durability':<12} {'writes':>8} {'commits':>8} {'seconds':>8} {'writes/s':>10}")
+        for durability in DURABILITY_MODES:
+            path = Path(workdir) / f'{durability}.db'
+            shutil.copy(template, path)
+            info, seconds = run_mode(path, durability, records)
+            print(f"{durability:<12} {info['writes']:8d} {info['commits']:8d} {seconds:8.2f} "
+                  f"{info['writes'] / seconds:10.0f}")
+
+
+if __name__ == '__main__':
+    main()
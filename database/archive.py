@@ -0,0 +1,198 @@
+import logging
+import time
+from collections import namedtuple
+from datetime import date, datetime
+
+from database.migrations import create_expenses_table, create_search_table
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_BATCH_SIZE = 10000
+
+ArchiveReport = namedtuple('ArchiveReport', 'year path rows total seconds mismatches')
+
+
+def create_archive_tables(cursor, schema):
+    create_expenses_table(cursor, f'{schema}.expenses')
+    cursor.execute(f'''
+        CREATE INDEX IF NOT EXISTS {schema}.idx_expenses_date_category_type_amount
+        ON expenses (date, category_id, type, amount)
+    ''')
+    cursor.execute(f'''
+        CREATE INDEX IF NOT EXISTS {schema}.idx_expenses_date_id
+        ON expenses (date DESC, id DESC)
+    ''')
+    cursor.execute(f'''
+        CREATE INDEX IF NOT EXISTS {schema}.idx_expenses_category_date_id
+        ON expenses (category_id, date DESC, id DESC)
+    ''')
+    create_archive_search(cursor, schema)
+
+
+def create_archive_search(cursor, schema):
+    # Each archive file keeps its own description index. Triggers in an
+    # attached file can only reach that file, which is all they need here.
+    names = {name for (name,) in cursor.execute(f'''
+        SELECT name FROM {schema}.sqlite_master WHERE name IN ('expenses', 'expenses_fts')
+    ''')}
+    if names != {'expenses'}:
+        return False
+    create_search_table(cursor, schema)
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {schema}.trg_expenses_fts_insert
+        AFTER INSERT ON expenses
+        BEGIN
+            INSERT INTO expenses_fts (rowid, description) VALUES (NEW.id, NEW.description);
+        END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {schema}.trg_expenses_fts_delete
+        AFTER DELETE ON expenses
+        BEGIN
+            INSERT INTO expenses_fts (expenses_fts, rowid, description)
+            VALUES ('delete', OLD.id, OLD.description);
+        END
+    ''')
+    # Archives made before they had an index get one from their rows.
+    cursor.execute(f"INSERT INTO {schema}.expenses_fts (expenses_fts) VALUES ('rebuild')")
+    return True
+
+
+def remove_archived(cursor, schema, expense_id):
+    # Deletes one row from an archive file. The main file's triggers do not
+    # see it, so its monthly total and balance checkpoints are adjusted here
+    # the way trg_expenses_totals_delete and trg_expenses_balance_delete do.
+    row = cursor.execute(f'''
+        SELECT amount, category_id, date, type FROM {schema}.expenses WHERE id = ?
+    ''', (expense_id,)).fetchone()
+    if row is None:
+        return False
+    amount, category_id, day, expense_type = row
+    period, year = day[:7], day[:4]
+    signed = amount if expense_type == 'income' else -amount
+
+    cursor.execute(f'DELETE FROM {schema}.expenses WHERE id = ?', (expense_id,))
+    cursor.execute('''
+        UPDATE monthly_category_totals
+        SET total = total - ?, count = count - 1
+        WHERE period = ? AND category_id = ? AND type = ?
+    ''', (amount, period, category_id, expense_type))
+    cursor.execute('''
+        DELETE FROM monthly_category_totals
+        WHERE period = ? AND category_id = ? AND type = ? AND count <= 0
+    ''', (period, category_id, expense_type))
+    cursor.execute('''
+        UPDATE balance_checkpoints
+        SET balance = balance - ?, count = count - (period = ?)
+        WHERE period >= ?
+    ''', (signed, year, year))
+    cursor.execute('DELETE FROM balance_checkpoints WHERE period = ? AND count <= 0', (year,))
+    cursor.execute('UPDATE archives SET rows = rows - 1, total = total - ? WHERE year = ?',
+                   (amount, int(year)))
+    return True
+
+
+def month_totals(connection, source, start, end):
+    # {period: (rows, total in minor units)} for one year of one source.
+    return {period: (rows, total) for period, rows, total in connection.execute(f'''
+        SELECT substr(date, 1, 7), COUNT(*), SUM(amount)
+        FROM {source}
+        WHERE date >= ? AND date < ?
+        GROUP BY substr(date, 1, 7)
+    ''', (start, end))}
+
+
+def log_progress(year, done, total):
+    logger.info('Archiving %d: %d/%d rows', year, done, total)
+
+
+def archive_year(db, year, batch_size=ARCHIVE_BATCH_SIZE, progress=log_progress):
+    # Moves every row dated in `year` from the main database into its archive
+    # file, one batch per transaction. The rollups keep covering archived rows,
+    # so summaries and balances do not change. Safe to re-run after an
+    # interruption: rows already copied are skipped and the move carries on.
+    year = int(year)
+    if year >= date.today().year:
+        raise ValueError(f'{year} is not closed yet; only past years can be archived')
+    start, end = f'{year:04d}-01-01', f'{year + 1:04d}-01-01'
+    db.flush()
+    connection = db.connection
+    started = time.perf_counter()
+
+    path = db.archive_path(year)
+    connection.execute('INSERT OR IGNORE INTO archives (year, path) VALUES (?, ?)', (year, path.name))
+    connection.commit()
+    schema = db.attach_archive(year)
+    cursor = connection.cursor()
+    create_archive_tables(cursor, schema)
+    connection.commit()
+
+    # UNION rather than UNION ALL: after an interrupted run a batch can be in
+    # both files, and it must only be counted once.
+    expected = month_totals(connection, f'(SELECT * FROM expenses UNION SELECT * FROM {schema}.expenses)',
+                            start, end)
+    total_rows = connection.execute(
+        'SELECT COUNT(*) FROM expenses WHERE date >= ? AND date < ?', (start, end)).fetchone()[0]
+    cursor.execute('CREATE TEMP TABLE IF NOT EXISTS archive_batch (id INTEGER PRIMARY KEY)')
+    moved = 0
+
+    while True:
+        cursor.execute('BEGIN')
+        try:
+            cursor.execute('DELETE FROM temp.archive_batch')
+            cursor.execute('''
+                INSERT INTO temp.archive_batch (id)
+                SELECT id FROM expenses WHERE date >= ? AND date < ? LIMIT ?
+            ''', (start, end, batch_size))
+            batch = cursor.rowcount
+            if batch <= 0:
+                connection.rollback()
+                break
+
+            cursor.execute(f'''
+                INSERT OR IGNORE INTO {schema}.expenses (id, amount, category_id, date, description, type)
+                SELECT id, amount, category_id, date, description, type
+                FROM expenses WHERE id IN (SELECT id FROM temp.archive_batch)
+            ''')
+            # The delete triggers take the batch out of the rollups, so it is
+            # added once more first; the rollups then still cover these rows.
+            cursor.execute('''
+                INSERT INTO monthly_category_totals (period, category_id, type, total, count)
+                SELECT substr(date, 1, 7), category_id, type, SUM(amount), COUNT(*)
+                FROM expenses WHERE id IN (SELECT id FROM temp.archive_batch)
+                GROUP BY substr(date, 1, 7), category_id, type
+                ON CONFLICT (period, category_id, type)
+                DO UPDATE SET total = total + excluded.total, count = count + excluded.count
+            ''')
+            cursor.execute('''
+                UPDATE balance_checkpoints
+                SET balance = balance + (
+                        SELECT SUM(CASE type WHEN 'income' THEN amount ELSE -amount END)
+                        FROM expenses WHERE id IN (SELECT id FROM temp.archive_batch)),
+                    count = count + (period = ?) * ?
+                WHERE period >= ?
+            ''', (str(year), batch, str(year)))
+            cursor.execute('DELETE FROM expenses WHERE id IN (SELECT id FROM temp.archive_batch)')
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        moved += batch
+        progress(year, moved, total_rows)
+
+    actual = month_totals(connection, f'{schema}.expenses', start, end)
+    remaining = connection.execute(
+        'SELECT COUNT(*) FROM expenses WHERE date >= ? AND date < ?', (start, end)).fetchone()[0]
+    mismatches = [(period, expected.get(period), actual.get(period))
+                  for period in sorted(set(expected) | set(actual))
+                  if expected.get(period) != actual.get(period)]
+    if remaining:
+        mismatches.append(('main', remaining, 0))
+
+    rows = sum(count for count, _ in actual.values())
+    total = sum(amount for _, amount in actual.values())
+    connection.execute('UPDATE archives SET rows = ?, total = ?, archived_at = ? WHERE year = ?',
+                       (rows, total, datetime.now().isoformat(timespec='seconds'), year))
+    connection.commit()
+    db.invalidate_cache()
+    return ArchiveReport(year, path, rows, total, time.perf_counter() - started, mismatches)
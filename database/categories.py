@@ -0,0 +1,44 @@
+from collections import namedtuple
+
+Category = namedtuple('Category', 'id name color')
+
+
+class CategoryRegistry:
+    def __init__(self, connection):
+        self.connection = connection
+        self.version = 0
+        self._by_id = {}
+        self._ordered = []
+        self.refresh()
+
+    def refresh(self):
+        rows = self.connection.execute('SELECT id, name, color FROM categories ORDER BY name')
+        self._ordered = [Category(row[0], row[1], row[2]) for row in rows]
+        self._by_id = {category.id: category for category in self._ordered}
+        self.version += 1
+
+    def __getitem__(self, category_id):
+        return self._by_id[category_id]
+
+    def __contains__(self, category_id):
+        return category_id in self._by_id
+
+    def __iter__(self):
+        return iter(self._ordered)
+
+    def __len__(self):
+        return len(self._ordered)
+
+    def get(self, category_id, default=None):
+        return self._by_id.get(category_id, default)
+
+    def ids(self):
+        return set(self._by_id)
+
+    def name(self, category_id):
+        category = self._by_id.get(category_id)
+        return category.name if category is not None else ''
+
+    def color(self, category_id):
+        category = self._by_id.get(category_id)
+        return category.color if category is not None else None
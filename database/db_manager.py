@@ -1,118 +1,977 @@
-import sqlite3
-from datetime import datetime
-from pathlib import Path
-
-class DatabaseManager:
-    def __init__(self, db_name='expenses.db'):
-        self.db_path = Path(__file__).parent / db_name
-        self.connection = None
-        self.init_database()
-    
-    def init_database(self):
-        self.connection = sqlite3.connect(str(self.db_path))
-        self.connection.row_factory = sqlite3.Row
-        self.create_tables()
-    
-    def create_tables(self):
-        cursor = self.connection.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS categories (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT UNIQUE NOT NULL,
-                color TEXT DEFAULT '#FF6B6B'
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS expenses (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                amount REAL NOT NULL,
-                category_id INTEGER NOT NULL,
-                date TEXT NOT NULL,
-                description TEXT,
-                type TEXT CHECK(type IN ('expense', 'income')) DEFAULT 'expense',
-                FOREIGN KEY(category_id) REFERENCES categories(id)
-            )
-        ''')
-        
-        self.connection.commit()
-        self.insert_default_categories()
-    
-    def insert_default_categories(self):
-        cursor = self.connection.cursor()
-        default_categories = [
-            ('طعام', '#FF6B6B'),
-            ('مواصلات', '#4ECDC4'),
-            ('ترفيه', '#FFE66D'),
-            ('صحة', '#95E1D3'),
-            ('تعليم', '#C7CEEA'),
-            ('مسكن', '#FFDAB9'),
-            ('أخرى', '#BDB2FF'),
-            ('دخل', '#52B788')
-        ]
-        
-        for category, color in default_categories:
-            try:
-                cursor.execute('INSERT INTO categories (name, color) VALUES (?, ?)',
-                              (category, color))
-            except sqlite3.IntegrityError:
-                pass
-        
-        self.connection.commit()
-    
-    def add_expense(self, amount, category_id, date, description, expense_type='expense'):
-        cursor = self.connection.cursor()
-        cursor.execute('''
-            INSERT INTO expenses (amount, category_id, date, description, type)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (amount, category_id, date, description, expense_type))
-        self.connection.commit()
-        return cursor.lastrowid
-    
-    def get_all_expenses(self):
-        cursor = self.connection.cursor()
-        cursor.execute('''
-            SELECT e.id, e.amount, c.name as category, e.date, e.description, e.type, c.color
-            FROM expenses e
-            JOIN categories c ON e.category_id = c.id
-            ORDER BY e.date DESC
-        ''')
-        return cursor.fetchall()
-    
-    def get_expenses_by_month(self, year, month):
-        cursor = self.connection.cursor()
-        cursor.execute('''
-            SELECT e.id, e.amount, c.name as category, e.date, e.description, e.type, c.color
-            FROM expenses e
-            JOIN categories c ON e.category_id = c.id
-            WHERE strftime('%Y', e.date) = ? AND strftime('%m', e.date) = ?
-            ORDER BY e.date DESC
-        ''', (str(year), f'{month:02d}'))
-        return cursor.fetchall()
-    
-    def get_category_summary(self, year, month):
-        cursor = self.connection.cursor()
-        cursor.execute('''
-            SELECT c.name, c.color, SUM(e.amount) as total, e.type
-            FROM expenses e
-            JOIN categories c ON e.category_id = c.id
-            WHERE strftime('%Y', e.date) = ? AND strftime('%m', e.date) = ?
-            GROUP BY c.id, e.type
-            ORDER BY total DESC
-        ''', (str(year), f'{month:02d}'))
-        return cursor.fetchall()
-    
-    def get_categories(self):
-        cursor = self.connection.cursor()
-        cursor.execute('SELECT id, name, color FROM categories ORDER BY name')
-        return cursor.fetchall()
-    
-    def delete_expense(self, expense_id):
-        cursor = self.connection.cursor()
-        cursor.execute('DELETE FROM expenses WHERE id = ?', (expense_id,))
-        self.connection.commit()
-    
-    def close(self):
-        if self.connection:
-            self.connection.close()
+import functools
+import heapq
+import re
+import sqlite3
+import time
+from collections import namedtuple, OrderedDict
+from datetime import date, timedelta
+from itertools import chain, islice
+from pathlib import Path
+from urllib.parse import quote
+
+from database.archive import create_archive_search, remove_archived
+from database.categories import CategoryRegistry
+from database.migrations import MIGRATIONS, current_version, run_migrations
+from database.money import to_minor_units, from_minor_units
+from database.recurring import RecurringRule, RULE_COLUMNS, occurrences, project
+from database.results import ExpenseColumns, select_columns
+from utils.diagnostics import diagnostics, TracedConnection
+
+# Default number of newest matches search_expenses ranks with bm25.
+SEARCH_RANK_WINDOW = 2000
+# SQLite's default SQLITE_MAX_ATTACHED; archives beyond it are detached LRU-first,
+# and reads over more archived years than this go one group at a time.
+MAX_ATTACHED_ARCHIVES = 10
+
+# Balance of everything dated before :before, in minor units: the closing
+# checkpoint of the previous year, this year's earlier months from the
+# monthly rollup, then the rows of the month itself up to :before.
+# {expenses} is the source returned by DatabaseManager._expenses_from().
+BALANCE_BEFORE_SQL = '''
+    COALESCE((SELECT balance FROM balance_checkpoints
+              WHERE period < substr(:before, 1, 4)
+              ORDER BY period DESC LIMIT 1), 0)
+    + COALESCE((SELECT SUM(CASE type WHEN 'income' THEN total ELSE -total END)
+                FROM monthly_category_totals
+                WHERE period >= substr(:before, 1, 4) AND period < substr(:before, 1, 7)), 0)
+    + COALESCE((SELECT SUM(CASE type WHEN 'income' THEN amount ELSE -amount END)
+                FROM {expenses}
+                WHERE date >= substr(:before, 1, 7) AND date < :before), 0)
+'''
+
+# How writes through add/update/delete_expense reach the disk:
+#   immediate - committed before the call returns
+#   grouped   - left in the open transaction and committed every
+#               GROUP_COMMIT_ROWS writes or GROUP_COMMIT_INTERVAL seconds
+#   relaxed   - grouped, with synchronous = OFF on the connection
+DURABILITY_MODES = ('immediate', 'grouped', 'relaxed')
+GROUP_COMMIT_ROWS = 500
+GROUP_COMMIT_INTERVAL = 0.05
+
+CONNECTION_PROFILES = {
+    'interactive': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -16000,
+        'mmap_size': 64 * 1024 * 1024,
+        'temp_store': 'MEMORY'
+    },
+    'bulk-import': {
+        'journal_mode': 'WAL',
+        'synchronous': 'OFF',
+        'cache_size': -256000,
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY'
+    }
+}
+
+
+# Optional listing filters; start and end are ISO dates, end exclusive.
+ExpenseFilter = namedtuple('ExpenseFilter', 'category_id type start end', defaults=(None,) * 4)
+
+ExpenseChange = namedtuple(
+    'ExpenseChange',
+    'kind expense_id amount category_id date description type previous',
+    defaults=(None,) * 7
+)
+
+
+def cached_query(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.cache_capacity <= 0:
+            return method(self, *args, **kwargs)
+        cache = self._query_cache
+        version = (self._write_version, self.data_version())
+        if version != self._cache_version:
+            if cache:
+                self.cache_stats['invalidations'] += 1
+                cache.clear()
+            self._cache_version = version
+        
+        key = (method.__name__,) + args + tuple(sorted(kwargs.items()))
+        if key in cache:
+            cache.move_to_end(key)
+            self.cache_stats['hits'] += 1
+            return cache[key]
+        
+        self.cache_stats['misses'] += 1
+        result = method(self, *args, **kwargs)
+        cache[key] = result
+        if len(cache) > self.cache_capacity:
+            cache.popitem(last=False)
+            self.cache_stats['evictions'] += 1
+        return result
+    return wrapper
+
+
+class DatabaseManager:
+    def __init__(self, db_name='expenses.db', check_same_thread=True, profile='interactive',
+                 cache_capacity=128, durability='immediate', commit_rows=GROUP_COMMIT_ROWS,
+                 commit_interval=GROUP_COMMIT_INTERVAL, read_only=False):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f'unknown durability mode {durability!r}')
+        self.db_path = Path(__file__).parent / db_name
+        self.check_same_thread = check_same_thread
+        self.profile = profile
+        self.read_only = read_only
+        self.connection = None
+        self.applied_migrations = []
+        self.change_listeners = []
+        self.cache_capacity = cache_capacity
+        self.cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+        self._query_cache = OrderedDict()
+        self._write_version = 0
+        self._cache_version = None
+        self._attached = OrderedDict()
+        self.durability = durability
+        self.commit_rows = commit_rows
+        self.commit_interval = commit_interval
+        self.write_stats = {'writes': 0, 'commits': 0}
+        self._pending_writes = 0
+        self._pending_since = 0.0
+        self.init_database()
+    
+    def init_database(self):
+        self.connection = sqlite3.connect(self._uri(self.db_path) if self.read_only else str(self.db_path),
+                                          detect_types=sqlite3.PARSE_COLNAMES,
+                                          check_same_thread=self.check_same_thread,
+                                          factory=TracedConnection if diagnostics.enabled else sqlite3.Connection,
+                                          uri=self.read_only)
+        self.connection.row_factory = sqlite3.Row
+        if self.read_only:
+            self.open_read_only()
+            return
+        self.apply_profile(self.profile)
+        if self.durability == 'relaxed':
+            self.connection.execute('PRAGMA synchronous = OFF')
+        self.create_tables()
+    
+    def create_tables(self):
+        self.applied_migrations = run_migrations(self.connection)
+        self.insert_default_categories()
+        self.categories = CategoryRegistry(self.connection)
+    
+    def open_read_only(self):
+        # No migrations, pragmas or default categories: the file is left
+        # exactly as it was, so one that is behind cannot be read.
+        version, latest = current_version(self.connection), MIGRATIONS[-1].version
+        if version != latest:
+            self.connection.close()
+            raise ValueError(f'{self.db_path.name} has schema version {version}, not {latest}; '
+                             f'open it once with the application to upgrade it')
+        self.categories = CategoryRegistry(self.connection)
+    
+    @staticmethod
+    def _uri(path):
+        return f'file:{quote(str(path))}?mode=ro'
+    
+    def apply_profile(self, profile):
+        for pragma, value in CONNECTION_PROFILES[profile].items():
+            self.connection.execute(f'PRAGMA {pragma} = {value}')
+        self.profile = profile
+    
+    def insert_default_categories(self):
+        cursor = self.connection.cursor()
+        default_categories = [
+            ('طعام', '#FF6B6B'),
+            ('مواصلات', '#4ECDC4'),
+            ('ترفيه', '#FFE66D'),
+            ('صحة', '#95E1D3'),
+            ('تعليم', '#C7CEEA'),
+            ('مسكن', '#FFDAB9'),
+            ('أخرى', '#BDB2FF'),
+            ('دخل', '#52B788')
+        ]
+        
+        # Only missing names are inserted, so opening another connection does
+        # not wait for the write lock while a grouped commit is pending.
+        existing = {row[0] for row in cursor.execute('SELECT name FROM categories')}
+        for category, color in default_categories:
+            if category in existing:
+                continue
+            try:
+                cursor.execute('INSERT INTO categories (name, color) VALUES (?, ?)',
+                              (category, color))
+            except sqlite3.IntegrityError:
+                pass
+        
+        self.connection.commit()
+        self.invalidate_cache()
+    
+    def data_version(self):
+        return self.connection.execute('PRAGMA data_version').fetchone()[0]
+    
+    def invalidate_cache(self):
+        self._write_version += 1
+    
+    def cache_info(self):
+        return dict(self.cache_stats, size=len(self._query_cache), capacity=self.cache_capacity)
+    
+    def write_info(self):
+        return dict(self.write_stats, pending=self._pending_writes, durability=self.durability)
+    
+    def _written(self):
+        # Pending writes stay in the open transaction, so every read through
+        # this manager already sees them; other connections see them once
+        # the group is committed.
+        self._pending_writes += 1
+        self.write_stats['writes'] += 1
+        if self._pending_writes == 1:
+            self._pending_since = time.monotonic()
+        if self.durability == 'immediate' or self._pending_writes >= self.commit_rows:
+            self.flush()
+        else:
+            self.flush_if_due()
+    
+    def flush_if_due(self):
+        # For callers with an event loop: commits a group that has waited
+        # commit_interval seconds without another write arriving.
+        if self._pending_writes and time.monotonic() - self._pending_since >= self.commit_interval:
+            self.flush()
+    
+    def flush(self):
+        if self.connection.in_transaction:
+            self.connection.commit()
+            self.write_stats['commits'] += 1
+        self._pending_writes = 0
+    
+    def add_expense(self, amount, category_id, date, description, expense_type='expense'):
+        cursor = self.connection.cursor()
+        cursor.execute('''
+            INSERT INTO expenses (amount, category_id, date, description, type)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (to_minor_units(amount), category_id, date, description, expense_type))
+        self._written()
+        self.notify_change(ExpenseChange('inserted', cursor.lastrowid,
+                                         from_minor_units(to_minor_units(amount)),
+                                         category_id, date, description, expense_type))
+        return cursor.lastrowid
+    
+    def update_expense(self, expense_id, amount, category_id, date, description, expense_type='expense'):
+        schema, previous = self._locate('deleted', expense_id)
+        if previous is None:
+            return False
+        cursor = self.connection.cursor()
+        if schema == 'main':
+            cursor.execute('''
+                UPDATE expenses
+                SET amount = ?, category_id = ?, date = ?, description = ?, type = ?
+                WHERE id = ?
+            ''', (to_minor_units(amount), category_id, date, description, expense_type, expense_id))
+        else:
+            # An edited archived row moves back to the main file under the same
+            # id, like a row added to an archived year, until it is archived again.
+            remove_archived(cursor, schema, expense_id)
+            cursor.execute('''
+                INSERT INTO expenses (id, amount, category_id, date, description, type)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (expense_id, to_minor_units(amount), category_id, date, description, expense_type))
+        self._written()
+        self.notify_change(ExpenseChange('updated', expense_id,
+                                         from_minor_units(to_minor_units(amount)),
+                                         category_id, date, description, expense_type, previous))
+        return True
+    
+    def add_expenses_bulk(self, records, chunk_size=1000):
+        # A failed import rolls back, so pending single writes are committed first.
+        self.flush()
+        category_ids = self.categories.ids()
+        cursor = self.connection.cursor()
+        rows_iter = (self._expense_params(record, category_ids, index)
+                     for index, record in enumerate(records))
+        inserted = 0
+        started = time.perf_counter()
+        
+        try:
+            while True:
+                chunk = list(islice(rows_iter, chunk_size))
+                if not chunk:
+                    break
+                cursor.executemany('''
+                    INSERT INTO expenses (amount, category_id, date, description, type)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', chunk)
+                inserted += len(chunk)
+            self.flush()
+        except Exception:
+            self.connection.rollback()
+            raise
+        
+        seconds = time.perf_counter() - started
+        if inserted:
+            self.notify_change(ExpenseChange('bulk_inserted'))
+        return {
+            'rows': inserted,
+            'seconds': seconds,
+            'rows_per_sec': inserted / seconds if seconds > 0 else 0.0
+        }
+    
+    def add_expense_groups(self, groups):
+        # Inserts independent groups of records with a single commit. Returns,
+        # per group, the new ids or the error that rejected it; a rejected
+        # group leaves no rows behind and does not affect the others.
+        self.flush()
+        category_ids = self.categories.ids()
+        cursor = self.connection.cursor()
+        results = []
+        
+        cursor.execute('BEGIN')
+        try:
+            for group in groups:
+                cursor.execute('SAVEPOINT expense_group')
+                try:
+                    ids = []
+                    for index, record in enumerate(group):
+                        cursor.execute('''
+                            INSERT INTO expenses (amount, category_id, date, description, type)
+                            VALUES (?, ?, ?, ?, ?)
+                        ''', self._expense_params(record, category_ids, index))
+                        ids.append(cursor.lastrowid)
+                except (ValueError, KeyError, TypeError, ArithmeticError, sqlite3.IntegrityError) as error:
+                    cursor.execute('ROLLBACK TO expense_group')
+                    results.append(error)
+                else:
+                    results.append(ids)
+                cursor.execute('RELEASE expense_group')
+            self.flush()
+        except Exception:
+            self.connection.rollback()
+            raise
+        
+        if any(isinstance(result, list) and result for result in results):
+            self.notify_change(ExpenseChange('bulk_inserted'))
+        return results
+    
+    @staticmethod
+    def _expense_params(record, category_ids, index):
+        if isinstance(record, dict):
+            params = (record['amount'], record['category_id'], record['date'],
+                      record.get('description'), record.get('type', 'expense'))
+        else:
+            params = tuple(record)
+            if len(params) == 4:
+                params += ('expense',)
+        params = (to_minor_units(params[0]),) + params[1:]
+        
+        if params[1] not in category_ids:
+            raise ValueError(f'Record {index}: unknown category_id {params[1]!r}')
+        if params[4] not in ('expense', 'income'):
+            raise ValueError(f'Record {index}: invalid type {params[4]!r}')
+        return params
+    
+    def _columns_cursor(self):
+        cursor = self.connection.cursor()
+        cursor.row_factory = None
+        return cursor
+    
+    def archive_path(self, year):
+        return self.db_path.with_name(f'{self.db_path.stem}_{int(year)}{self.db_path.suffix}')
+    
+    def attach_archive(self, year):
+        schema = f'archive_{int(year)}'
+        if schema in self._attached:
+            self._attached.move_to_end(schema)
+            return schema
+        # ATTACH and DETACH fail inside a transaction, so a pending group is committed first.
+        if self._pending_writes:
+            self.flush()
+        if len(self._attached) >= MAX_ATTACHED_ARCHIVES:
+            oldest, _ = self._attached.popitem(last=False)
+            self.connection.execute(f'DETACH DATABASE {oldest}')
+        path = self.archive_path(year)
+        self.connection.execute(f'ATTACH DATABASE ? AS {schema}',
+                                (self._uri(path) if self.read_only else str(path),))
+        self._attached[schema] = None
+        if not self.read_only and create_archive_search(self.connection.cursor(), schema):
+            self.connection.commit()
+        return schema
+    
+    def archived_years(self, start=None, end=None):
+        # Archived years overlapping [start, end), newest first.
+        first = int(start[:4]) if start else 0
+        last = int(end[:4]) + (end[4:] > '-01-01') if end else 10000
+        return [year for (year,) in self.connection.execute('''
+            SELECT year FROM archives WHERE year >= ? AND year < ? ORDER BY year DESC
+        ''', (first, last))]
+    
+    def partitions(self, start=None, end=None):
+        # Schemas that can hold rows dated in [start, end): the main database,
+        # then the overlapping archives, newest first, attached on first use.
+        # They are read by one statement, so they must all fit attached at once.
+        years = self.archived_years(start, end)
+        if len(years) > MAX_ATTACHED_ARCHIVES:
+            raise ValueError(f'{len(years)} archived years overlap {start}..{end}; '
+                             f'read them with partition_groups()')
+        return ['main'] + [self.attach_archive(year) for year in years]
+    
+    def partition_groups(self, start=None, end=None):
+        # The same schemas in groups a statement can read together: main with
+        # the newest MAX_ATTACHED_ARCHIVES archives, then the older ones. Each
+        # group is attached when it is reached, which can detach the previous
+        # one, so a group is read to the end before the next is asked for.
+        years = self.archived_years(start, end)
+        yield ['main'] + [self.attach_archive(year) for year in years[:MAX_ATTACHED_ARCHIVES]]
+        for first in range(MAX_ATTACHED_ARCHIVES, len(years), MAX_ATTACHED_ARCHIVES):
+            yield [self.attach_archive(year) for year in years[first:first + MAX_ATTACHED_ARCHIVES]]
+    
+    @staticmethod
+    def _table(schema):
+        return 'expenses' if schema == 'main' else f'{schema}.expenses'
+    
+    @classmethod
+    def _union(cls, schemas):
+        if schemas == ['main']:
+            return 'expenses'
+        parts = ' UNION ALL '.join(f'SELECT * FROM {cls._table(schema)}' for schema in schemas)
+        return f'({parts})'
+    
+    def _expenses_from(self, start=None, end=None):
+        # FROM source covering every partition that overlaps [start, end);
+        # the range may span at most MAX_ATTACHED_ARCHIVES archived years.
+        return self._union(self.partitions(start, end))
+    
+    def _execute_listing(self, cursor, schemas, where=(), params=(), limit=None, offset=0):
+        # Listing order over the given partitions. Each part is read in
+        # (date, id) index order and SQLite merges them (MERGE (UNION ALL)).
+        clause = f"WHERE {' AND '.join(where)}" if where else ''
+        parts = [f'SELECT {select_columns()}, date FROM {self._table(schema)} {clause}'
+                 for schema in schemas]
+        params = list(params) * len(schemas)
+        tail = ''
+        if limit is not None:
+            tail = 'LIMIT ? OFFSET ?'
+            params += [limit, offset]
+        cursor.execute(f"{' UNION ALL '.join(parts)} ORDER BY 7 DESC, 1 DESC {tail}", params)
+    
+    @staticmethod
+    def _merge_listings(runs):
+        # Row lists in listing order (trailing date column included) merged into one.
+        return heapq.merge(*runs, key=lambda row: (row[6], row[0]), reverse=True)
+    
+    def _select_expenses(self, start=None, end=None, where=(), params=(), limit=None, offset=0):
+        # Rows of every partition overlapping [start, end) in listing order.
+        # With more archives than one statement can attach, each group's first
+        # offset + limit rows are read and merged here.
+        cursor = self._columns_cursor()
+        if len(self.archived_years(start, end)) <= MAX_ATTACHED_ARCHIVES:
+            self._execute_listing(cursor, self.partitions(start, end), where, params, limit, offset)
+            return ExpenseColumns.from_cursor(cursor)
+        
+        window = None if limit is None else offset + limit
+        runs = []
+        for schemas in self.partition_groups(start, end):
+            self._execute_listing(cursor, schemas, where, params, window)
+            runs.append(cursor.fetchall())
+        return ExpenseColumns.from_rows(list(islice(self._merge_listings(runs), offset, window)))
+    
+    @cached_query
+    def get_all_expenses(self):
+        return self._select_expenses()
+    
+    @cached_query
+    def get_expenses_slice(self, offset, limit):
+        return self._select_expenses(limit=limit, offset=offset)
+    
+    @cached_query
+    def get_expenses_page(self, after=None, limit=200, filters=None):
+        # Keyset pagination: `after` is the (date, id) of the last row of the
+        # previous page, so every page is one index seek whatever its depth.
+        where, params = self._filter_clause(filters)
+        if after is not None:
+            where.append('(date, id) < (?, ?)')
+            params.extend(after)
+        
+        # Archives are added newest year first, and only while the page could
+        # still take rows from them: once it is full of rows newer than an
+        # archive's year, that archive and every older one are skipped. When
+        # a statement already reads MAX_ATTACHED_ARCHIVES archives, its page
+        # is kept and merged with a new group started from the next archive.
+        start = filters.start if filters else None
+        end = filters.end if filters else None
+        if after is not None:
+            end = min(end, self.next_day(after[0])) if end else self.next_day(after[0])
+        cursor = self._columns_cursor()
+        earlier, schemas = [], ['main']
+        self._execute_listing(cursor, schemas, where, params, limit)
+        rows = cursor.fetchall()
+        for year in self.archived_years(start, end):
+            if len(rows) == limit and rows[-1][6] >= f'{year + 1:04d}-01-01':
+                break
+            if len(schemas) > MAX_ATTACHED_ARCHIVES:
+                earlier, schemas = rows, []
+            schemas.append(self.attach_archive(year))
+            self._execute_listing(cursor, schemas, where, params, limit)
+            rows = list(islice(self._merge_listings([earlier, cursor.fetchall()]), limit))
+        return ExpenseColumns.from_rows(rows)
+    
+    @cached_query
+    def count_expenses(self, filters=None):
+        # Whole months are counted from the monthly rollup; only the partial
+        # months at the edges of a date range touch the expenses table.
+        filters = filters or ExpenseFilter()
+        first_full = self.next_month_start(filters.start) if filters.start else None
+        last_full = filters.end[:8] + '01' if filters.end else None
+        if first_full and last_full and first_full >= last_full:
+            return self._count_rows(filters)
+        
+        where, params = self._filter_clause(filters._replace(start=None, end=None))
+        if first_full:
+            where.append('period >= ?')
+            params.append(first_full[:7])
+        if last_full:
+            where.append('period < ?')
+            params.append(last_full[:7])
+        clause = f"WHERE {' AND '.join(where)}" if where else ''
+        total = self.connection.execute(f'''
+            SELECT COALESCE(SUM(count), 0) FROM monthly_category_totals
+            {clause}
+        ''', params).fetchone()[0]
+        
+        if first_full:
+            total += self._count_rows(filters._replace(end=first_full))
+        if last_full:
+            total += self._count_rows(filters._replace(start=last_full))
+        return total
+    
+    def _count_rows(self, filters):
+        where, params = self._filter_clause(filters)
+        clause = f"WHERE {' AND '.join(where)}" if where else ''
+        return sum(self.connection.execute(f'SELECT COUNT(*) FROM {self._union(schemas)} {clause}',
+                                           params).fetchone()[0]
+                   for schemas in self.partition_groups(filters.start, filters.end))
+    
+    @staticmethod
+    def _filter_clause(filters):
+        where, params = [], []
+        if filters is None:
+            return where, params
+        if filters.category_id is not None:
+            where.append('category_id = ?')
+            params.append(filters.category_id)
+        if filters.type is not None:
+            where.append('type = ?')
+            params.append(filters.type)
+        if filters.start is not None:
+            where.append('date >= ?')
+            params.append(filters.start)
+        if filters.end is not None:
+            where.append('date < ?')
+            params.append(filters.end)
+        return where, params
+    
+    @staticmethod
+    def next_month_start(day):
+        # First day of the first month that starts on or after `day`.
+        if day[8:10] == '01':
+            return day[:10]
+        year, month = int(day[:4]), int(day[5:7])
+        return f'{year + month // 12:04d}-{month % 12 + 1:02d}-01'
+    
+    @cached_query
+    def get_expenses_by_month(self, year, month):
+        start, end = self.month_range(year, month)
+        return self._select_expenses(start, end, ['date >= ?', 'date < ?'], [start, end])
+    
+    @cached_query
+    def get_category_summary(self, year, month):
+        cursor = self.connection.cursor()
+        cursor.execute('''
+            SELECT category_id, total as "total [money]", type, count
+            FROM monthly_category_totals
+            WHERE period = ?
+            ORDER BY total DESC
+        ''', (self.month_period(year, month),))
+        return cursor.fetchall()
+    
+    def _actual_category_totals(self):
+        # (period, category_id, type) -> [total, count] of the expenses rows,
+        # summed group by group over every partition.
+        actual = {}
+        for schemas in self.partition_groups():
+            for period, category_id, kind, total, count in self.connection.execute(f'''
+                SELECT substr(date, 1, 7), category_id, type, SUM(amount), COUNT(*)
+                FROM {self._union(schemas)}
+                GROUP BY substr(date, 1, 7), category_id, type
+            '''):
+                sums = actual.setdefault((period, category_id, kind), [0, 0])
+                sums[0] += total
+                sums[1] += count
+        return actual
+    
+    def _category_drift(self, actual):
+        stored = {(period, category_id, kind): [total, count]
+                  for period, category_id, kind, total, count in self.connection.execute(
+                      'SELECT period, category_id, type, total, count FROM monthly_category_totals')}
+        drift = []
+        for key in sorted(stored.keys() | actual.keys()):
+            (stored_total, stored_count), (actual_total, actual_count) = (
+                stored.get(key, (0, 0)), actual.get(key, (0, 0)))
+            if stored_total != actual_total or stored_count != actual_count:
+                drift.append({'period': key[0], 'category_id': key[1], 'type': key[2],
+                              'stored_total': from_minor_units(stored_total),
+                              'actual_total': from_minor_units(actual_total),
+                              'stored_count': stored_count, 'actual_count': actual_count})
+        return drift
+    
+    def verify_category_totals(self):
+        return self._category_drift(self._actual_category_totals())
+    
+    def rebuild_category_totals(self):
+        actual = self._actual_category_totals()
+        drift = self._category_drift(actual)
+        cursor = self.connection.cursor()
+        cursor.execute('DELETE FROM monthly_category_totals')
+        cursor.executemany('''
+            INSERT INTO monthly_category_totals (period, category_id, type, total, count)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [key + tuple(sums) for key, sums in actual.items()])
+        self.flush()
+        self.invalidate_cache()
+        return drift
+    
+    def _actual_balance_checkpoints(self):
+        # period -> [closing balance, rows dated in the year]: the yearly net
+        # of every partition, then a running sum in year order.
+        actual = {}
+        for schemas in self.partition_groups():
+            for period, net, count in self.connection.execute(f'''
+                SELECT substr(date, 1, 4), SUM(CASE type WHEN 'income' THEN amount ELSE -amount END),
+                       COUNT(*)
+                FROM {self._union(schemas)}
+                GROUP BY substr(date, 1, 4)
+            '''):
+                sums = actual.setdefault(period, [0, 0])
+                sums[0] += net
+                sums[1] += count
+        balance = 0
+        for period in sorted(actual):
+            balance += actual[period][0]
+            actual[period][0] = balance
+        return actual
+    
+    def _checkpoint_drift(self, actual):
+        stored = dict(self.connection.execute('SELECT period, balance FROM balance_checkpoints').fetchall())
+        drift = []
+        for period in sorted(stored.keys() | actual.keys()):
+            balance = actual[period][0] if period in actual else None
+            if stored.get(period) != balance:
+                drift.append({'period': period,
+                              'stored': None if period not in stored else from_minor_units(stored[period]),
+                              'actual': None if balance is None else from_minor_units(balance)})
+        return drift
+    
+    def verify_balance_checkpoints(self):
+        return self._checkpoint_drift(self._actual_balance_checkpoints())
+    
+    def rebuild_balance_checkpoints(self):
+        actual = self._actual_balance_checkpoints()
+        drift = self._checkpoint_drift(actual)
+        cursor = self.connection.cursor()
+        cursor.execute('DELETE FROM balance_checkpoints')
+        cursor.executemany('INSERT INTO balance_checkpoints (period, balance, count) VALUES (?, ?, ?)',
+                           [(period,) + tuple(sums) for period, sums in actual.items()])
+        self.flush()
+        self.invalidate_cache()
+        return drift
+    
+    @cached_query
+    def get_balance_before(self, day):
+        balance = BALANCE_BEFORE_SQL.format(expenses=self._expenses_from(day[:7], day))
+        cursor = self.connection.cursor()
+        cursor.execute(f'SELECT ({balance}) as "balance [money]"', {'before': day})
+        return cursor.fetchone()['balance']
+    
+    def get_balance(self, day):
+        # Balance at the end of `day`.
+        return self.get_balance_before(self.next_day(day))
+    
+    @cached_query
+    def get_daily_balances(self, start, end):
+        # (day, balance at the end of the day) for every day in [start, end),
+        # including days without transactions. One statement can read at most
+        # MAX_ATTACHED_ARCHIVES archived years, so longer ranges are split.
+        split = f'{int(start[:4]) + MAX_ATTACHED_ARCHIVES:04d}-01-01'
+        if split < end:
+            return self.get_daily_balances(start, split) + self.get_daily_balances(split, end)
+        opening = BALANCE_BEFORE_SQL.format(expenses=self._expenses_from(start[:7], start))
+        cursor = self.connection.cursor()
+        cursor.execute(f'''
+            WITH RECURSIVE days(day) AS (
+                SELECT :start WHERE :start < :end
+                UNION ALL
+                SELECT date(day, '+1 day') FROM days WHERE date(day, '+1 day') < :end
+            ),
+            net(day, amount) AS (
+                SELECT date, SUM(CASE type WHEN 'income' THEN amount ELSE -amount END)
+                FROM {self._expenses_from(start, end)}
+                WHERE date >= :start AND date < :end
+                GROUP BY date
+            )
+            SELECT days.day as day,
+                   ({opening}) + SUM(COALESCE(net.amount, 0))
+                       OVER (ORDER BY days.day) as "balance [money]"
+            FROM days
+            LEFT JOIN net ON net.day = days.day
+            ORDER BY days.day
+        ''', {'start': start, 'end': end, 'before': start})
+        return cursor.fetchall()
+    
+    @staticmethod
+    def next_day(day):
+        return (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+    
+    def iter_expenses(self, year=None, month=None, batch_size=1000):
+        # Archived years come first, oldest first, then the main database;
+        # rows are in id order within each.
+        where, params = '', ()
+        if year is not None:
+            if month is not None:
+                params = self.month_range(year, month)
+            else:
+                params = (f'{int(year):04d}-01-01', f'{int(year) + 1:04d}-01-01')
+            where = 'WHERE date >= ? AND date < ?'
+        
+        # Each archive is attached just before it is read.
+        for schema in chain(map(self.attach_archive, reversed(self.archived_years(*params))), ['main']):
+            cursor = self.connection.cursor()
+            cursor.execute(f'''
+                SELECT id, amount as "amount [money]", category_id, date, description, type
+                FROM {self._table(schema)}
+                {where}
+                ORDER BY id
+            ''', params)
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                yield batch
+    
+    def iter_expense_columns(self, start=None, end=None, batch_size=50000):
+        # Raw columns for analytics: day number since 1970-01-01, category id,
+        # 1 for income, amount in minor units. Reads only the covering index.
+        # Dates are in order within each partition, not across them.
+        where, params = '', ()
+        if start is not None and end is not None:
+            where, params = 'WHERE date >= ? AND date < ?', (start, end)
+        
+        for schema in chain(map(self.attach_archive, reversed(self.archived_years(start, end))), ['main']):
+            cursor = self.connection.cursor()
+            cursor.row_factory = None
+            cursor.execute(f'''
+                SELECT CAST(julianday(date) - 2440587.5 AS INTEGER), category_id,
+                       type = 'income', amount
+                FROM {self._table(schema)}
+                {where}
+                ORDER BY date
+            ''', params)
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                yield batch
+    
+    @cached_query
+    def search_expenses(self, query, limit=100, rank_window=SEARCH_RANK_WINDOW):
+        # Recent first: bm25 ranks the newest `rank_window` matches, since it
+        # has to score every candidate before it can sort. rank_window=None
+        # ranks all matches, which is slower for common words. Each file's
+        # index is walked newest first, the main file and then the archives,
+        # and the archives are only opened while the window is not full.
+        match = self.search_match(query)
+        if not match:
+            return ExpenseColumns()
+        window = -1 if rank_window is None else rank_window
+        cursor = self._columns_cursor()
+        found = []
+        for schema in chain(['main'], map(self.attach_archive, self.archived_years())):
+            cursor.execute(f'''
+                WITH candidates AS MATERIALIZED (
+                    SELECT rowid, rank FROM {schema}.expenses_fts(:match)
+                    ORDER BY rowid DESC
+                    LIMIT :window
+                )
+                SELECT {select_columns('e')}, candidates.rank, (SELECT COUNT(*) FROM candidates)
+                FROM candidates
+                JOIN {self._table(schema)} e ON e.id = candidates.rowid
+                ORDER BY candidates.rank, candidates.rowid DESC
+                LIMIT :limit
+            ''', {'match': match, 'window': window, 'limit': limit})
+            rows = cursor.fetchall()
+            found += rows
+            if rows and window > 0:
+                window -= rows[0][-1]
+            if window == 0:
+                break
+        found.sort(key=lambda row: (row[6], -row[0]))
+        return ExpenseColumns.from_rows(found[:limit])
+    
+    @staticmethod
+    def search_match(query):
+        # Every word must appear, each as a prefix. Only word characters are
+        # kept, so user input is never read as FTS5 syntax.
+        return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', str(query)))
+    
+    @staticmethod
+    def month_range(year, month):
+        year, month = int(year), int(month)
+        start = f'{year:04d}-{month:02d}-01'
+        if month == 12:
+            end = f'{year + 1:04d}-01-01'
+        else:
+            end = f'{year:04d}-{month + 1:02d}-01'
+        return start, end
+    
+    @staticmethod
+    def month_period(year, month):
+        return f'{int(year):04d}-{int(month):02d}'
+    
+    @cached_query
+    def get_categories(self):
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT id, name, color FROM categories ORDER BY name')
+        return cursor.fetchall()
+    
+    def add_category(self, name, color='#FF6B6B'):
+        cursor = self.connection.cursor()
+        cursor.execute('INSERT INTO categories (name, color) VALUES (?, ?)', (name, color))
+        self.flush()
+        self.categories.refresh()
+        self.notify_change(ExpenseChange('categories_changed'))
+        return cursor.lastrowid
+    
+    def add_recurring_rule(self, amount, category_id, start_date, description=None,
+                           expense_type='expense', interval_months=1, day_of_month=None, end_date=None):
+        # Dates are parsed and stored in canonical form; a malformed one would
+        # otherwise make materialize_recurring fail on every start.
+        first = self._parse_date(start_date, 'start_date')
+        last = self._parse_date(end_date, 'end_date') if end_date is not None else None
+        day_of_month = day_of_month or first.day
+        if category_id not in self.categories.ids():
+            raise ValueError(f'unknown category_id {category_id!r}')
+        if expense_type not in ('expense', 'income'):
+            raise ValueError(f'invalid type {expense_type!r}')
+        if int(interval_months) < 1 or not 1 <= int(day_of_month) <= 31:
+            raise ValueError('interval_months must be >= 1 and day_of_month 1-31')
+        if last is not None and last < first:
+            raise ValueError('end_date is before start_date')
+        
+        cursor = self.connection.cursor()
+        cursor.execute('''
+            INSERT INTO recurring_rules (amount, category_id, description, type, start_date,
+                                         interval_months, day_of_month, end_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (to_minor_units(amount), category_id, description, expense_type, first.isoformat(),
+              int(interval_months), int(day_of_month), last and last.isoformat()))
+        self.flush()
+        return cursor.lastrowid
+    
+    @staticmethod
+    def _parse_date(value, name):
+        try:
+            return date.fromisoformat(str(value))
+        except ValueError:
+            raise ValueError(f'{name} must be a YYYY-MM-DD date, not {value!r}') from None
+    
+    def get_recurring_rules(self):
+        cursor = self._columns_cursor()
+        cursor.execute(f'SELECT {RULE_COLUMNS} FROM recurring_rules ORDER BY id')
+        return [RecurringRule(*row) for row in cursor]
+    
+    def delete_recurring_rule(self, rule_id):
+        # Occurrences already written stay; only future ones stop.
+        self.connection.execute('DELETE FROM recurring_rules WHERE id = ?', (rule_id,))
+        self.flush()
+    
+    def materialize_recurring(self, today=None):
+        # Writes every due occurrence of every rule up to `today` with one
+        # executemany and moves each rule's watermark in the same transaction.
+        # BEGIN IMMEDIATE makes a second process starting at the same time
+        # wait and then find nothing left to write.
+        today = today or date.today().isoformat()
+        end = self.next_day(today)
+        self.flush()
+        cursor = self._columns_cursor()
+        
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            cursor.execute(f'''
+                SELECT {RULE_COLUMNS} FROM recurring_rules
+                WHERE start_date <= ? AND (materialized_through IS NULL OR materialized_through < ?)
+            ''', (today, today))
+            rules = [RecurringRule(*row) for row in cursor.fetchall()]
+            rows = [(to_minor_units(occurrence.amount), occurrence.category_id, occurrence.date,
+                     occurrence.description, occurrence.type)
+                    for rule in rules for occurrence in occurrences(rule, rule.start_date, end)]
+            cursor.executemany('''
+                INSERT INTO expenses (amount, category_id, date, description, type)
+                VALUES (?, ?, ?, ?, ?)
+            ''', rows)
+            cursor.executemany('UPDATE recurring_rules SET materialized_through = ? WHERE id = ?',
+                               [(today, rule.id) for rule in rules])
+            self.flush()
+        except Exception:
+            self.connection.rollback()
+            raise
+        
+        if rows:
+            self.notify_change(ExpenseChange('bulk_inserted'))
+        return len(rows)
+    
+    def project_recurring(self, start, end):
+        # Occurrences in [start, end) that are not expenses yet, in date order.
+        # Nothing is written; the generator computes them as it is consumed.
+        return project(self.get_recurring_rules(), start, end)
+    
+    def _fetch_change(self, kind, expense_id, schema='main'):
+        row = self.connection.execute(f'''
+            SELECT id, amount as "amount [money]", category_id, date, description, type
+            FROM {self._table(schema)}
+            WHERE id = ?
+        ''', (expense_id,)).fetchone()
+        if row is None:
+            return None
+        return ExpenseChange(kind, *row)
+    
+    def _locate(self, kind, expense_id):
+        # (schema, change) of the partition holding the row: the main file
+        # first, then the archives, newest first. (None, None) if it is gone.
+        change = self._fetch_change(kind, expense_id)
+        if change is not None:
+            return 'main', change
+        for year in self.archived_years():
+            schema = self.attach_archive(year)
+            change = self._fetch_change(kind, expense_id, schema)
+            if change is not None:
+                return schema, change
+        return None, None
+    
+    def delete_expense(self, expense_id):
+        schema, deleted = self._locate('deleted', expense_id)
+        if deleted is None:
+            return False
+        cursor = self.connection.cursor()
+        if schema == 'main':
+            cursor.execute('DELETE FROM expenses WHERE id = ?', (expense_id,))
+        else:
+            remove_archived(cursor, schema, expense_id)
+        self._written()
+        self.notify_change(deleted)
+        return True
+    
+    def add_change_listener(self, listener):
+        self.change_listeners.append(listener)
+    
+    def remove_change_listener(self, listener):
+        self.change_listeners.remove(listener)
+    
+    def notify_change(self, change):
+        self.invalidate_cache()
+        for listener in list(self.change_listeners):
+            listener(change)
+    
+    def close(self):
+        if self.connection:
+            self.flush()
+            self.connection.close()
+            self.connection = None
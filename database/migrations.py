@@ -0,0 +1,412 @@
+import logging
+import time
+from collections import namedtuple
+
+from database.money import to_minor_units
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_BATCH_SIZE = 10000
+SLOW_MIGRATION_SECONDS = 2.0
+
+Migration = namedtuple('Migration', 'version name apply transactional')
+
+
+def current_version(connection):
+    return connection.execute('PRAGMA user_version').fetchone()[0]
+
+
+def create_expenses_table(cursor, name='expenses'):
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {name} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            amount INTEGER NOT NULL,
+            category_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            description TEXT,
+            type TEXT CHECK(type IN ('expense', 'income')) DEFAULT 'expense',
+            FOREIGN KEY(category_id) REFERENCES categories(id)
+        )
+    ''')
+
+
+def fill_category_totals(cursor, source='expenses'):
+    cursor.execute('DELETE FROM monthly_category_totals')
+    cursor.execute(f'''
+        INSERT INTO monthly_category_totals (period, category_id, type, total, count)
+        SELECT substr(date, 1, 7), category_id, type, SUM(amount), COUNT(*)
+        FROM {source}
+        GROUP BY substr(date, 1, 7), category_id, type
+    ''')
+
+
+def fill_balance_checkpoints(cursor, source='expenses'):
+    cursor.execute('DELETE FROM balance_checkpoints')
+    cursor.execute(f'''
+        INSERT INTO balance_checkpoints (period, balance, count)
+        SELECT substr(date, 1, 4),
+               SUM(SUM(CASE type WHEN 'income' THEN amount ELSE -amount END))
+                   OVER (ORDER BY substr(date, 1, 4)),
+               COUNT(*)
+        FROM {source}
+        GROUP BY substr(date, 1, 4)
+    ''')
+
+
+def create_base_tables(connection, report):
+    cursor = connection.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            color TEXT DEFAULT '#FF6B6B'
+        )
+    ''')
+    create_expenses_table(cursor)
+
+
+def convert_amounts_to_minor_units(connection, report):
+    # Copy into a table with an INTEGER amount column in batches so a crash
+    # can resume from the last copied id, then swap the tables in one go.
+    cursor = connection.cursor()
+    columns = {row[1]: row[2].upper() for row in cursor.execute('PRAGMA table_info(expenses)')}
+    if columns.get('amount') != 'REAL':
+        return
+
+    create_expenses_table(cursor, 'expenses_minor')
+    connection.commit()
+    # The same half-up rounding of the decimal text as new amounts get;
+    # ROUND(amount * 100) in SQL turns 1.005 into 100.
+    connection.create_function('to_minor_units', 1, to_minor_units, deterministic=True)
+
+    total_rows = cursor.execute('SELECT COUNT(*) FROM expenses').fetchone()[0]
+    copied = cursor.execute('SELECT COUNT(*) FROM expenses_minor').fetchone()[0]
+    last_id = cursor.execute('SELECT COALESCE(MAX(id), 0) FROM expenses_minor').fetchone()[0]
+    while True:
+        cursor.execute('''
+            INSERT INTO expenses_minor (id, amount, category_id, date, description, type)
+            SELECT id, to_minor_units(amount), category_id, date, description, type
+            FROM expenses
+            WHERE id > ?
+            ORDER BY id
+            LIMIT ?
+        ''', (last_id, MIGRATION_BATCH_SIZE))
+        batch = cursor.rowcount
+        connection.commit()
+        if batch <= 0:
+            break
+        copied += batch
+        last_id = cursor.execute('SELECT MAX(id) FROM expenses_minor').fetchone()[0]
+        report(copied, total_rows)
+
+    sequence = cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'expenses'").fetchone()
+    cursor.execute('BEGIN')
+    try:
+        cursor.execute('DROP TABLE expenses')
+        cursor.execute('DROP TABLE IF EXISTS monthly_category_totals')
+        cursor.execute('ALTER TABLE expenses_minor RENAME TO expenses')
+        if sequence is not None:
+            cursor.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'expenses'",
+                           (sequence[0],))
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+
+
+def create_expense_indexes(connection, report):
+    cursor = connection.cursor()
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_expenses_date_category_type_amount
+        ON expenses (date, category_id, type, amount)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_expenses_category
+        ON expenses (category_id)
+    ''')
+
+
+def create_category_totals(connection, report):
+    cursor = connection.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS monthly_category_totals (
+            period TEXT NOT NULL,
+            category_id INTEGER NOT NULL,
+            type TEXT NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (period, category_id, type)
+        ) WITHOUT ROWID
+    ''')
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_totals_insert
+        AFTER INSERT ON expenses
+        BEGIN
+            INSERT INTO monthly_category_totals (period, category_id, type, total, count)
+            VALUES (substr(NEW.date, 1, 7), NEW.category_id, NEW.type, NEW.amount, 1)
+            ON CONFLICT (period, category_id, type)
+            DO UPDATE SET total = total + excluded.total, count = count + 1;
+        END
+    ''')
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_totals_delete
+        AFTER DELETE ON expenses
+        BEGIN
+            UPDATE monthly_category_totals
+            SET total = total - OLD.amount, count = count - 1
+            WHERE period = substr(OLD.date, 1, 7)
+              AND category_id = OLD.category_id AND type = OLD.type;
+            DELETE FROM monthly_category_totals
+            WHERE period = substr(OLD.date, 1, 7)
+              AND category_id = OLD.category_id AND type = OLD.type
+              AND count <= 0;
+        END
+    ''')
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_totals_update
+        AFTER UPDATE OF amount, category_id, date, type ON expenses
+        BEGIN
+            UPDATE monthly_category_totals
+            SET total = total - OLD.amount, count = count - 1
+            WHERE period = substr(OLD.date, 1, 7)
+              AND category_id = OLD.category_id AND type = OLD.type;
+            DELETE FROM monthly_category_totals
+            WHERE period = substr(OLD.date, 1, 7)
+              AND category_id = OLD.category_id AND type = OLD.type
+              AND count <= 0;
+            INSERT INTO monthly_category_totals (period, category_id, type, total, count)
+            VALUES (substr(NEW.date, 1, 7), NEW.category_id, NEW.type, NEW.amount, 1)
+            ON CONFLICT (period, category_id, type)
+            DO UPDATE SET total = total + excluded.total, count = count + 1;
+        END
+    ''')
+
+    fill_category_totals(cursor)
+
+
+def create_description_search(connection, report):
+    # External-content FTS5 index: the text lives only in expenses, the index
+    # is kept in step by triggers. The prefix indexes serve the short prefixes
+    # typed into the search box.
+    cursor = connection.cursor()
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS expenses_fts USING fts5(
+            description,
+            content='expenses',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_fts_insert
+        AFTER INSERT ON expenses
+        BEGIN
+            INSERT INTO expenses_fts (rowid, description) VALUES (NEW.id, NEW.description);
+        END
+    ''')
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_fts_delete
+        AFTER DELETE ON expenses
+        BEGIN
+            INSERT INTO expenses_fts (expenses_fts, rowid, description)
+            VALUES ('delete', OLD.id, OLD.description);
+        END
+    ''')
+
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_fts_update
+        AFTER UPDATE OF description ON expenses
+        BEGIN
+            INSERT INTO expenses_fts (expenses_fts, rowid, description)
+            VALUES ('delete', OLD.id, OLD.description);
+            INSERT INTO expenses_fts (rowid, description) VALUES (NEW.id, NEW.description);
+        END
+    ''')
+
+    cursor.execute("INSERT INTO expenses_fts (expenses_fts) VALUES ('rebuild')")
+
+
+def create_keyset_indexes(connection, report):
+    # Both indexes end in (date DESC, id DESC), the listing order, so a page
+    # after a given (date, id) is a single seek with or without a category filter.
+    cursor = connection.cursor()
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_expenses_date_id
+        ON expenses (date DESC, id DESC)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_expenses_category_date_id
+        ON expenses (category_id, date DESC, id DESC)
+    ''')
+    cursor.execute('DROP INDEX IF EXISTS idx_expenses_category')
+
+
+def create_balance_checkpoints(connection, report):
+    # Closing balance (all income minus all expenses up to the end of the
+    # year) for every year that has transactions. A write moves the
+    # checkpoint of its own year and of every later one, so checkpoints are
+    # yearly: months in between come from monthly_category_totals.
+    cursor = connection.cursor()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS balance_checkpoints (
+            period TEXT PRIMARY KEY,
+            balance INTEGER NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+
+    add_new = '''
+            INSERT OR IGNORE INTO balance_checkpoints (period, balance, count)
+            VALUES (substr(NEW.date, 1, 4), COALESCE((
+                SELECT balance FROM balance_checkpoints
+                WHERE period < substr(NEW.date, 1, 4)
+                ORDER BY period DESC LIMIT 1), 0), 0);
+            UPDATE balance_checkpoints
+            SET balance = balance + CASE NEW.type WHEN 'income' THEN NEW.amount ELSE -NEW.amount END,
+                count = count + (period = substr(NEW.date, 1, 4))
+            WHERE period >= substr(NEW.date, 1, 4);
+    '''
+    remove_old = '''
+            UPDATE balance_checkpoints
+            SET balance = balance - CASE OLD.type WHEN 'income' THEN OLD.amount ELSE -OLD.amount END,
+                count = count - (period = substr(OLD.date, 1, 4))
+            WHERE period >= substr(OLD.date, 1, 4);
+            DELETE FROM balance_checkpoints
+            WHERE period = substr(OLD.date, 1, 4) AND count <= 0;
+    '''
+
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_balance_insert
+        AFTER INSERT ON expenses
+        BEGIN{add_new}
+        END
+    ''')
+
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_balance_delete
+        AFTER DELETE ON expenses
+        BEGIN{remove_old}
+        END
+    ''')
+
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_balance_update
+        AFTER UPDATE OF amount, date, type ON expenses
+        BEGIN{remove_old}{add_new}
+        END
+    ''')
+
+    fill_balance_checkpoints(cursor)
+
+
+def create_archive_registry(connection, report):
+    # Years moved out into their own database files by database/archive.py.
+    connection.execute('''
+        CREATE TABLE IF NOT EXISTS archives (
+            year INTEGER PRIMARY KEY,
+            path TEXT NOT NULL,
+            rows INTEGER,
+            total INTEGER,
+            archived_at TEXT
+        )
+    ''')
+
+
+def create_recurring_rules(connection, report):
+    # Monthly schedules (every interval_months on day_of_month) that
+    # database/recurring.py turns into expenses; materialized_through is the
+    # last date already written, so catching up never repeats an occurrence.
+    connection.execute('''
+        CREATE TABLE IF NOT EXISTS recurring_rules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            amount INTEGER NOT NULL,
+            category_id INTEGER NOT NULL,
+            description TEXT,
+            type TEXT CHECK(type IN ('expense', 'income')) DEFAULT 'expense',
+            start_date TEXT NOT NULL,
+            interval_months INTEGER NOT NULL DEFAULT 1 CHECK(interval_months >= 1),
+            day_of_month INTEGER NOT NULL CHECK(day_of_month BETWEEN 1 AND 31),
+            end_date TEXT,
+            materialized_through TEXT,
+            FOREIGN KEY(category_id) REFERENCES categories(id)
+        )
+    ''')
+
+
+def create_search_table(cursor, schema='main'):
+    # The description index of one database file; archives have their own.
+    cursor.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS {schema}.expenses_fts USING fts5(
+            description,
+            content='expenses',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3 4 5 6'
+        )
+    ''')
+
+
+def widen_search_prefixes(connection, report):
+    # A prefix without its own prefix index makes FTS5 merge the doclists of
+    # every matching term before it can intersect them. Indexing prefixes up
+    # to six characters covers most whole words typed into the search box.
+    # The triggers refer to the table by name and keep working.
+    cursor = connection.cursor()
+    cursor.execute('DROP TABLE IF EXISTS expenses_fts')
+    create_search_table(cursor)
+    cursor.execute("INSERT INTO expenses_fts (expenses_fts) VALUES ('rebuild')")
+    cursor.execute("INSERT INTO expenses_fts (expenses_fts) VALUES ('optimize')")
+
+MIGRATIONS = [
+    Migration(1, 'create base tables', create_base_tables, True),
+    Migration(2, 'store amounts as integer minor units', convert_amounts_to_minor_units, False),
+    Migration(3, 'create expense indexes', create_expense_indexes, True),
+    Migration(4, 'create monthly category totals', create_category_totals, True),
+    Migration(5, 'create description search index', create_description_search, True),
+    Migration(6, 'create keyset pagination indexes', create_keyset_indexes, True),
+    Migration(7, 'create running balance checkpoints', create_balance_checkpoints, True),
+    Migration(8, 'create archive registry', create_archive_registry, True),
+    Migration(9, 'create recurring rules', create_recurring_rules, True),
+    Migration(10, 'widen search prefix indexes', widen_search_prefixes, True),
+]
+
+
+def log_progress(migration, done, total):
+    logger.info('Migration %d (%s): %d/%d rows', migration.version, migration.name, done, total)
+
+
+def run_migrations(connection, migrations=MIGRATIONS, progress=log_progress):
+    version = current_version(connection)
+    applied = []
+
+    for migration in migrations:
+        if migration.version <= version:
+            continue
+
+        logger.info('Applying migration %d: %s', migration.version, migration.name)
+        report = lambda done, total, migration=migration: progress(migration, done, total)
+        started = time.perf_counter()
+
+        if migration.transactional:
+            connection.execute('BEGIN')
+        try:
+            migration.apply(connection, report)
+            connection.execute(f'PRAGMA user_version = {int(migration.version)}')
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+
+        seconds = time.perf_counter() - started
+        log = logger.warning if seconds >= SLOW_MIGRATION_SECONDS else logger.info
+        log('Migration %d (%s) took %.3fs', migration.version, migration.name, seconds)
+        applied.append((migration.version, migration.name, seconds))
+        version = migration.version
+
+    return applied
@@ -0,0 +1,16 @@
+import sqlite3
+from decimal import Decimal, ROUND_HALF_UP
+
+MINOR_UNIT_DIGITS = 2
+
+
+def to_minor_units(amount):
+    value = Decimal(str(amount)).scaleb(MINOR_UNIT_DIGITS)
+    return int(value.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def from_minor_units(value):
+    return Decimal(int(value)).scaleb(-MINOR_UNIT_DIGITS)
+
+
+sqlite3.register_converter('money', from_minor_units)
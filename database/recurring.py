@@ -0,0 +1,60 @@
+import calendar
+import heapq
+from collections import namedtuple
+from datetime import date, timedelta
+
+RecurringRule = namedtuple(
+    'RecurringRule',
+    'id amount category_id description type start_date interval_months day_of_month end_date '
+    'materialized_through'
+)
+
+# One projected transaction of a rule.
+Occurrence = namedtuple('Occurrence', 'date rule_id amount category_id description type')
+
+RULE_COLUMNS = ('id, amount AS "amount [money]", category_id, description, type, start_date, interval_months, '
+                'day_of_month, end_date, materialized_through')
+
+
+def occurrence_date(year, month, day_of_month):
+    # A day past the end of a short month falls on its last day (31 -> 30 April).
+    return date(year, month, min(day_of_month, calendar.monthrange(year, month)[1]))
+
+
+def rule_dates(rule, start, end):
+    # ISO dates of the rule's occurrences in [start, end), oldest first. Lazy,
+    # and it starts at the first interval on or after `start` instead of
+    # walking from the rule's start date.
+    first = date.fromisoformat(rule.start_date)
+    start, end = date.fromisoformat(start), date.fromisoformat(end)
+    last = date.fromisoformat(rule.end_date) if rule.end_date else None
+    step = rule.interval_months
+    elapsed = (start.year - first.year) * 12 + start.month - first.month
+    index = max(0, elapsed // step)
+
+    while True:
+        month = first.month - 1 + index * step
+        day = occurrence_date(first.year + month // 12, month % 12 + 1, rule.day_of_month)
+        if day >= end or (last is not None and day > last):
+            return
+        if day >= first and day >= start:
+            yield day.isoformat()
+        index += 1
+
+
+def pending_start(rule):
+    # First date that has not been written as an expense yet.
+    if rule.materialized_through is None:
+        return rule.start_date
+    return max(rule.start_date, (date.fromisoformat(rule.materialized_through) + timedelta(days=1)).isoformat())
+
+
+def occurrences(rule, start, end):
+    for day in rule_dates(rule, max(start, pending_start(rule)), end):
+        yield Occurrence(day, rule.id, rule.amount, rule.category_id, rule.description, rule.type)
+
+
+def project(rules, start, end):
+    # Every rule's unwritten occurrences in [start, end), merged in date order
+    # without building the whole list.
+    return heapq.merge(*(occurrences(rule, start, end) for rule in rules))
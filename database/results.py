@@ -0,0 +1,151 @@
+import sys
+from array import array
+from collections import namedtuple
+from datetime import date
+
+from database.money import from_minor_units, to_minor_units
+
+TYPES = ('expense', 'income')
+
+# julianday('0001-01-01') is 1721425.5 and date.toordinal() of that day is 1.
+ORDINAL_OFFSET = 1721424.5
+
+
+def select_columns(alias=''):
+    prefix = f'{alias}.' if alias else ''
+    return (f'{prefix}id, {prefix}amount, {prefix}category_id, '
+            f'CAST(julianday({prefix}date) - {ORDINAL_OFFSET} AS INTEGER), '
+            f'{prefix}description, {prefix}type')
+
+
+class ExpenseRow(namedtuple('ExpenseRow', 'id amount category_id date description type')):
+    # Indexable by position, attribute or column name, like sqlite3.Row.
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return getattr(self, key)
+        return super().__getitem__(key)
+
+    def keys(self):
+        return list(self._fields)
+
+
+class ExpenseColumns:
+    # Column-oriented list of expenses: ids, amounts (minor units) and date
+    # ordinals in typed arrays, category and type as small codes, and each
+    # distinct description stored once. Rows are built only when accessed.
+
+    def __init__(self):
+        self.ids = array('q')
+        self.amounts = array('q')
+        self.dates = array('i')
+        self.category_codes = array('H')
+        self.type_codes = array('B')
+        self.descriptions = []
+        self.categories = []
+        self._category_index = {}
+        self._strings = {}
+
+    @classmethod
+    def from_cursor(cls, cursor, batch_size=10000):
+        # The cursor must return plain tuples in select_columns() order; any
+        # extra trailing columns (such as a sort key) are ignored.
+        columns = cls()
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                return columns
+            columns._append_raw(batch)
+
+    @classmethod
+    def from_rows(cls, rows):
+        # Tuples in select_columns() order, as from_cursor() reads them.
+        columns = cls()
+        if rows:
+            columns._append_raw(rows)
+        return columns
+
+    def _append_raw(self, batch):
+        ids, amounts, category_ids, ordinals, descriptions, types = list(zip(*batch))[:6]
+        self.ids.extend(ids)
+        self.amounts.extend(amounts)
+        self.dates.extend(ordinals)
+        self.category_codes.extend(map(self._category_code, category_ids))
+        self.type_codes.extend(kind == 'income' for kind in types)
+        strings = self._strings
+        self.descriptions.extend(strings.setdefault(text, text) for text in descriptions)
+
+    def _category_code(self, category_id):
+        code = self._category_index.get(category_id)
+        if code is None:
+            code = self._category_index[category_id] = len(self.categories)
+            self.categories.append(category_id)
+        return code
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return ExpenseRow(self.ids[index], self.amount(index), self.category_id(index),
+                          self.date(index), self.descriptions[index], self.type(index))
+
+    def amount(self, index):
+        return from_minor_units(self.amounts[index])
+
+    def category_id(self, index):
+        return self.categories[self.category_codes[index]]
+
+    def date(self, index):
+        return date.fromordinal(self.dates[index]).isoformat()
+
+    def type(self, index):
+        return TYPES[self.type_codes[index]]
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def key(self, index):
+        # (date, id) as used by the listing order and keyset pagination.
+        return self.date(index), self.ids[index]
+
+    def extend(self, other):
+        for category_id in other.categories:
+            self._category_code(category_id)
+        codes = [self._category_index[category_id] for category_id in other.categories]
+        self.ids.extend(other.ids)
+        self.amounts.extend(other.amounts)
+        self.dates.extend(other.dates)
+        self.category_codes.extend(codes[code] for code in other.category_codes)
+        self.type_codes.extend(other.type_codes)
+        self.descriptions.extend(other.descriptions)
+
+    def insert(self, index, expense):
+        description = expense['description']
+        self.ids.insert(index, expense['id'])
+        self.amounts.insert(index, to_minor_units(expense['amount']))
+        self.dates.insert(index, date.fromisoformat(expense['date']).toordinal())
+        self.category_codes.insert(index, self._category_code(expense['category_id']))
+        self.type_codes.insert(index, expense['type'] == 'income')
+        self.descriptions.insert(index, self._strings.setdefault(description, description))
+
+    def __delitem__(self, index):
+        del self.ids[index]
+        del self.amounts[index]
+        del self.dates[index]
+        del self.category_codes[index]
+        del self.type_codes[index]
+        del self.descriptions[index]
+
+    def nbytes(self):
+        arrays = (self.ids, self.amounts, self.dates, self.category_codes, self.type_codes)
+        total = sum(sys.getsizeof(column) for column in arrays)
+        total += sys.getsizeof(self.descriptions) + sys.getsizeof(self.categories)
+        total += sum(sys.getsizeof(text) for text in self._strings.values())
+        return total
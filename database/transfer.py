@@ -0,0 +1,60 @@
+import csv
+import json
+from decimal import Decimal
+from pathlib import Path
+
+EXPORT_COLUMNS = ('id', 'amount', 'category_id', 'date', 'description', 'type')
+FORMATS = ('csv', 'jsonl')
+BUFFER_SIZE = 1024 * 1024
+
+
+def detect_format(path, file_format=None):
+    if file_format:
+        return file_format
+    suffix = Path(path).suffix.lower()
+    if suffix in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    if suffix == '.csv':
+        return 'csv'
+    raise ValueError(f'Cannot tell the format of {path}; use csv or jsonl')
+
+
+def export_expenses(db, path, file_format=None, year=None, month=None, batch_size=5000):
+    file_format = detect_format(path, file_format)
+    rows = 0
+    with open(path, 'w', encoding='utf-8', newline='', buffering=BUFFER_SIZE) as handle:
+        if file_format == 'csv':
+            writer = csv.writer(handle)
+            writer.writerow(EXPORT_COLUMNS)
+            for batch in db.iter_expenses(year, month, batch_size):
+                writer.writerows(batch)
+                rows += len(batch)
+        else:
+            for batch in db.iter_expenses(year, month, batch_size):
+                handle.write(''.join(
+                    json.dumps(dict(zip(EXPORT_COLUMNS, row)), ensure_ascii=False, default=float) + '\n'
+                    for row in batch
+                ))
+                rows += len(batch)
+    return rows
+
+
+def read_records(path, file_format=None):
+    file_format = detect_format(path, file_format)
+    with open(path, 'r', encoding='utf-8', newline='', buffering=BUFFER_SIZE) as handle:
+        if file_format == 'csv':
+            lines = csv.DictReader(handle)
+        else:
+            lines = (json.loads(line, parse_float=Decimal) for line in handle if line.strip())
+        for record in lines:
+            yield {
+                'amount': record['amount'],
+                'category_id': int(record['category_id']),
+                'date': record['date'],
+                'description': record.get('description') or '',
+                'type': record.get('type') or 'expense'
+            }
+
+
+def import_expenses(db, path, file_format=None, chunk_size=5000):
+    return db.add_expenses_bulk(read_records(path, file_format), chunk_size=chunk_size)
@@ -0,0 +1,98 @@
+import time
+
+from PyQt5.QtCore import QObject, QTimer
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QPlainTextEdit,
+                             QFileDialog, QLabel)
+
+from utils.diagnostics import diagnostics
+
+STALL_TICK_MS = 20
+
+
+class StallMonitor(QObject):
+    # A timer that should fire every STALL_TICK_MS; when it fires late the
+    # GUI thread was blocked, and the delay is recorded as a stall.
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.timer = QTimer(self)
+        self.timer.setInterval(STALL_TICK_MS)
+        self.timer.timeout.connect(self.tick)
+        self.last = None
+
+    def start(self):
+        self.last = time.perf_counter()
+        self.timer.start()
+
+    def stop(self):
+        self.timer.stop()
+
+    def tick(self):
+        now = time.perf_counter()
+        late = (now - self.last) * 1000 - STALL_TICK_MS
+        self.last = now
+        if late >= diagnostics.stall_ms:
+            diagnostics.stall(late, now)
+
+
+def format_report(report):
+    lines = [f"slow query >= {report['slow_query_ms']} ms, stall >= {report['stall_ms']} ms", '']
+    lines.append(f"{'timer':<32} {'count':>7} {'mean ms':>9} {'p95 ms':>8} {'max ms':>9}")
+    for name, histogram in report['histograms'].items():
+        lines.append(f"{name:<32} {histogram['count']:7d} {histogram['mean_ms']:9.2f} "
+                     f"{histogram['p95_ms']:8.2f} {histogram['max_ms']:9.2f}")
+    lines += ['', 'counters: ' + ', '.join(f'{name}={value}' for name, value in report['counters'].items())]
+
+    lines += ['', f"{'total ms':>9} {'count':>7} {'rows':>8}  statement"]
+    for stats in report['statements'][:20]:
+        lines.append(f"{stats['total_ms']:9.1f} {stats['count']:7d} {stats['rows']:8d}  {stats['sql'][:120]}")
+
+    lines += ['', 'slow queries:']
+    for query in reversed(report['slow_queries']):
+        lines.append(f"{query['ms']:9.1f} ms  {query['sql'][:160]}")
+        lines += [f'             {detail}' for detail in query['plan'] or ()]
+
+    lines += ['', 'stalls:']
+    for stall in reversed(report['stalls']):
+        lines.append(f"{stall['ms']:9.1f} ms  {', '.join(stall['during']) or '-'}")
+    return '\n'.join(lines)
+
+
+class DiagnosticsTab(QWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        layout = QVBoxLayout()
+
+        buttons = QHBoxLayout()
+        refresh_btn = QPushButton('🔄 تحديث')
+        refresh_btn.clicked.connect(self.refresh)
+        save_btn = QPushButton('💾 حفظ JSON')
+        save_btn.clicked.connect(self.save)
+        reset_btn = QPushButton('🧹 تصفير')
+        reset_btn.clicked.connect(self.reset)
+        buttons.addWidget(refresh_btn)
+        buttons.addWidget(save_btn)
+        buttons.addWidget(reset_btn)
+        buttons.addStretch()
+        layout.addLayout(buttons)
+
+        if not diagnostics.enabled:
+            layout.addWidget(QLabel('القياس متوقف؛ شغّل البرنامج مع --diagnostics'))
+        self.text = QPlainTextEdit()
+        self.text.setReadOnly(True)
+        self.text.setLineWrapMode(QPlainTextEdit.NoWrap)
+        self.text.setStyleSheet('font-family: monospace;')
+        layout.addWidget(self.text)
+        self.setLayout(layout)
+
+    def refresh(self):
+        self.text.setPlainText(format_report(diagnostics.to_dict()))
+
+    def save(self):
+        path, _ = QFileDialog.getSaveFileName(self, 'حفظ القياسات', 'diagnostics.json', 'JSON (*.json)')
+        if path:
+            diagnostics.dump(path)
+
+    def reset(self):
+        diagnostics.reset()
+        self.refresh()
@@ -1,14 +1,16 @@
 from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel,
                              QLineEdit, QComboBox, QDateEdit, QDoubleSpinBox,
-                             QPushButton, QMessageBox, QRadioButton, QButtonGroup)
+                             QPushButton, QMessageBox, QRadioButton, QButtonGroup,
+                             QCheckBox, QSpinBox)
 from PyQt5.QtCore import Qt, QDate
 from PyQt5.QtGui import QFont, QIcon
 from datetime import datetime
 
 class AddExpenseDialog(QDialog):
-    def __init__(self, parent, db):
+    def __init__(self, parent, db, executor=None):
         super().__init__(parent)
         self.db = db
+        self.executor = executor
         self.init_ui()
     
     def init_ui(self):
@@ -118,29 +120,41 @@ class AddExpenseDialog(QDialog):
         description_layout.addWidget(self.description_input)
         layout.addLayout(description_layout)
         
+        recurring_layout = QHBoxLayout()
+        self.recurring_check = QCheckBox('🔁 تكرار كل')
+        recurring_layout.addWidget(self.recurring_check)
+        self.interval_input = QSpinBox()
+        self.interval_input.setRange(1, 12)
+        self.interval_input.setSuffix(' شهر')
+        self.interval_input.setMinimumHeight(30)
+        self.interval_input.setEnabled(False)
+        self.recurring_check.toggled.connect(self.interval_input.setEnabled)
+        recurring_layout.addWidget(self.interval_input)
+        recurring_layout.addStretch()
+        layout.addLayout(recurring_layout)
+        
         layout.addSpacing(10)
         
         button_layout = QHBoxLayout()
         button_layout.setSpacing(10)
         
-        save_btn = QPushButton('✅ حفظ')
-        save_btn.setObjectName('saveBtn')
-        save_btn.clicked.connect(self.save_expense)
+        self.save_btn = QPushButton('✅ حفظ')
+        self.save_btn.setObjectName('saveBtn')
+        self.save_btn.clicked.connect(self.save_expense)
         
         cancel_btn = QPushButton('❌ إلغاء')
         cancel_btn.setObjectName('cancelBtn')
         cancel_btn.clicked.connect(self.reject)
         
-        button_layout.addWidget(save_btn)
+        button_layout.addWidget(self.save_btn)
         button_layout.addWidget(cancel_btn)
         layout.addLayout(button_layout)
         
         self.setLayout(layout)
     
     def load_categories(self):
-        categories = self.db.get_categories()
-        for category in categories:
-            self.category_combo.addItem(category['name'], category['id'])
+        for category in self.db.categories:
+            self.category_combo.addItem(category.name, category.id)
     
     def save_expense(self):
         try:
@@ -154,9 +168,36 @@ class AddExpenseDialog(QDialog):
             description = self.description_input.text()
             expense_type = 'income' if self.income_radio.isChecked() else 'expense'
             
-            self.db.add_expense(amount, category_id, date_str, description, expense_type)
+            if self.recurring_check.isChecked():
+                # The rule writes this date's entry too, if it is already due.
+                interval = self.interval_input.value()
+                
+                def save(db):
+                    db.add_recurring_rule(amount, category_id, date_str, description, expense_type, interval)
+                    return db.materialize_recurring()
+            else:
+                def save(db):
+                    return db.add_expense(amount, category_id, date_str, description, expense_type)
+            
+            if self.executor is None:
+                save(self.db)
+                self.on_saved(None)
+                return
             
-            QMessageBox.information(self, 'نجح', 'تم إضافة المصروف بنجاح')
-            self.accept()
+            self.save_btn.setEnabled(False)
+            self.executor.submit('save-expense', save, self.on_saved, self.on_save_failed, writes=True)
         except Exception as e:
-            QMessageBox.critical(self, 'خطأ', f'حدث خطأ: {str(e)}')
+            self.on_save_failed(str(e))
+    
+    def reject(self):
+        if not self.save_btn.isEnabled():
+            return
+        super().reject()
+    
+    def on_saved(self, expense_id):
+        QMessageBox.information(self, 'نجح', 'تم إضافة المصروف بنجاح')
+        self.accept()
+    
+    def on_save_failed(self, message):
+        self.save_btn.setEnabled(True)
+        QMessageBox.critical(self, 'خطأ', f'حدث خطأ: {message}')
@@ -1,24 +1,65 @@
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-                             QPushButton, QTableWidget, QTableWidgetItem, QTabWidget,
+                             QPushButton, QTableWidget, QTableWidgetItem, QTableView, QTabWidget,
                              QLabel, QDialog, QLineEdit, QComboBox, QDateEdit,
-                             QSpinBox, QDoubleSpinBox, QMessageBox, QHeaderView, QScrollArea)
-from PyQt5.QtCore import Qt, QDate, pyqtSignal
-from PyQt5.QtGui import QFont, QColor, QIcon, QBrush
+                             QSpinBox, QDoubleSpinBox, QMessageBox, QHeaderView, QScrollArea,
+                             QShortcut)
+from PyQt5.QtCore import Qt, QDate, QTimer, pyqtSignal
+from PyQt5.QtGui import QFont, QColor, QIcon, QBrush, QPixmap, QKeySequence
 from datetime import datetime, date
 import sys
 from pathlib import Path
 
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from database.db_manager import DatabaseManager
+from database.db_manager import DatabaseManager, SEARCH_RANK_WINDOW
 from gui.dialogs import AddExpenseDialog
+from gui.diagnostics import StallMonitor, DiagnosticsTab
+from gui.models import ExpensesTableModel, ColorDelegate, CategoryBrushes
+from gui.workers import QueryExecutor, ChartRenderer
+from utils.charts import chart_spec
+from utils.diagnostics import diagnostics
+
+SEARCH_DELAY_MS = 250
+SEARCH_LIMIT = 500
+
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, db_name='expenses.db', startup=None):
         super().__init__()
-        self.db = DatabaseManager()
+        self.startup = startup
+        self.db = DatabaseManager(db_name)
+        self.mark_startup('open database')
+        self.executor = QueryExecutor(self.db.db_path, parent=self)
+        self.brushes = CategoryBrushes(self.db.categories)
+        self.chart_renderer = ChartRenderer(parent=self)
+        self.chart_renderer.rendered.connect(self.show_chart_image)
+        self.chart_keys = {}
+        self.search_text = ''
+        self.charts_state = None
+        self.reports_state = None
+        self.balance_state = None
+        self.painted = False
+        self.tab_diagnostics = None
+        self.stall_monitor = StallMonitor(self)
+        if diagnostics.enabled:
+            self.stall_monitor.start()
         self.init_ui()
-        self.load_data()
+        self.executor.expense_changed.connect(self.on_expense_changed)
+        self.db.add_change_listener(self.on_expense_changed)
+        self.mark_startup('build window')
+    
+    def mark_startup(self, phase):
+        if self.startup is not None:
+            self.startup.mark(phase)
+    
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.painted:
+            # Query the first screenful only once the window is on screen.
+            self.painted = True
+            self.mark_startup('first paint')
+            QTimer.singleShot(0, self.load_data)
+            QTimer.singleShot(0, self.materialize_recurring)
     
     def init_ui(self):
         self.setWindowTitle('💰 Expense Manager - إدارة المصاريف الشخصية')
@@ -67,11 +108,36 @@ class MainWindow(QMainWindow):
         self.tab_widget.addTab(self.tab_reports, '📋 التقارير')
         
         self.setup_expenses_tab()
-        self.setup_charts_tab()
-        self.setup_reports_tab()
+        # The statistics and reports tabs are built the first time they are shown.
+        self.tab_builders = {
+            self.tab_charts: self.setup_charts_tab,
+            self.tab_reports: self.setup_reports_tab
+        }
+        self.tab_widget.currentChanged.connect(
+            lambda index: self.ensure_tab(self.tab_widget.widget(index)))
         
         main_layout.addWidget(self.tab_widget)
         central_widget.setLayout(main_layout)
+        
+        self.loading_label = QLabel('⏳ جاري التحميل...')
+        self.loading_label.setVisible(False)
+        self.statusBar().addPermanentWidget(self.loading_label)
+        self.executor.busy_changed.connect(self.loading_label.setVisible)
+        
+        # Hidden until asked for.
+        QShortcut(QKeySequence('Ctrl+Shift+D'), self, self.show_diagnostics)
+    
+    def show_diagnostics(self):
+        if self.tab_diagnostics is None:
+            self.tab_diagnostics = DiagnosticsTab()
+            self.tab_widget.addTab(self.tab_diagnostics, '🩺 القياسات')
+        self.tab_diagnostics.refresh()
+        self.tab_widget.setCurrentWidget(self.tab_diagnostics)
+    
+    def ensure_tab(self, tab):
+        builder = self.tab_builders.pop(tab, None)
+        if builder is not None:
+            builder()
     
     def create_header(self):
         header = QWidget()
@@ -128,7 +194,7 @@ class MainWindow(QMainWindow):
             QPushButton:pressed {
                 background-color: #1565C0;
             }
-            QTableWidget {
+            QTableView {
                 background-color: white;
                 alternate-background-color: #f5f5f5;
                 gridline-color: #ddd;
@@ -136,7 +202,7 @@ class MainWindow(QMainWindow):
                 border-radius: 4px;
                 color: #333;
             }
-            QTableWidget::item {
+            QTableView::item {
                 padding: 5px;
                 color: #333;
             }
@@ -214,22 +280,36 @@ class MainWindow(QMainWindow):
         button_layout.addWidget(refresh_btn)
         
         button_layout.addStretch()
+        
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText('🔍 بحث في الوصف (الأحدث أولاً)...')
+        self.search_edit.setToolTip(f'تُرتَّب أفضل النتائج من بين أحدث {SEARCH_RANK_WINDOW} عملية مطابقة')
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_edit.setMinimumWidth(250)
+        self.search_edit.setMinimumHeight(40)
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DELAY_MS)
+        self.search_timer.timeout.connect(self.run_search)
+        self.search_edit.textChanged.connect(self.search_timer.start)
+        button_layout.addWidget(self.search_edit)
+        
         layout.addLayout(button_layout)
         
-        self.table_widget = QTableWidget()
-        self.table_widget.setColumnCount(7)
-        self.table_widget.setHorizontalHeaderLabels([
-            'ID', 'المبلغ', 'الفئة', 'التاريخ', 'الوصف', 'النوع', 'اللون'
-        ])
+        self.expenses_model = ExpensesTableModel(self.db, executor=self.executor, parent=self)
+        self.table_view = QTableView()
+        self.table_view.setModel(self.expenses_model)
+        self.table_view.setItemDelegateForColumn(ExpensesTableModel.COLOR_COLUMN,
+                                                 ColorDelegate(self.brushes, self.table_view))
         
-        self.table_widget.setAlternatingRowColors(True)
-        self.table_widget.setSelectionBehavior(1)
-        self.table_widget.setSelectionMode(1)
+        self.table_view.setAlternatingRowColors(True)
+        self.table_view.setSelectionBehavior(1)
+        self.table_view.setSelectionMode(1)
         
-        header = self.table_widget.horizontalHeader()
+        header = self.table_view.horizontalHeader()
         header.setSectionResizeMode(QHeaderView.Stretch)
         
-        layout.addWidget(self.table_widget)
+        layout.addWidget(self.table_view)
         self.tab_expenses.setLayout(layout)
     
     def setup_charts_tab(self):
@@ -274,6 +354,18 @@ class MainWindow(QMainWindow):
         filter_layout.addStretch()
         layout.addLayout(filter_layout)
         
+        images_layout = QHBoxLayout()
+        images_layout.setSpacing(15)
+        self.chart_images = {}
+        for kind in ('pie', 'bar'):
+            image = QLabel()
+            image.setAlignment(Qt.AlignCenter)
+            image.setMinimumHeight(320)
+            image.setStyleSheet("background-color: white; border: 1px solid #ddd; border-radius: 4px;")
+            images_layout.addWidget(image)
+            self.chart_images[kind] = image
+        layout.addLayout(images_layout)
+        
         self.charts_table = QTableWidget()
         self.charts_table.setColumnCount(4)
         self.charts_table.setHorizontalHeaderLabels(['الفئة', 'المبلغ (ريال)', 'النسبة المئوية', 'النوع'])
@@ -364,6 +456,29 @@ class MainWindow(QMainWindow):
         """)
         summary_layout.addWidget(self.balance_label)
         
+        self.running_balance_label = QLabel('🏦 الرصيد التراكمي: 0.00 SAR')
+        self.running_balance_label.setFont(QFont('Arial', 13, QFont.Bold))
+        self.running_balance_label.setStyleSheet("""
+            color: #FF9800;
+            padding: 10px;
+            background-color: rgba(255, 152, 0, 0.1);
+            border-radius: 4px;
+            border-left: 4px solid #FF9800;
+        """)
+        summary_layout.addWidget(self.running_balance_label)
+        
+        self.forecast_label = QLabel()
+        self.forecast_label.setFont(QFont('Arial', 13, QFont.Bold))
+        self.forecast_label.setStyleSheet("""
+            color: #9C27B0;
+            padding: 10px;
+            background-color: rgba(156, 39, 176, 0.1);
+            border-radius: 4px;
+            border-left: 4px solid #9C27B0;
+        """)
+        self.forecast_label.setVisible(False)
+        summary_layout.addWidget(self.forecast_label)
+        
         summary_layout.addStretch()
         layout.addLayout(summary_layout)
         
@@ -376,60 +491,169 @@ class MainWindow(QMainWindow):
         header = self.report_table.horizontalHeader()
         header.setSectionResizeMode(QHeaderView.Stretch)
         
-        layout.addWidget(self.report_table)
+        self.balance_table = QTableWidget()
+        self.balance_table.setColumnCount(2)
+        self.balance_table.setHorizontalHeaderLabels(['اليوم', 'الرصيد التراكمي (ريال)'])
+        self.balance_table.setAlternatingRowColors(True)
+        self.balance_table.setSelectionBehavior(1)
+        self.balance_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        
+        tables_layout = QHBoxLayout()
+        tables_layout.addWidget(self.report_table, 2)
+        tables_layout.addWidget(self.balance_table, 1)
+        layout.addLayout(tables_layout)
         self.tab_reports.setLayout(layout)
     
     def add_expense(self):
-        dialog = AddExpenseDialog(self, self.db)
-        if dialog.exec_() == QDialog.Accepted:
-            self.load_data()
-            self.update_charts()
-            self.update_reports()
+        dialog = AddExpenseDialog(self, self.db, self.executor)
+        dialog.exec_()
     
     def delete_expense(self):
-        current_row = self.table_widget.currentRow()
+        current_row = self.table_view.currentIndex().row()
         if current_row < 0:
             QMessageBox.warning(self, 'تنبيه', 'الرجاء اختيار مصروف للحذف')
             return
         
-        expense_id = int(self.table_widget.item(current_row, 0).text())
+        expense_id = self.expenses_model.expense_id(current_row)
         reply = QMessageBox.question(self, 'تأكيد', 'هل تريد حذف هذا المصروف؟')
         
         if reply == QMessageBox.Yes:
-            self.db.delete_expense(expense_id)
+            self.executor.submit('delete-expense',
+                                 lambda db: db.delete_expense(expense_id),
+                                 self.on_expense_deleted, self.show_query_error, writes=True)
+    
+    def on_expense_deleted(self, deleted):
+        # The table updates from the change event; only a miss needs a message.
+        if not deleted:
+            QMessageBox.warning(self, 'تنبيه', 'لم يعد هذا المصروف موجوداً')
+            self.load_data()
+    
+    def run_search(self):
+        self.search_text = self.search_edit.text().strip()
+        if not self.search_text:
+            self.executor.cancel('expenses-search')
             self.load_data()
-            self.update_charts()
-            self.update_reports()
+            return
+        
+        text = self.search_text
+        self.executor.submit('expenses-search',
+                             lambda db: db.search_expenses(text, SEARCH_LIMIT),
+                             self.show_search_results, self.show_query_error)
+    
+    def show_search_results(self, rows):
+        if self.search_text:
+            self.expenses_model.show_rows(rows)
     
+    def on_expense_changed(self, change):
+        if change.kind == 'categories_changed':
+            self.db.categories.refresh()
+            self.table_view.viewport().update()
+            return
+        if change.kind == 'bulk_inserted':
+            self.load_data()
+            if self.charts_state is not None:
+                self.update_charts()
+            if self.reports_state is not None:
+                self.update_reports()
+            return
+        
+        # Search results are ordered by relevance, so they are re-queried
+        # instead of patched in place.
+        searching = bool(self.search_text)
+        if change.kind in ('deleted', 'updated'):
+            removed = change.previous if change.kind == 'updated' else change
+            if not searching:
+                self.expenses_model.remove_expense(removed.expense_id, removed.date)
+            self.apply_summary_change(removed, -1)
+        if change.kind in ('inserted', 'updated'):
+            if not searching:
+                self.expenses_model.insert_expense(self.expense_row(change))
+            self.apply_summary_change(change, 1)
+        if searching:
+            self.run_search()
+    
+    def expense_row(self, change):
+        return {
+            'id': change.expense_id,
+            'amount': change.amount,
+            'category_id': change.category_id,
+            'date': change.date,
+            'description': change.description,
+            'type': change.type
+        }
+    
+    def apply_summary_change(self, change, sign):
+        if self.balance_state is not None and change.date < self.balance_state[0]:
+            # Every day from the change onwards moves by the same amount.
+            delta = sign * (change.amount if change.type == 'income' else -change.amount)
+            for item in self.balance_state[1]:
+                if item[0] >= change.date:
+                    item[1] += delta
+            self.show_balances(self.balance_state[1])
+        period = change.date[:7]
+        if self.charts_state is not None and self.charts_state[0] == period:
+            self.adjust_summary(self.charts_state[1], change, sign)
+            self.show_charts(self.charts_state[1])
+        if self.reports_state is not None and self.reports_state[0] == period:
+            self.adjust_summary(self.reports_state[1], change, sign)
+            self.show_reports(self.reports_state[1])
+    
+    def adjust_summary(self, rows, change, sign):
+        for item in rows:
+            if item['category_id'] == change.category_id and item['type'] == change.type:
+                item['total'] += sign * change.amount
+                item['count'] += sign
+                break
+        else:
+            if sign < 0:
+                return
+            rows.append({'category_id': change.category_id, 'total': change.amount,
+                         'type': change.type, 'count': 1})
+        rows[:] = [item for item in rows if item['count'] > 0]
+        rows.sort(key=lambda item: item['total'], reverse=True)
+    
+    def show_query_error(self, message):
+        QMessageBox.critical(self, 'خطأ', f'حدث خطأ: {message}')
+    
+    def materialize_recurring(self):
+        # Due recurring entries arrive as a bulk_inserted change, which reloads the views.
+        self.executor.submit('materialize-recurring',
+                             lambda db: db.materialize_recurring(),
+                             lambda count: None, self.show_query_error, writes=True)
+    
+    @diagnostics.timed('ui.load_data')
     def load_data(self):
-        expenses = self.db.get_all_expenses()
-        self.table_widget.setRowCount(len(expenses))
-        
-        for row, expense in enumerate(expenses):
-            self.table_widget.setItem(row, 0, QTableWidgetItem(str(expense['id'])))
-            self.table_widget.setItem(row, 1, QTableWidgetItem(f"{expense['amount']:.2f}"))
-            self.table_widget.setItem(row, 2, QTableWidgetItem(expense['category']))
-            self.table_widget.setItem(row, 3, QTableWidgetItem(expense['date']))
-            self.table_widget.setItem(row, 4, QTableWidgetItem(expense['description'] or ''))
-            self.table_widget.setItem(row, 5, QTableWidgetItem(expense['type']))
-            
-            color_item = QTableWidgetItem()
-            color = QColor(expense['color'])
-            color_item.setBackground(color)
-            self.table_widget.setItem(row, 6, color_item)
+        if self.search_text:
+            self.run_search()
+            return
+        self.expenses_model.reload()
     
+    @diagnostics.timed('ui.update_charts')
     def update_charts(self):
+        self.ensure_tab(self.tab_charts)
         year = self.year_combo.currentText()
         month = self.month_combo.currentIndex() + 1
         
-        category_data = self.db.get_category_summary(year, month)
+        period = DatabaseManager.month_period(year, month)
         
+        self.executor.submit('charts',
+                             lambda db: db.get_category_summary(year, month),
+                             lambda data: self.set_charts_data(period, data),
+                             self.show_query_error)
+    
+    def set_charts_data(self, period, category_data):
+        self.charts_state = (period, [dict(row) for row in category_data])
+        self.show_charts(self.charts_state[1])
+    
+    @diagnostics.timed('ui.show_charts')
+    def show_charts(self, category_data):
         total_expenses = sum(item['total'] for item in category_data if item['type'] == 'expense')
         
         self.charts_table.setRowCount(len(category_data))
         
         for row, item in enumerate(category_data):
-            self.charts_table.setItem(row, 0, QTableWidgetItem(item['name']))
+            name = self.db.categories.name(item['category_id'])
+            self.charts_table.setItem(row, 0, QTableWidgetItem(name))
             self.charts_table.setItem(row, 1, QTableWidgetItem(f"{item['total']:.2f}"))
             
             percentage = (item['total'] / total_expenses * 100) if total_expenses > 0 else 0
@@ -437,35 +661,79 @@ class MainWindow(QMainWindow):
             self.charts_table.setItem(row, 3, QTableWidgetItem(item['type']))
             
             color_item = QTableWidgetItem()
-            color = QColor(item['color'])
-            color_item.setBackground(color)
+            color_item.setBackground(self.brushes.brush(item['category_id']))
             self.charts_table.setItem(row, 0, color_item)
-            self.charts_table.item(row, 0).setText(item['name'])
+            self.charts_table.item(row, 0).setText(name)
+        
+        expense_data = [item for item in category_data if item['type'] == 'expense']
+        self.request_chart('pie', expense_data, 'توزيع المصاريف')
+        self.request_chart('bar', expense_data, 'المصاريف حسب الفئة')
     
+    def request_chart(self, kind, data, title):
+        spec = chart_spec(kind, data, title, self.db.categories)
+        key, image = self.chart_renderer.request(spec)
+        self.chart_keys[kind] = key
+        if image is not None:
+            self.show_chart_image(key, image)
+    
+    def show_chart_image(self, key, image):
+        for kind, current in self.chart_keys.items():
+            if current == key:
+                pixmap = QPixmap()
+                pixmap.loadFromData(image, 'PNG')
+                self.chart_images[kind].setPixmap(pixmap)
+    
+    @diagnostics.timed('ui.update_reports')
     def update_reports(self):
+        self.ensure_tab(self.tab_reports)
         year = self.report_year_combo.currentText()
         month = self.report_month_combo.currentIndex() + 1
         
-        expenses_data = self.db.get_expenses_by_month(year, month)
-        
-        income = sum(item['amount'] for item in expenses_data if item['type'] == 'income')
-        expenses = sum(item['amount'] for item in expenses_data if item['type'] == 'expense')
+        period = DatabaseManager.month_period(year, month)
+        
+        self.executor.submit('reports',
+                             lambda db: db.get_category_summary(year, month),
+                             lambda data: self.set_reports_data(period, data),
+                             self.show_query_error)
+        
+        start, end = DatabaseManager.month_range(year, month)
+        self.executor.submit('balances',
+                             lambda db: db.get_daily_balances(start, end),
+                             lambda data: self.set_balance_data(end, data),
+                             self.show_query_error)
+        self.executor.submit('forecast',
+                             lambda db: list(db.project_recurring(start, end)),
+                             self.show_forecast, self.show_query_error)
+    
+    def show_forecast(self, occurrences):
+        # Recurring entries of the month that are not due yet; never written as rows.
+        net = sum(item.amount if item.type == 'income' else -item.amount for item in occurrences)
+        self.forecast_label.setText(f'🔁 متكرر متوقع ({len(occurrences)}): {net:+.2f}')
+        self.forecast_label.setVisible(bool(occurrences))
+    
+    def set_reports_data(self, period, category_data):
+        self.reports_state = (period, [dict(row) for row in category_data])
+        self.show_reports(self.reports_state[1])
+    
+    @diagnostics.timed('ui.show_reports')
+    def show_reports(self, category_data):
+        income = sum(item['total'] for item in category_data if item['type'] == 'income')
+        expenses = sum(item['total'] for item in category_data if item['type'] == 'expense')
         balance = income - expenses
         
         self.income_label.setText(f'الدخل: {income:.2f}')
         self.expenses_label.setText(f'المصاريف: {expenses:.2f}')
         self.balance_label.setText(f'الرصيد: {balance:.2f}')
         
-        category_data = self.db.get_category_summary(year, month)
-        
         category_summary = {}
         for item in category_data:
-            if item['name'] not in category_summary:
-                category_summary[item['name']] = {'income': 0, 'expenses': 0}
+            name = self.db.categories.name(item['category_id'])
+            if name not in category_summary:
+                category_summary[name] = {'income': 0, 'expenses': 0}
             if item['type'] == 'income':
-                category_summary[item['name']]['income'] = item['total']
+                category_summary[name]['income'] = item['total']
             else:
-                category_summary[item['name']]['expenses'] = item['total']
+                category_summary[name]['expenses'] = item['total']
         
         self.report_table.setRowCount(len(category_summary))
         
@@ -475,6 +743,25 @@ class MainWindow(QMainWindow):
             self.report_table.setItem(row, 2, QTableWidgetItem(f"{data['expenses']:.2f}"))
             self.report_table.setItem(row, 3, QTableWidgetItem(f"{data['income'] - data['expenses']:.2f}"))
     
+    def set_balance_data(self, end, balances):
+        self.balance_state = (end, [[row['day'], row['balance']] for row in balances])
+        self.show_balances(self.balance_state[1])
+    
+    @diagnostics.timed('ui.show_balances')
+    def show_balances(self, balances):
+        closing = balances[-1][1] if balances else 0
+        self.running_balance_label.setText(f'الرصيد التراكمي: {closing:.2f}')
+        
+        self.balance_table.setRowCount(len(balances))
+        for row, (day, balance) in enumerate(balances):
+            self.balance_table.setItem(row, 0, QTableWidgetItem(day))
+            self.balance_table.setItem(row, 1, QTableWidgetItem(f'{balance:.2f}'))
+    
     def closeEvent(self, event):
+        # Commits any grouped writes before the connections close.
+        self.stall_monitor.stop()
+        self.executor.flush()
+        self.executor.shutdown()
+        self.chart_renderer.shutdown()
         self.db.close()
         event.accept()
@@ -0,0 +1,194 @@
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QVariant, pyqtSignal
+from PyQt5.QtWidgets import QStyledItemDelegate
+from PyQt5.QtGui import QColor, QBrush
+
+from database.results import ExpenseColumns
+from utils.diagnostics import diagnostics
+
+CATEGORY_ROLE = Qt.UserRole + 1
+
+
+class CategoryBrushes:
+    def __init__(self, categories):
+        self.categories = categories
+        self._version = None
+        self._colors = {}
+        self._brushes = {}
+
+    def _sync(self):
+        if self._version == self.categories.version:
+            return
+        self._colors = {category.id: QColor(category.color) for category in self.categories}
+        self._brushes = {category_id: QBrush(color) for category_id, color in self._colors.items()}
+        self._version = self.categories.version
+
+    def color(self, category_id):
+        self._sync()
+        return self._colors.get(category_id)
+
+    def brush(self, category_id):
+        self._sync()
+        return self._brushes.get(category_id)
+
+
+class ExpensesTableModel(QAbstractTableModel):
+    HEADERS = ['ID', 'المبلغ', 'الفئة', 'التاريخ', 'الوصف', 'النوع', 'اللون']
+    COLOR_COLUMN = 6
+
+    page_loaded = pyqtSignal(int)
+
+    def __init__(self, db, page_size=200, executor=None, filters=None, parent=None):
+        super().__init__(parent)
+        self.db = db
+        self.page_size = page_size
+        self.executor = executor
+        self.filters = filters
+        self._rows = ExpenseColumns()
+        # Nothing is fetched until the first reload(), so attaching the model
+        # to a view does not query the database before the window is painted.
+        self._exhausted = True
+        self._loading = False
+
+    def reload(self):
+        self.beginResetModel()
+        if self.executor is not None:
+            self.executor.cancel('expenses-page')
+        self._rows = ExpenseColumns()
+        self._exhausted = False
+        self._loading = False
+        self.endResetModel()
+
+    def show_rows(self, rows):
+        # Shows a fixed result set (search results) instead of paging.
+        self.beginResetModel()
+        if self.executor is not None:
+            self.executor.cancel('expenses-page')
+        self._rows = ExpenseColumns()
+        self._rows.extend(rows)
+        self._exhausted = True
+        self._loading = False
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.HEADERS)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return not self._exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted or self._loading:
+            return
+        after = self._rows.key(len(self._rows) - 1) if len(self._rows) else None
+        limit, filters = self.page_size, self.filters
+        if self.executor is None:
+            self._on_page_loaded(self.db.get_expenses_page(after, limit, filters))
+            return
+
+        self._loading = True
+        self.executor.submit('expenses-page',
+                             lambda db: db.get_expenses_page(after, limit, filters),
+                             self._on_page_loaded, self._on_page_failed)
+
+    @diagnostics.timed('ui.page_loaded')
+    def _on_page_loaded(self, page):
+        self._loading = False
+        self._append_page(page)
+        self.page_loaded.emit(len(page))
+
+    def _on_page_failed(self, message):
+        self._loading = False
+        self._exhausted = True
+
+    def _append_page(self, page):
+        if len(page) < self.page_size:
+            self._exhausted = True
+        if not page:
+            return
+        first = len(self._rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(page) - 1)
+        self._rows.extend(page)
+        self.endInsertRows()
+
+    def _position(self, date, expense_id):
+        # Rows are ordered by (date, id) descending, matching get_expenses_page.
+        key = (date, expense_id)
+        low, high = 0, len(self._rows)
+        while low < high:
+            middle = (low + high) // 2
+            if self._rows.key(middle) > key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def insert_expense(self, expense):
+        if self._loading:
+            self.reload()
+            return
+        position = self._position(expense['date'], expense['id'])
+        if position == len(self._rows) and not self._exhausted:
+            return
+        self.beginInsertRows(QModelIndex(), position, position)
+        self._rows.insert(position, expense)
+        self.endInsertRows()
+
+    def remove_expense(self, expense_id, date):
+        if self._loading:
+            self.reload()
+            return
+        position = self._position(date, expense_id)
+        if position < len(self._rows) and self._rows.ids[position] == expense_id:
+            self.beginRemoveRows(QModelIndex(), position, position)
+            del self._rows[position]
+            self.endRemoveRows()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return QVariant()
+        rows, row, column = self._rows, index.row(), index.column()
+
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return str(rows.ids[row])
+            if column == 1:
+                return f"{rows.amount(row):.2f}"
+            if column == 2:
+                return self.db.categories.name(rows.category_id(row))
+            if column == 3:
+                return rows.date(row)
+            if column == 4:
+                return rows.descriptions[row] or ''
+            if column == 5:
+                return rows.type(row)
+        elif role == CATEGORY_ROLE and column == self.COLOR_COLUMN:
+            return rows.category_id(row)
+        return QVariant()
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def expense_id(self, row):
+        return self._rows.ids[row]
+
+
+class ColorDelegate(QStyledItemDelegate):
+    def __init__(self, brushes, parent=None):
+        super().__init__(parent)
+        self.brushes = brushes
+
+    def paint(self, painter, option, index):
+        super().paint(painter, option, index)
+        brush = self.brushes.brush(index.data(CATEGORY_ROLE))
+        if brush is not None:
+            painter.fillRect(option.rect.adjusted(1, 1, -1, -1), brush)
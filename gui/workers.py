@@ -0,0 +1,266 @@
+import multiprocessing
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+
+from database.db_manager import DatabaseManager, GROUP_COMMIT_INTERVAL
+from utils.charts import ChartCache, chart_key, render_chart
+from utils.diagnostics import diagnostics
+
+
+class _QueryTask(QRunnable):
+    def __init__(self, executor, key, token, func, writes=False):
+        super().__init__()
+        self.executor = executor
+        self.key = key
+        self.token = token
+        self.func = func
+        self.writes = writes
+        self.setAutoDelete(False)
+
+    def run(self):
+        self.executor._execute(self)
+
+
+class QueryExecutor(QObject):
+    busy_changed = pyqtSignal(bool)
+    expense_changed = pyqtSignal(object)
+    _finished = pyqtSignal(str, int, object)
+    _failed = pyqtSignal(str, int, str)
+
+    def __init__(self, db_path, max_threads=2, durability='grouped', parent=None):
+        super().__init__(parent)
+        self.db_path = str(db_path)
+        self.durability = durability
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_threads)
+        # Worker threads must not expire: each one owns a SQLite connection.
+        self.pool.setExpiryTimeout(-1)
+        # Writes run in order on a single thread whose connection groups
+        # commits, so an uncommitted group never blocks another writer.
+        self.write_pool = QThreadPool(self)
+        self.write_pool.setMaxThreadCount(1)
+        self.write_pool.setExpiryTimeout(-1)
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(int(GROUP_COMMIT_INTERVAL * 1000))
+        self.flush_timer.timeout.connect(self.flush)
+        self._writes = 0
+        self._flushed = 0
+        self._flushing = False
+        self._held = []
+
+        self._lock = threading.Lock()
+        self._connections = {}
+        self._tokens = {}
+        self._tasks = {}
+        self._live = {}
+        self._handlers = {}
+        self._pending = 0
+
+        self._finished.connect(self._on_finished)
+        self._failed.connect(self._on_failed)
+
+    def connection(self, writes=False):
+        # Keyed by thread id: Python thread-local data does not survive
+        # between runs on a Qt pool thread.
+        thread = threading.get_ident()
+        with self._lock:
+            db = self._connections.get(thread)
+        if db is None:
+            db = DatabaseManager(self.db_path, check_same_thread=False,
+                                 durability=self.durability if writes else 'immediate')
+            db.add_change_listener(self.expense_changed.emit)
+            with self._lock:
+                self._connections[thread] = db
+        return db
+
+    def submit(self, key, func, on_result, on_error=None, writes=False):
+        if writes:
+            self._writes += 1
+            if not self.flush_timer.isActive():
+                self.flush_timer.start()
+        else:
+            self._drop_queued(key)
+
+        task = self._task(key, func, on_result, on_error, writes)
+        if writes:
+            self.write_pool.start(task)
+        elif self._writes > self._flushed:
+            # Reads see earlier writes: they wait for the group to be committed.
+            self._tasks[key] = task
+            self._held.append(task)
+            self.flush()
+        else:
+            self._tasks[key] = task
+            self.pool.start(task)
+        return task.token
+
+    def _task(self, key, func, on_result, on_error, writes=False):
+        token = self._tokens.get(key, 0) + 1
+        self._tokens[key] = token
+        task = _QueryTask(self, key, token, func, writes)
+        self._live[key, token] = task
+        self._handlers[key] = (token, on_result, on_error)
+        self._set_pending(self._pending + 1)
+        return task
+
+    def flush(self):
+        # Commits the writer connection's pending group, then starts the
+        # reads that were held back for it.
+        self.flush_timer.stop()
+        if self._flushing or self._writes == self._flushed:
+            return
+        self._flushing = True
+        writes = self._writes
+        done = lambda result=None: self._on_flushed(writes)
+        self.write_pool.start(self._task('flush-writes', lambda db: db.flush(), done, done, writes=True))
+
+    def _on_flushed(self, writes):
+        self._flushing = False
+        self._flushed = writes
+        if self._held and self._writes > self._flushed:
+            self.flush()
+            return
+        held, self._held = self._held, []
+        for task in held:
+            self.pool.start(task)
+
+    def cancel(self, key):
+        self._tokens[key] = self._tokens.get(key, 0) + 1
+        self._handlers.pop(key, None)
+        self._drop_queued(key)
+
+    def is_busy(self):
+        return self._pending > 0
+
+    def shutdown(self):
+        # Queued writes still run; each connection commits its pending
+        # group when it is closed.
+        self._handlers.clear()
+        self.flush_timer.stop()
+        self._held = []
+        self.pool.clear()
+        self.pool.waitForDone()
+        self.write_pool.waitForDone()
+        with self._lock:
+            connections, self._connections = self._connections, {}
+        for db in connections.values():
+            db.close()
+
+    def _drop_queued(self, key):
+        task = self._tasks.pop(key, None)
+        if task is None:
+            return
+        if task in self._held:
+            self._held.remove(task)
+        elif not self.pool.tryTake(task):
+            return
+        del self._live[key, task.token]
+        self._set_pending(self._pending - 1)
+
+    def _execute(self, task):
+        try:
+            with diagnostics.timer(f'query.{task.key}'):
+                result = task.func(self.connection(task.writes))
+        except Exception as e:
+            traceback.print_exc()
+            self._failed.emit(task.key, task.token, str(e))
+        else:
+            self._finished.emit(task.key, task.token, result)
+
+    def _complete(self, key, token):
+        self._set_pending(self._pending - 1)
+        self._live.pop((key, token), None)
+        task = self._tasks.get(key)
+        if task is not None and task.token == token:
+            del self._tasks[key]
+
+        handler = self._handlers.get(key)
+        if handler is None or handler[0] != token:
+            return None
+        del self._handlers[key]
+        return handler
+
+    def _on_finished(self, key, token, result):
+        handler = self._complete(key, token)
+        if handler is not None:
+            handler[1](result)
+
+    def _on_failed(self, key, token, message):
+        handler = self._complete(key, token)
+        if handler is not None and handler[2] is not None:
+            handler[2](message)
+
+    def _set_pending(self, pending):
+        was_busy = self._pending > 0
+        self._pending = max(pending, 0)
+        if was_busy != (self._pending > 0):
+            self.busy_changed.emit(self._pending > 0)
+
+
+class ChartRenderer(QObject):
+    rendered = pyqtSignal(str, bytes)
+    _done = pyqtSignal(str, object)
+
+    def __init__(self, capacity=32, parent=None):
+        super().__init__(parent)
+        self.cache = ChartCache(capacity)
+        self.pool = None
+        self._pending = set()
+        self._started = {}
+        self._done.connect(self._on_done)
+
+    def request(self, spec):
+        key = chart_key(spec)
+        image = self.cache.get(key)
+        if image is not None or key in self._pending:
+            return key, image
+
+        if self.pool is None:
+            # A spawned process keeps matplotlib and its figures out of the GUI
+            # process and does not inherit the Qt threads.
+            self.pool = ProcessPoolExecutor(max_workers=1,
+                                            mp_context=multiprocessing.get_context('spawn'))
+        try:
+            future = self.pool.submit(render_chart, spec)
+        except Exception:
+            # The worker could not be started; the statistics table still works.
+            traceback.print_exc()
+            self.shutdown()
+            return key, None
+        self._pending.add(key)
+        self._started[key] = (spec.kind, time.perf_counter())
+        future.add_done_callback(lambda future: self._done.emit(key, future))
+        return key, None
+
+    def is_busy(self):
+        return bool(self._pending)
+
+    def shutdown(self):
+        if self.pool is not None:
+            # Waits for the chart being drawn, if any, so no callback outlives the renderer.
+            self.pool.shutdown(wait=True, cancel_futures=True)
+            self.pool = None
+        self._pending.clear()
+        self._started.clear()
+
+    def _on_done(self, key, future):
+        self._pending.discard(key)
+        kind, started = self._started.pop(key, (None, None))
+        if diagnostics.enabled and started is not None:
+            # Request to PNG, including the wait for the chart process.
+            diagnostics.observe(f'chart.{kind}', (time.perf_counter() - started) * 1000)
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            traceback.print_exception(type(error), error, error.__traceback__)
+            self.shutdown()
+            return
+        image = future.result()
+        self.cache.put(key, image)
+        self.rendered.emit(key, image)
@@ -1,18 +1,233 @@
+import time
+
+STARTED = time.perf_counter()
+
 import sys
+import argparse
+import logging
 import traceback
-from PyQt5.QtWidgets import QApplication, QMessageBox
+from pathlib import Path
+
+DEFAULT_DB = Path(__file__).resolve().parent / 'database' / 'expenses.db'
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Expense Manager')
+    parser.add_argument('--migrate', action='store_true',
+                        help='apply pending schema migrations with progress output and exit')
+    parser.add_argument('--verify-totals', action='store_true',
+                        help='compare the monthly category totals and balance checkpoints '
+                             'with the expenses table and exit')
+    parser.add_argument('--rebuild-totals', action='store_true',
+                        help='recompute the monthly category totals and balance checkpoints '
+                             'from scratch and report any drift')
+    parser.add_argument('--export', metavar='PATH',
+                        help='export expenses to a CSV or JSON Lines file and exit')
+    parser.add_argument('--import', dest='import_path', metavar='PATH',
+                        help='import expenses from a CSV or JSON Lines file and exit')
+    parser.add_argument('--format', choices=('csv', 'jsonl'),
+                        help='file format for --export/--import (default: from the file extension)')
+    parser.add_argument('--year', type=int, help='only export expenses from this year')
+    parser.add_argument('--month', type=int, help='only export expenses from this month (needs --year)')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='print a phase breakdown up to the first loaded rows and exit')
+    parser.add_argument('--serve', action='store_true',
+                        help='run the headless HTTP/JSON service instead of the window')
+    parser.add_argument('--host', default='127.0.0.1', help='address for --serve (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8765, help='port for --serve (default: 8765)')
+    parser.add_argument('--pool-size', type=int, default=4,
+                        help='read connections for --serve (default: 4)')
+    parser.add_argument('--archive-year', type=int, metavar='YEAR',
+                        help='move a closed year into its own archive database and exit')
+    parser.add_argument('--report', nargs='+', metavar='DB',
+                        help='write one consolidated report of several databases to --output and exit')
+    parser.add_argument('--from', dest='from_period', metavar='YYYY-MM',
+                        help='first month of --report (default: --to)')
+    parser.add_argument('--to', dest='to_period', metavar='YYYY-MM',
+                        help='last month of --report (default: this month)')
+    parser.add_argument('--output', default='report.csv',
+                        help='report file for --report, .csv or .json (default: report.csv)')
+    parser.add_argument('--charts', metavar='DIR', help='also save pie and bar charts of each database to DIR')
+    parser.add_argument('--workers', type=int,
+                        help='worker processes for --report (default: one per core)')
+    parser.add_argument('--diagnostics', action='store_true',
+                        help='time SQL statements, UI handlers and event-loop stalls '
+                             '(Ctrl+Shift+D shows the diagnostics tab)')
+    parser.add_argument('--diagnostics-json', metavar='PATH',
+                        help='enable --diagnostics and write the counters to PATH on exit')
+    parser.add_argument('--slow-query-ms', type=float, default=50,
+                        help='log statements slower than this with their query plan (default: 50)')
+    # Resolved against the working directory, so the path is used as typed.
+    parser.add_argument('--db', type=lambda path: str(Path(path).resolve()), default=str(DEFAULT_DB),
+                        help='database file for the window and every command except --report '
+                             '(default: %(default)s)')
+    return parser.parse_known_args(argv)
+
+
+def run_migrate_command(db_name):
+    from database.db_manager import DatabaseManager
+
+    db = DatabaseManager(db_name)
+    db.close()
+    for version, name, seconds in db.applied_migrations:
+        print(f'{version:>3}  {name:<45} {seconds:8.3f}s')
+    print(f'{len(db.applied_migrations)} migration(s) applied')
+    return 0
+
+
+def run_totals_command(db_name, rebuild):
+    from database.db_manager import DatabaseManager
+
+    db = DatabaseManager(db_name)
+    try:
+        drift = db.rebuild_category_totals() if rebuild else db.verify_category_totals()
+        balance_drift = db.rebuild_balance_checkpoints() if rebuild else db.verify_balance_checkpoints()
+    finally:
+        db.close()
+
+    for row in drift:
+        print(f"{row['period']} category={row['category_id']} type={row['type']}: "
+              f"stored {row['stored_total']:.2f} ({row['stored_count']} rows), "
+              f"actual {row['actual_total']:.2f} ({row['actual_count']} rows)")
+    for row in balance_drift:
+        stored = 'missing' if row['stored'] is None else f"{row['stored']:.2f}"
+        actual = 'none' if row['actual'] is None else f"{row['actual']:.2f}"
+        print(f"{row['period']} balance checkpoint: stored {stored}, actual {actual}")
+    print(f"{len(drift)} drifted total(s), {len(balance_drift)} drifted checkpoint(s)"
+          f"{' repaired' if rebuild and (drift or balance_drift) else ''}")
+    return 0 if rebuild or not (drift or balance_drift) else 1
+
+
+def run_transfer_command(args):
+    from database.db_manager import DatabaseManager
+    from database import transfer
+
+    db = DatabaseManager(args.db, profile='bulk-import' if args.import_path else 'interactive')
+    try:
+        if args.export:
+            rows = transfer.export_expenses(db, args.export, args.format, args.year, args.month)
+            print(f'Exported {rows} rows to {args.export}')
+        else:
+            stats = transfer.import_expenses(db, args.import_path, args.format)
+            print(f"Imported {stats['rows']} rows from {args.import_path} "
+                  f"in {stats['seconds']:.2f}s ({stats['rows_per_sec']:.0f} rows/sec)")
+    finally:
+        db.close()
+    return 0
+
+
+def run_archive_command(args):
+    from database.db_manager import DatabaseManager
+    from database.archive import archive_year
+
+    db = DatabaseManager(args.db)
+    try:
+        report = archive_year(db, args.archive_year)
+    except ValueError as e:
+        print(e)
+        return 1
+    finally:
+        db.close()
+
+    print(f'Archived {report.rows} rows of {report.year} to {report.path} in {report.seconds:.2f}s')
+    for period, expected, actual in report.mismatches:
+        print(f'MISMATCH {period}: expected {expected}, archived {actual}')
+    return 1 if report.mismatches else 0
+
+
+def run_serve_command(args):
+    # Imported here so the service never loads PyQt5.
+    from service.server import serve
+
+    return serve(args.db, args.host, args.port, args.pool_size)
+
+
+def run_report_command(args):
+    # Imported here so reports never load PyQt5.
+    from datetime import date
+    from utils.batch_report import run_batch_report, write_batch_report
+
+    end = args.to_period or date.today().strftime('%Y-%m')
+    try:
+        report = run_batch_report(args.report, args.from_period or end, end, args.charts, args.workers)
+    except ValueError as e:
+        print(e)
+        return 1
+    write_batch_report(report, args.output)
+
+    for ledger in report.ledgers:
+        print(f"{ledger['database']}: {len(ledger['periods'])} month(s) in {ledger['seconds']:.2f}s")
+    for failure in report.failures:
+        print(f"FAILED {failure['database']}: {failure['error']}")
+    print(f'Wrote {args.output} from {len(report.ledgers)} database(s) '
+          f'in {report.seconds:.2f}s with {report.workers} worker(s)')
+    return 1 if report.failures else 0
+
+
+def run_gui(qt_argv, db_name, profile_startup=False):
+    profile = None
+    if profile_startup:
+        from utils.startup import StartupProfile
+        profile = StartupProfile(STARTED)
+        profile.mark('python startup')
+
+    from PyQt5.QtWidgets import QApplication, QMessageBox
+
+    app = QApplication(qt_argv)
+    if profile is not None:
+        profile.mark('import PyQt5 + QApplication')
 
-if __name__ == '__main__':
-    app = QApplication(sys.argv)
-    
     try:
         from gui.main_window import MainWindow
-        window = MainWindow()
+        if profile is not None:
+            profile.mark('import gui')
+        window = MainWindow(db_name, startup=profile)
         window.show()
-        sys.exit(app.exec_())
-        
+        if profile is not None:
+            profile.mark('show window')
+
+            def first_rows(count):
+                if profile.finished:
+                    return
+                profile.finished = True
+                profile.mark(f'first rows ({count})')
+                profile.report()
+                app.quit()
+
+            window.expenses_model.page_loaded.connect(first_rows)
+        return app.exec_()
+
     except Exception as e:
         print(f"Error: {e}")
         traceback.print_exc()
         QMessageBox.critical(None, "Error", f"Failed to start application:\n{str(e)}")
-        sys.exit(1)
+        return 1
+
+
+if __name__ == '__main__':
+    args, qt_args = parse_args(sys.argv[1:])
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s: %(message)s')
+    if args.diagnostics or args.diagnostics_json:
+        # Before any connection is opened, so every statement is traced.
+        import atexit
+        from utils.diagnostics import diagnostics
+        diagnostics.enable(args.slow_query_ms)
+        if args.diagnostics_json:
+            atexit.register(diagnostics.dump, args.diagnostics_json)
+
+    if args.migrate:
+        sys.exit(run_migrate_command(args.db))
+    if args.verify_totals or args.rebuild_totals:
+        sys.exit(run_totals_command(args.db, args.rebuild_totals))
+    if args.export or args.import_path:
+        if args.month and not args.year:
+            sys.exit('--month needs --year')
+        sys.exit(run_transfer_command(args))
+    if args.archive_year is not None:
+        sys.exit(run_archive_command(args))
+    if args.serve:
+        sys.exit(run_serve_command(args))
+    if args.report:
+        sys.exit(run_report_command(args))
+
+    sys.exit(run_gui(sys.argv[:1] + qt_args, args.db, args.profile_startup))
@@ -0,0 +1,315 @@
+import asyncio
+import json
+import queue
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date
+from decimal import Decimal
+from http import HTTPStatus
+from itertools import islice
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from database.db_manager import DatabaseManager, ExpenseFilter
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_POOL_SIZE = 4
+MAX_PAGE_SIZE = 1000
+MAX_BODY_BYTES = 16 * 1024 * 1024
+MAX_BATCH_ROWS = 5000
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ConnectionPool:
+    # A fixed set of read connections shared by the executor threads; a
+    # thread borrows one for the length of a call.
+
+    def __init__(self, db_name, size=DEFAULT_POOL_SIZE):
+        self.size = size
+        self._idle = queue.Queue()
+        for _ in range(size):
+            self._idle.put(DatabaseManager(db_name, check_same_thread=False))
+
+    @contextmanager
+    def connection(self):
+        db = self._idle.get()
+        try:
+            yield db
+        finally:
+            self._idle.put(db)
+
+    def run(self, func):
+        with self.connection() as db:
+            return func(db)
+
+    def close(self):
+        for _ in range(self.size):
+            self._idle.get().close()
+
+
+class WriteBatcher:
+    # Inserts wait in a queue while the previous batch is being written, and
+    # everything queued by then goes into the next transaction together.
+
+    def __init__(self, db, executor, max_rows=MAX_BATCH_ROWS):
+        self.db = db
+        self.executor = executor
+        self.max_rows = max_rows
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.requests = 0
+
+    async def add(self, records):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((records, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            rows = len(batch[0][0])
+            while rows < self.max_rows and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                rows += len(batch[-1][0])
+
+            try:
+                results = await loop.run_in_executor(
+                    self.executor, self.db.add_expense_groups, [records for records, _ in batch])
+            except Exception as error:
+                results = [error] * len(batch)
+            self.batches += 1
+            self.requests += len(batch)
+
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+
+def to_json(value):
+    return json.dumps(value, ensure_ascii=False, default=float).encode('utf-8')
+
+
+def parse_record(record):
+    if not isinstance(record, dict):
+        raise RequestError(HTTPStatus.BAD_REQUEST, 'each expense must be a JSON object')
+    try:
+        date.fromisoformat(record['date'])
+    except (KeyError, TypeError, ValueError):
+        raise RequestError(HTTPStatus.BAD_REQUEST, 'date must be YYYY-MM-DD')
+    return record
+
+
+class ExpenseService:
+    def __init__(self, db_name='expenses.db', host=DEFAULT_HOST, port=DEFAULT_PORT,
+                 pool_size=DEFAULT_POOL_SIZE):
+        self.db_name = db_name
+        self.host = host
+        self.port = port
+        self.pool_size = pool_size
+        self.routes = {
+            ('GET', '/categories'): self.list_categories,
+            ('GET', '/expenses'): self.list_expenses,
+            ('POST', '/expenses'): self.add_expense,
+            ('POST', '/expenses/bulk'): self.add_expenses_bulk,
+            ('GET', '/summary'): self.month_summary,
+            ('GET', '/forecast'): self.forecast,
+        }
+        self.server = None
+
+    async def start(self):
+        # The writer connection is opened first so it applies any pending migrations.
+        self.writer_db = DatabaseManager(self.db_name, check_same_thread=False)
+        self.pool = ConnectionPool(self.db_name, self.pool_size)
+        self.read_executor = ThreadPoolExecutor(self.pool_size, thread_name_prefix='read')
+        self.write_executor = ThreadPoolExecutor(1, thread_name_prefix='write')
+        # Due recurring entries are written before the first request is served.
+        self.materialized = await asyncio.get_running_loop().run_in_executor(
+            self.write_executor, self.writer_db.materialize_recurring)
+        self.batcher = WriteBatcher(self.writer_db, self.write_executor)
+        self.batcher_task = asyncio.create_task(self.batcher.run())
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        await self.start()
+        print(f'Serving {self.writer_db.db_path} on http://{self.host}:{self.port}', flush=True)
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self):
+        if self.server is None:
+            return
+        self.server.close()
+        await self.server.wait_closed()
+        self.batcher_task.cancel()
+        self.read_executor.shutdown()
+        self.write_executor.shutdown()
+        self.pool.close()
+        self.writer_db.close()
+        self.server = None
+
+    async def read(self, func):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.read_executor, self.pool.run, func)
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request = await self.read_request(reader)
+                if request is None:
+                    break
+                method, target, headers, body = request
+                status, payload = await self.dispatch(method, target, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                writer.write(self.response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except RequestError as error:
+            writer.write(self.response(error.status, {'error': str(error)}, False))
+        finally:
+            writer.close()
+
+    async def read_request(self, reader):
+        line = await reader.readline()
+        if not line.strip():
+            return None
+        try:
+            method, target, _ = line.decode('latin-1').split()
+        except ValueError:
+            raise RequestError(HTTPStatus.BAD_REQUEST, 'malformed request line')
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            raise RequestError(HTTPStatus.BAD_REQUEST, 'invalid Content-Length')
+        if length > MAX_BODY_BYTES:
+            raise RequestError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, 'request body too large')
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), target, headers, body
+
+    @staticmethod
+    def response(status, payload, keep_alive=True):
+        body = to_json(payload)
+        status = HTTPStatus(status)
+        head = (f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+                'Content-Type: application/json; charset=utf-8\r\n'
+                f'Content-Length: {len(body)}\r\n'
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        return head.encode('latin-1') + body
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        handler = self.routes.get((method, url.path))
+        if handler is None:
+            if any(path == url.path for _, path in self.routes):
+                return HTTPStatus.METHOD_NOT_ALLOWED, {'error': f'{method} not allowed'}
+            return HTTPStatus.NOT_FOUND, {'error': f'no route for {url.path}'}
+
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        try:
+            data = json.loads(body, parse_float=Decimal) if body else None
+        except ValueError:
+            return HTTPStatus.BAD_REQUEST, {'error': 'body is not valid JSON'}
+
+        try:
+            return await handler(params, data)
+        except RequestError as error:
+            return error.status, {'error': str(error)}
+        except (ValueError, KeyError, TypeError, ArithmeticError) as error:
+            return HTTPStatus.BAD_REQUEST, {'error': str(error)}
+        except Exception as error:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(error)}
+
+    async def list_categories(self, params, data):
+        rows = await self.read(lambda db: db.get_categories())
+        return HTTPStatus.OK, [dict(row) for row in rows]
+
+    async def list_expenses(self, params, data):
+        limit = min(int(params.get('limit', 200)), MAX_PAGE_SIZE)
+        after = None
+        if 'after_date' in params and 'after_id' in params:
+            after = (params['after_date'], int(params['after_id']))
+        filters = ExpenseFilter(
+            int(params['category_id']) if 'category_id' in params else None,
+            params.get('type'), params.get('start'), params.get('end'))
+        if filters == ExpenseFilter():
+            filters = None
+
+        def page(db):
+            rows = db.get_expenses_page(after, limit, filters)
+            last = rows.key(len(rows) - 1) if len(rows) == limit else None
+            return [dict(row) for row in rows], last
+
+        items, last = await self.read(page)
+        next_page = {'after_date': last[0], 'after_id': last[1]} if last else None
+        return HTTPStatus.OK, {'items': items, 'next': next_page}
+
+    async def add_expense(self, params, data):
+        ids = await self.batcher.add([parse_record(data)])
+        return HTTPStatus.CREATED, {'id': ids[0]}
+
+    async def add_expenses_bulk(self, params, data):
+        records = data.get('expenses') if isinstance(data, dict) else data
+        if not isinstance(records, list):
+            raise RequestError(HTTPStatus.BAD_REQUEST, 'expected a list of expenses')
+        ids = await self.batcher.add([parse_record(record) for record in records])
+        return HTTPStatus.CREATED, {'ids': ids}
+
+    async def month_summary(self, params, data):
+        year, month = int(params['year']), int(params['month'])
+        if not 1 <= month <= 12:
+            raise RequestError(HTTPStatus.BAD_REQUEST, 'month must be 1-12')
+        rows = await self.read(lambda db: [dict(row) for row in db.get_category_summary(year, month)])
+        income = sum(row['total'] for row in rows if row['type'] == 'income')
+        expenses = sum(row['total'] for row in rows if row['type'] == 'expense')
+        return HTTPStatus.OK, {
+            'period': DatabaseManager.month_period(year, month),
+            'categories': rows,
+            'income': income,
+            'expenses': expenses,
+            'balance': income - expenses
+        }
+
+    async def forecast(self, params, data):
+        start, end = params['start'], params['end']
+        date.fromisoformat(start), date.fromisoformat(end)
+        limit = min(int(params.get('limit', 200)), MAX_PAGE_SIZE)
+        items = await self.read(lambda db: [occurrence._asdict()
+                                            for occurrence in islice(db.project_recurring(start, end), limit)])
+        return HTTPStatus.OK, {'items': items}
+
+
+def serve(db_name='expenses.db', host=DEFAULT_HOST, port=DEFAULT_PORT, pool_size=DEFAULT_POOL_SIZE):
+    service = ExpenseService(db_name, host, port, pool_size)
+    try:
+        asyncio.run(service.serve_forever())
+    except KeyboardInterrupt:
+        pass
+    return 0
@@ -0,0 +1,84 @@
+import math
+from collections import defaultdict
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from database.db_manager import DatabaseManager
+from utils.analytics import ExpenseSnapshot
+
+RECORDS = [
+    (10.50, 1, '2022-11-03', 'a', 'expense'),
+    (4.25, 2, '2022-11-20', 'b', 'expense'),
+    (1000, 7, '2022-12-01', 'salary', 'income'),
+    (30, 1, '2023-02-14', 'c', 'expense'),
+    (20, 3, '2023-11-09', 'd', 'expense'),
+    (1200, 7, '2023-12-01', 'salary', 'income'),
+    (5.75, 2, '2024-01-31', 'e', 'expense'),
+]
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'analytics.db'))
+    db.add_expenses_bulk(RECORDS)
+    snapshot = ExpenseSnapshot.load(db, batch_size=2)
+    db.close()
+    return snapshot
+
+
+def expected_monthly():
+    totals = defaultdict(lambda: [0.0, 0.0])
+    for amount, category_id, date, description, kind in RECORDS:
+        totals[date[:7]][kind == 'expense'] += amount
+    return totals
+
+
+def test_monthly_totals_fill_empty_months(snapshot):
+    monthly = snapshot.monthly_totals()
+    labels = [str(month) for month in monthly.months]
+    assert labels[0] == '2022-11' and labels[-1] == '2024-01' and len(labels) == 15
+
+    expected = expected_monthly()
+    for label, income, expenses in zip(labels, monthly.income, monthly.expenses):
+        assert (income, expenses) == pytest.approx(tuple(expected.get(label, (0.0, 0.0))))
+
+
+def test_rolling_average_matches_python_loop():
+    values = [3, 1, 4, 1, 5, 9, 2, 6]
+    averages = ExpenseSnapshot.rolling_average(values, 3)
+    assert all(math.isnan(value) for value in averages[:2])
+    assert list(averages[2:]) == pytest.approx([sum(values[i - 2:i + 1]) / 3 for i in range(2, 8)])
+    assert np.isnan(ExpenseSnapshot.rolling_average(values[:2], 3)).all()
+
+
+def test_year_over_year(snapshot):
+    yoy = snapshot.year_over_year()
+    assert list(yoy.years) == [2022, 2023, 2024]
+    assert list(yoy.income) == pytest.approx([1000, 1200, 0])
+    assert list(yoy.expenses) == pytest.approx([14.75, 50, 5.75])
+    assert math.isnan(yoy.income_change[0])
+    assert yoy.income_change[1] == pytest.approx(0.2)
+    assert yoy.expenses_change[2] == pytest.approx(5.75 / 50 - 1)
+
+
+def test_category_trends_and_cumulative_balance(snapshot):
+    trends = snapshot.category_trends(months=3)
+    assert list(trends.category_ids) == [1, 2, 3, 7]
+    # Last three months: 2023-11 .. 2024-01; category 3 spent 20 in the first of them.
+    assert trends.slope[list(trends.category_ids).index(3)] == pytest.approx(-10)
+    assert trends.last[list(trends.category_ids).index(2)] == pytest.approx(5.75)
+
+    balance = snapshot.cumulative_balance().balance
+    assert balance[-1] == pytest.approx(2200 - 14.75 - 50 - 5.75)
+
+
+def test_empty_snapshot(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'empty.db'))
+    snapshot = ExpenseSnapshot.load(db)
+    db.close()
+    dashboard = snapshot.dashboard()
+    assert len(snapshot) == 0
+    assert len(dashboard['monthly'].months) == 0
+    assert len(dashboard['year_over_year'].years) == 0
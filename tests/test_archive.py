@@ -0,0 +1,191 @@
+import random
+
+import pytest
+
+from database.archive import archive_year
+from database.db_manager import DatabaseManager, ExpenseFilter, MAX_ATTACHED_ARCHIVES
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(str(tmp_path / 'ledger.db'))
+    rng = random.Random(11)
+    manager.add_expenses_bulk(
+        (rng.randint(1, 500), rng.randint(1, 8),
+         f'{rng.randint(2019, 2023)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+         f'row {i}', rng.choice(['expense', 'expense', 'income']))
+        for i in range(1500))
+    yield manager
+    manager.close()
+
+
+def views(db):
+    pages, after = [], None
+    while True:
+        page = db.get_expenses_page(after, 70, ExpenseFilter(category_id=2))
+        pages.extend(map(tuple, page))
+        if len(page) < 70:
+            break
+        after = page.key(len(page) - 1)
+    return {
+        'month': list(map(tuple, db.get_expenses_by_month(2020, 7))),
+        'summary': list(map(tuple, db.get_category_summary(2020, 7))),
+        'pages': pages,
+        'count': db.count_expenses(ExpenseFilter(start='2020-02-10', end='2021-03-20')),
+        'balances': list(map(tuple, db.get_daily_balances('2020-12-25', '2021-01-05'))),
+        'export': sorted(tuple(row) for batch in db.iter_expenses(2020) for row in batch),
+    }
+
+
+def test_archiving_moves_rows_without_changing_results(db):
+    before = views(db)
+    report = archive_year(db, 2020, batch_size=100, progress=lambda *args: None)
+    archive_year(db, 2019, batch_size=100, progress=lambda *args: None)
+
+    assert report.mismatches == [] and report.rows == len(before['export'])
+    assert report.path.exists() and report.path.name == 'ledger_2020.db'
+    assert db.connection.execute(
+        "SELECT COUNT(*) FROM expenses WHERE date < '2021-01-01'").fetchone()[0] == 0
+    assert views(db) == before
+    assert db.verify_category_totals() == [] and db.verify_balance_checkpoints() == []
+
+
+def test_queries_attach_only_the_archives_they_need(db, tmp_path):
+    archive_year(db, 2019, progress=lambda *args: None)
+    archive_year(db, 2020, progress=lambda *args: None)
+
+    reader = DatabaseManager(str(tmp_path / 'ledger.db'))
+    reader.get_expenses_page(None, 50)
+    assert list(reader._attached) == []
+    reader.get_expenses_by_month(2019, 4)
+    assert list(reader._attached) == ['archive_2019']
+    assert reader.partitions('2020-06-01', '2021-01-01') == ['main', 'archive_2020']
+    reader.close()
+
+
+def test_late_rows_for_an_archived_year_are_found_and_archived_on_rerun(db):
+    archive_year(db, 2021, progress=lambda *args: None)
+    expense_id = db.add_expense(9.99, 1, '2021-05-05', 'late receipt')
+    assert expense_id in db.get_expenses_by_month(2021, 5).ids
+
+    report = archive_year(db, 2021, progress=lambda *args: None)
+    assert report.mismatches == []
+    assert expense_id in db.get_expenses_by_month(2021, 5).ids
+    assert db.verify_category_totals() == []
+
+
+def test_open_years_cannot_be_archived(db):
+    with pytest.raises(ValueError):
+        archive_year(db, 9999)
+
+
+def test_page_across_partitions_merges_without_sorting(db):
+    archive_year(db, 2019, progress=lambda *args: None)
+    statements = []
+    db.connection.set_trace_callback(statements.append)
+    db.get_expenses_page(('2020-01-02', 10 ** 9), 50)
+    db.connection.set_trace_callback(None)
+
+    plan = [row['detail'] for row in db.connection.execute('EXPLAIN QUERY PLAN ' + statements[-1])]
+    assert 'MERGE (UNION ALL)' in plan
+    assert any(detail.startswith('SEARCH archive_2019.expenses USING INDEX') for detail in plan), plan
+    assert not any('TEMP B-TREE' in detail for detail in plan), plan
+
+
+
+def test_more_archived_years_than_can_be_attached(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'ledger.db'))
+    rng = random.Random(5)
+    years = range(2024 - MAX_ATTACHED_ARCHIVES - 5, 2024)
+    db.add_expenses_bulk(
+        (rng.randint(1, 500), rng.randint(1, 8), f'{year}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+         f'row {i}', rng.choice(['expense', 'income']))
+        for i, year in enumerate(rng.choice(years) for _ in range(1200)))
+
+    def everything():
+        pages, after = [], None
+        while True:
+            page = db.get_expenses_page(after, 90)
+            pages.extend(map(tuple, page))
+            if len(page) < 90:
+                break
+            after = page.key(len(page) - 1)
+        return {
+            'all': list(map(tuple, db.get_all_expenses())),
+            'slice': list(map(tuple, db.get_expenses_slice(500, 40))),
+            'pages': pages,
+            'count': db.count_expenses(ExpenseFilter(start=f'{years[0]}-03-15', end='2023-06-15')),
+            'balances': list(map(tuple, db.get_daily_balances(f'{years[0]}-01-01', '2024-01-01'))),
+            'export': sorted(tuple(row) for batch in db.iter_expenses() for row in batch),
+        }
+
+    before = everything()
+    for year in years[:-2]:
+        archive_year(db, year, progress=lambda *args: None)
+    assert len(db.archived_years()) > MAX_ATTACHED_ARCHIVES
+
+    assert everything() == before
+    assert len(db._attached) <= MAX_ATTACHED_ARCHIVES
+    assert db.verify_category_totals() == [] and db.verify_balance_checkpoints() == []
+
+    db.connection.execute(f"UPDATE monthly_category_totals SET total = total + 1 WHERE period < '{years[1]}'")
+    db.connection.execute(f"UPDATE balance_checkpoints SET balance = 0 WHERE period = '{years[0]}'")
+    db.connection.commit()
+    assert db.rebuild_category_totals() and db.rebuild_balance_checkpoints()
+    assert db.verify_category_totals() == [] and db.verify_balance_checkpoints() == []
+    db.close()
+
+def test_archived_rows_can_be_deleted_and_edited(db):
+    archive_year(db, 2020, progress=lambda *args: None)
+    archived = db.get_expenses_by_month(2020, 7)
+    changes = []
+    db.add_change_listener(changes.append)
+
+    assert db.delete_expense(archived[0].id)
+    assert archived[0].id not in db.get_expenses_by_month(2020, 7).ids
+    assert changes[-1].kind == 'deleted' and changes[-1].expense_id == archived[0].id
+
+    assert db.update_expense(archived[1].id, 42, 3, '2020-07-15', 'edited', 'expense')
+    month = db.get_expenses_by_month(2020, 7)
+    assert month[list(month.ids).index(archived[1].id)].description == 'edited'
+    assert changes[-1].kind == 'updated' and changes[-1].previous.expense_id == archived[1].id
+    assert db.update_expense(archived[2].id, 7, 1, '2022-01-03', 'moved on', 'income')
+    assert archived[2].id in db.get_expenses_by_month(2022, 1).ids
+
+    assert db.verify_category_totals() == [] and db.verify_balance_checkpoints() == []
+    assert db.connection.execute('SELECT rows FROM archives WHERE year = 2020').fetchone()[0] == \
+        db.count_expenses(ExpenseFilter(start='2020-01-01', end='2021-01-01')) - 1
+    assert not db.delete_expense(archived[0].id)
+
+
+def test_search_reaches_archived_rows(db, tmp_path):
+    db.add_expense(5, 1, '2020-03-03', 'taxi to airport')
+    db.add_expense(5, 1, '2023-03-03', 'taxi home')
+    archive_year(db, 2020, progress=lambda *args: None)
+
+    assert sorted(row.description for row in db.search_expenses('taxi')) == ['taxi home', 'taxi to airport']
+    assert [row.description for row in db.search_expenses('airp')] == ['taxi to airport']
+    db.delete_expense(db.search_expenses('airp')[0].id)
+    assert db.search_expenses('airp') == []
+
+    # A full window from the main file does not open the archives.
+    reader = DatabaseManager(str(tmp_path / 'ledger.db'))
+    assert len(reader.search_expenses('row', 10, rank_window=5)) == 5
+    assert list(reader._attached) == []
+    reader.close()
+
+
+def test_archives_without_a_search_index_get_one_when_attached(db, tmp_path):
+    db.add_expense(5, 1, '2020-03-03', 'taxi to airport')
+    archive_year(db, 2020, progress=lambda *args: None)
+    db.flush()
+    schema = db.attach_archive(2020)
+    # As written before archives had their own index.
+    db.connection.execute(f'DROP TRIGGER {schema}.trg_expenses_fts_insert')
+    db.connection.execute(f'DROP TRIGGER {schema}.trg_expenses_fts_delete')
+    db.connection.execute(f'DROP TABLE {schema}.expenses_fts')
+    db.connection.commit()
+
+    reader = DatabaseManager(str(tmp_path / 'ledger.db'))
+    assert [row.description for row in reader.search_expenses('taxi')] == ['taxi to airport']
+    reader.close()
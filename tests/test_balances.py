@@ -0,0 +1,72 @@
+import random
+from decimal import Decimal
+
+import pytest
+
+from database.db_manager import DatabaseManager, from_minor_units
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(str(tmp_path / 'balances.db'))
+    yield manager
+    manager.close()
+
+
+def balance_before(db, day):
+    # Full scan, for comparison with the checkpointed lookup.
+    total = db.connection.execute('''
+        SELECT COALESCE(SUM(CASE type WHEN 'income' THEN amount ELSE -amount END), 0)
+        FROM expenses WHERE date < ?
+    ''', (day,)).fetchone()[0]
+    return from_minor_units(total)
+
+
+def test_checkpoints_follow_every_write(db):
+    rng = random.Random(5)
+    db.add_expenses_bulk(
+        (rng.randint(1, 900), rng.randint(1, 8),
+         f'{rng.randint(2019, 2024)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+         'row', rng.choice(['expense', 'income']))
+        for _ in range(800))
+    ids = [row['id'] for row in db.connection.execute('SELECT id FROM expenses')]
+    for expense_id in rng.sample(ids, 60):
+        db.delete_expense(expense_id)
+    for expense_id in rng.sample(ids, 60):
+        if db.connection.execute('SELECT 1 FROM expenses WHERE id = ?', (expense_id,)).fetchone():
+            db.update_expense(expense_id, 42, 3, '2018-07-04', 'moved', 'income')
+
+    assert db.verify_balance_checkpoints() == []
+    for day in ('2018-01-01', '2018-07-05', '2020-01-01', '2021-06-15', '2024-12-31', '2030-01-01'):
+        assert db.get_balance_before(day) == balance_before(db, day)
+
+
+def test_balance_at_end_of_day(db):
+    db.add_expense(1000, 8, '2023-12-31', 'salary', 'income')
+    db.add_expense(25.5, 1, '2024-01-01', 'lunch')
+    assert db.get_balance('2023-12-30') == Decimal('0.00')
+    assert db.get_balance('2023-12-31') == Decimal('1000.00')
+    assert db.get_balance('2024-01-01') == Decimal('974.50')
+
+
+def test_daily_series_includes_empty_days(db):
+    db.add_expense(100, 8, '2024-02-27', 'salary', 'income')
+    db.add_expense(10, 1, '2024-03-01', 'coffee')
+    db.add_expense(5, 1, '2024-03-01', 'tea')
+
+    series = [(row['day'], row['balance']) for row in db.get_daily_balances('2024-02-28', '2024-03-03')]
+    assert series == [('2024-02-28', Decimal('100.00')), ('2024-02-29', Decimal('100.00')),
+                      ('2024-03-01', Decimal('85.00')), ('2024-03-02', Decimal('85.00'))]
+    assert db.get_daily_balances('2024-03-01', '2024-03-01') == []
+
+
+def test_rebuild_repairs_drifted_checkpoints(db):
+    db.add_expense(50, 8, '2022-05-01', 'gift', 'income')
+    db.add_expense(20, 2, '2023-05-01', 'bus')
+    db.connection.execute("UPDATE balance_checkpoints SET balance = 0 WHERE period = '2022'")
+    db.connection.commit()
+
+    assert [row['period'] for row in db.verify_balance_checkpoints()] == ['2022']
+    assert len(db.rebuild_balance_checkpoints()) == 1
+    assert db.verify_balance_checkpoints() == []
+    assert db.get_balance('2023-12-31') == Decimal('30.00')
@@ -0,0 +1,97 @@
+import csv
+import hashlib
+import json
+import sqlite3
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from database import migrations
+from database.db_manager import DatabaseManager
+from utils.batch_report import month_periods, run_batch_report, write_batch_report
+
+
+def ledger(path, rows):
+    db = DatabaseManager(str(path))
+    db.add_expenses_bulk(rows)
+    db.close()
+    return str(path)
+
+
+@pytest.fixture
+def ledgers(tmp_path):
+    return [
+        ledger(tmp_path / 'home.db', [(100, 8, '2024-01-25', 'salary', 'income'),
+                                      (30, 1, '2024-01-03', 'food', 'expense'),
+                                      (20, 2, '2024-02-10', 'bus', 'expense')]),
+        ledger(tmp_path / 'office.db', [(50, 1, '2024-02-01', 'lunch', 'expense')]),
+    ]
+
+
+def test_month_periods_cross_years_and_reject_reversed_ranges():
+    assert month_periods('2023-11', '2024-02') == ['2023-11', '2023-12', '2024-01', '2024-02']
+    with pytest.raises(ValueError):
+        month_periods('2024-03', '2024-01')
+    with pytest.raises(ValueError):
+        month_periods('2024-13', '2024-13')
+
+
+def test_report_covers_every_ledger_and_period(ledgers, tmp_path):
+    report = run_batch_report(ledgers + [str(tmp_path / 'missing.db')], '2024-01', '2024-02',
+                              tmp_path / 'charts', workers=2)
+
+    assert [Path(item['database']).name for item in report.ledgers] == ['home.db', 'office.db']
+    assert report.failures[0]['database'].endswith('missing.db')
+    assert not (tmp_path / 'missing.db').exists()
+    home_january = report.ledgers[0]['periods'][0]
+    assert (home_january['income'], home_january['expenses'], home_january['balance']) == (100, 30, 70)
+    assert len(report.ledgers[1]['charts']) == 2
+    assert all(Path(chart).read_bytes().startswith(b'\x89PNG') for chart in report.ledgers[1]['charts'])
+
+
+def test_csv_and_json_hold_consolidated_totals(ledgers, tmp_path):
+    report = run_batch_report(ledgers, '2024-01', '2024-02', workers=1)
+    write_batch_report(report, tmp_path / 'report.csv')
+    write_batch_report(report, tmp_path / 'report.json')
+
+    with open(tmp_path / 'report.csv', encoding='utf-8', newline='') as f:
+        rows = list(csv.DictReader(f))
+    consolidated = {(row['period'], row['type']): row['total'] for row in rows if row['database'] == '*'}
+    assert consolidated[('2024-02', 'expenses')] == '70.00'
+    assert consolidated[('2024-01', 'balance')] == '70.00'
+    assert sum(row['kind'] == 'category' for row in rows) == 4
+
+    totals = json.loads((tmp_path / 'report.json').read_text(encoding='utf-8'))['totals']
+    assert totals[1] == {'income': 0, 'expenses': 70.0, 'balance': -70.0, 'period': '2024-02'}
+
+
+def fingerprint(path):
+    # user_version (bytes 60-63 of the header) and a hash of the whole file,
+    # read without opening a connection.
+    data = Path(path).read_bytes()
+    return int.from_bytes(data[60:64], 'big'), hashlib.sha1(data).hexdigest()
+
+
+def test_ledgers_are_read_without_being_changed(ledgers, tmp_path):
+    legacy = tmp_path / 'legacy.db'
+    connection = sqlite3.connect(str(legacy))
+    migrations.run_migrations(connection, migrations.MIGRATIONS[:4])
+    connection.close()
+    before = {path: fingerprint(path) for path in ledgers + [str(legacy)]}
+
+    report = run_batch_report(ledgers + [str(legacy)], '2024-01', '2024-02', workers=1)
+
+    assert len(report.ledgers) == 2
+    assert 'schema version 4' in report.failures[0]['error']
+    assert {path: fingerprint(path) for path in before} == before
+    # A read-only connection cannot remove the WAL files of a WAL ledger, but writes nothing to them.
+    assert all(wal.stat().st_size == 0 for wal in tmp_path.glob('*.db-wal'))
+
+
+def test_reports_never_import_pyqt():
+    root = Path(__file__).parent.parent
+    code = 'import sys, utils.batch_report; print(any(name.startswith("PyQt5") for name in sys.modules))'
+    result = subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == 'False'
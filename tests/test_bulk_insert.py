@@ -0,0 +1,38 @@
+import pytest
+
+from database.db_manager import DatabaseManager
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(str(tmp_path / 'bulk.db'))
+    yield manager
+    manager.close()
+
+
+def count_rows(db):
+    return db.connection.execute('SELECT COUNT(*) FROM expenses').fetchone()[0]
+
+
+def test_bulk_insert_streams_generator_in_chunks(db):
+    records = ((1.5, 1 + i % 8, f'2024-01-{1 + i % 28:02d}', f'row {i}')
+               for i in range(2500))
+
+    stats = db.add_expenses_bulk(records, chunk_size=1000)
+
+    assert stats['rows'] == 2500
+    assert stats['rows_per_sec'] > 0
+    assert count_rows(db) == 2500
+    assert db.verify_category_totals() == []
+
+
+def test_bulk_insert_rolls_back_on_unknown_category(db):
+    records = [
+        {'amount': 5, 'category_id': 1, 'date': '2024-02-01', 'type': 'income'},
+        {'amount': 5, 'category_id': 999, 'date': '2024-02-02'},
+    ]
+
+    with pytest.raises(ValueError, match='Record 1'):
+        db.add_expenses_bulk(records, chunk_size=1)
+
+    assert count_rows(db) == 0
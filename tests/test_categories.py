@@ -0,0 +1,32 @@
+import pytest
+
+from database.db_manager import DatabaseManager
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(str(tmp_path / 'categories.db'))
+    yield manager
+    manager.close()
+
+
+def test_registry_matches_categories_table(db):
+    rows = db.get_categories()
+    assert [(category.id, category.name, category.color) for category in db.categories] == \
+        [(row['id'], row['name'], row['color']) for row in rows]
+    assert db.categories.name(9999) == ''
+    assert db.categories.color(9999) is None
+
+
+def test_add_category_refreshes_registry_and_notifies(db):
+    changes = []
+    db.add_change_listener(changes.append)
+    version = db.categories.version
+
+    category_id = db.add_category('سفر', '#123456')
+
+    assert db.categories[category_id].name == 'سفر'
+    assert db.categories.color(category_id) == '#123456'
+    assert db.categories.version > version
+    assert [change.kind for change in changes] == ['categories_changed']
+    db.add_expenses_bulk([(5, category_id, '2024-01-01', 'train')])
@@ -0,0 +1,51 @@
+from decimal import Decimal
+
+import pytest
+
+from database.db_manager import DatabaseManager
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(str(tmp_path / 'totals.db'))
+    yield manager
+    manager.close()
+
+
+def summary(db, year, month):
+    return {(db.categories.name(row['category_id']), row['type']): row['total']
+            for row in db.get_category_summary(year, month)}
+
+
+def test_triggers_keep_totals_current(db):
+    first = db.add_expense(10.5, 1, '2024-03-02', 'lunch')
+    coffee = db.add_expense(4.5, 1, '2024-03-20', 'coffee')
+    db.add_expense(100, 8, '2024-03-01', 'salary', 'income')
+    db.add_expense(7, 1, '2024-04-01', 'next month')
+
+    totals = summary(db, 2024, 3)
+    assert totals[('طعام', 'expense')] == Decimal('15.00')
+    assert totals[('دخل', 'income')] == Decimal('100.00')
+
+    db.delete_expense(first)
+    assert summary(db, 2024, 3)[('طعام', 'expense')] == Decimal('4.50')
+
+    db.update_expense(coffee, 4.5, 1, '2024-04-15', 'coffee')
+    assert ('طعام', 'expense') not in summary(db, 2024, 3)
+    assert summary(db, 2024, 4)[('طعام', 'expense')] == Decimal('11.50')
+    assert db.verify_category_totals() == []
+
+
+def test_rebuild_reports_and_repairs_drift(db):
+    db.add_expense(20, 2, '2024-05-05', 'bus')
+    db.connection.execute('UPDATE monthly_category_totals SET total = total + 1')
+    db.connection.commit()
+
+    drift = db.verify_category_totals()
+    assert [(row['period'], row['category_id'], row['type']) for row in drift] == [
+        ('2024-05', 2, 'expense')
+    ]
+
+    assert len(db.rebuild_category_totals()) == 1
+    assert db.verify_category_totals() == []
+    assert summary(db, 2024, 5)[('مواصلات', 'expense')] == Decimal('20.00')
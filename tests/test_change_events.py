@@ -0,0 +1,40 @@
+from decimal import Decimal
+
+import pytest
+
+from database.db_manager import DatabaseManager
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(str(tmp_path / 'events.db'))
+    yield manager
+    manager.close()
+
+
+def test_writes_emit_typed_changes(db):
+    changes = []
+    db.add_change_listener(changes.append)
+
+    expense_id = db.add_expense(10.25, 2, '2024-06-01', 'bus')
+    db.update_expense(expense_id, 11, 3, '2024-07-02', 'cinema')
+    db.delete_expense(expense_id)
+    db.delete_expense(expense_id)
+    db.add_expenses_bulk([(1, 1, '2024-01-01', 'x')])
+
+    assert [change.kind for change in changes] == ['inserted', 'updated', 'deleted', 'bulk_inserted']
+    inserted, updated, deleted, bulk = changes
+    assert inserted.expense_id == expense_id
+    assert (inserted.amount, inserted.category_id, inserted.date) == (Decimal('10.25'), 2, '2024-06-01')
+    assert updated.previous.date == '2024-06-01'
+    assert (updated.amount, updated.category_id, updated.date) == (Decimal('11.00'), 3, '2024-07-02')
+    assert (deleted.category_id, deleted.date, deleted.type) == (3, '2024-07-02', 'expense')
+    assert bulk.expense_id is None
+
+
+def test_removed_listener_is_not_called(db):
+    changes = []
+    db.add_change_listener(changes.append)
+    db.remove_change_listener(changes.append)
+    db.add_expense(1, 1, '2024-01-01', '')
+    assert changes == []
@@ -0,0 +1,47 @@
+import pytest
+
+from utils.charts import ChartCache, ChartSpec, chart_key
+
+PIE = ChartSpec('pie', 'title', ('a', 'b'), (1.0, 3.0), ('#ff0000', '#00ff00'), (4, 3))
+
+
+def test_chart_key_depends_on_data_and_parameters():
+    assert chart_key(PIE) == chart_key(ChartSpec(*PIE))
+    assert chart_key(PIE) != chart_key(PIE._replace(values=(2.0, 3.0)))
+    assert chart_key(PIE) != chart_key(PIE._replace(kind='bar'))
+    assert chart_key(PIE) != chart_key(PIE._replace(size=(6, 4)))
+
+
+def test_chart_cache_evicts_least_recently_used():
+    cache = ChartCache(capacity=2)
+    cache.put('a', b'1')
+    cache.put('b', b'2')
+    assert cache.get('a') == b'1'
+    cache.put('c', b'3')
+
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c'), len(cache)) == (b'1', b'3', 2)
+
+
+@pytest.mark.parametrize('kind', ['pie', 'bar'])
+def test_new_values_update_existing_artists(kind):
+    pytest.importorskip('matplotlib')
+    from utils import charts
+
+    figure = charts.ChartFigure(kind, (4, 3))
+    figure.update(PIE._replace(kind=kind))
+    artists = figure.artists
+    figure.update(PIE._replace(kind=kind, values=(3.0, 1.0)))
+
+    assert figure.artists is artists
+    if kind == 'pie':
+        wedge = artists[0][0]
+        assert (wedge.theta1, wedge.theta2) == pytest.approx((90.0, 360.0))
+        assert artists[2][0].get_text() == '75.0%'
+    else:
+        assert [bar.get_height() for bar in artists[0]] == [3.0, 1.0]
+
+    figure.update(PIE._replace(kind=kind, labels=('a', 'b', 'c'), values=(1.0, 1.0, 1.0),
+                               colors=('#ff0000', '#00ff00', '#0000ff')))
+    assert figure.artists is not artists
+    assert figure.png().startswith(b'\x89PNG')
@@ -0,0 +1,72 @@
+import json
+import time
+
+import pytest
+
+from database.db_manager import DatabaseManager, ExpenseFilter
+from utils.diagnostics import Histogram, diagnostics, TracedConnection
+
+
+@pytest.fixture
+def traced():
+    diagnostics.reset()
+    diagnostics.enable(slow_query_ms=0)
+    yield diagnostics
+    diagnostics.enabled = False
+    diagnostics.reset()
+
+
+def test_histogram_buckets_and_percentiles():
+    histogram = Histogram()
+    for ms in (0.05, 0.3, 0.3, 4, 3000):
+        histogram.add(ms)
+    report = histogram.to_dict()
+    assert report['count'] == 5
+    assert report['max_ms'] == 3000
+    assert report['p50_ms'] == 0.5
+    assert report['p99_ms'] == 3000
+    assert sum(report['buckets'].values()) == 5
+
+
+def test_statements_are_timed_with_plans_for_slow_ones(traced, tmp_path):
+    db = DatabaseManager(str(tmp_path / 'traced.db'), cache_capacity=0)
+    assert isinstance(db.connection, TracedConnection)
+    db.add_expense(5, 1, '2024-03-01', 'tea')
+    assert len(db.get_expenses_by_month(2024, 3)) == 1
+    assert db.count_expenses() == 1
+    assert db.count_expenses(ExpenseFilter(start='2024-03-01', end='2024-03-20')) == 1
+    db.close()
+
+    report = traced.to_dict()
+    month_query = [stats for stats in report['statements']
+                   if stats['sql'].startswith('SELECT id, amount') and "date < ?" in stats['sql']]
+    assert month_query and month_query[0]['rows'] == 1
+    slow = [query for query in report['slow_queries'] if query['sql'] == month_query[0]['sql']]
+    assert any('idx_expenses_date' in detail for detail in slow[0]['plan'])
+    # count_expenses runs through Connection.execute(), not an explicit cursor.
+    assert any(stats['sql'].startswith('SELECT COALESCE(SUM(count), 0) FROM monthly_category_totals')
+               for stats in report['statements'])
+    assert any(stats['sql'].startswith('SELECT COUNT(*) FROM expenses') for stats in report['statements'])
+    json.dumps(report)
+
+
+def test_timers_are_free_when_disabled(tmp_path):
+    diagnostics.reset()
+    timed = diagnostics.timed('test.handler')(lambda: 42)
+    assert timed() == 42
+    assert diagnostics.to_dict()['histograms'] == {}
+    db = DatabaseManager(str(tmp_path / 'plain.db'))
+    assert not isinstance(db.connection, TracedConnection)
+    db.close()
+
+
+def test_stalls_name_the_spans_that_ran_during_them(traced):
+    with traced.timer('ui.load_data'):
+        time.sleep(0.02)
+    traced.stall(150, time.perf_counter())
+    traced.stall(150, time.perf_counter() + 10)
+
+    stalls = traced.to_dict()['stalls']
+    assert stalls[0]['during'] == ['ui.load_data']
+    assert stalls[1]['during'] == []
+    assert traced.to_dict()['counters']['qt.stalls'] == 2
@@ -0,0 +1,54 @@
+import sqlite3
+
+import pytest
+
+from database import migrations
+from database.db_manager import DatabaseManager, CONNECTION_PROFILES
+
+
+def test_fresh_database_is_at_latest_version(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'fresh.db'))
+    try:
+        latest = migrations.MIGRATIONS[-1].version
+        assert migrations.current_version(db.connection) == latest
+        assert [version for version, name, seconds in db.applied_migrations] == \
+            [migration.version for migration in migrations.MIGRATIONS]
+        assert all(seconds >= 0 for version, name, seconds in db.applied_migrations)
+    finally:
+        db.close()
+
+    reopened = DatabaseManager(str(tmp_path / 'fresh.db'))
+    try:
+        assert reopened.applied_migrations == []
+    finally:
+        reopened.close()
+
+
+def test_failed_migration_rolls_back_and_keeps_version(tmp_path):
+    connection = sqlite3.connect(str(tmp_path / 'broken.db'))
+
+    def broken(connection, report):
+        connection.execute('CREATE TABLE half_done (id INTEGER)')
+        raise RuntimeError('boom')
+
+    steps = migrations.MIGRATIONS[:1] + [migrations.Migration(2, 'broken', broken, True)]
+    with pytest.raises(RuntimeError):
+        migrations.run_migrations(connection, steps)
+
+    assert migrations.current_version(connection) == 1
+    tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert 'half_done' not in tables
+    connection.close()
+
+
+@pytest.mark.parametrize('profile', sorted(CONNECTION_PROFILES))
+def test_connection_profiles_are_applied(tmp_path, profile):
+    db = DatabaseManager(str(tmp_path / 'profile.db'), profile=profile)
+    try:
+        settings = CONNECTION_PROFILES[profile]
+        assert db.connection.execute('PRAGMA journal_mode').fetchone()[0].upper() == settings['journal_mode']
+        assert db.connection.execute('PRAGMA cache_size').fetchone()[0] == settings['cache_size']
+        synchronous = {'OFF': 0, 'NORMAL': 1, 'FULL': 2}[settings['synchronous']]
+        assert db.connection.execute('PRAGMA synchronous').fetchone()[0] == synchronous
+    finally:
+        db.close()
@@ -0,0 +1,96 @@
+import sqlite3
+from decimal import Decimal
+
+import pytest
+
+from database import migrations
+from database.db_manager import DatabaseManager, to_minor_units, from_minor_units
+
+
+def create_legacy_database(path, rows):
+    connection = sqlite3.connect(str(path))
+    connection.executescript('''
+        CREATE TABLE categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL,
+            color TEXT DEFAULT '#FF6B6B'
+        );
+        CREATE TABLE expenses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            amount REAL NOT NULL,
+            category_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            description TEXT,
+            type TEXT CHECK(type IN ('expense', 'income')) DEFAULT 'expense',
+            FOREIGN KEY(category_id) REFERENCES categories(id)
+        );
+    ''')
+    connection.executemany(
+        'INSERT INTO expenses (amount, category_id, date, description, type) VALUES (?, ?, ?, ?, ?)',
+        rows
+    )
+    connection.commit()
+    connection.close()
+
+
+@pytest.mark.parametrize('amount, minor', [
+    (0.1, 10), (19.99, 1999), ('1234.565', 123457), (Decimal('7.5'), 750), (3, 300)
+])
+def test_minor_unit_conversion(amount, minor):
+    assert to_minor_units(amount) == minor
+    assert from_minor_units(minor) == Decimal(str(minor)) / 100
+
+
+def test_sums_are_exact(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'exact.db'))
+    try:
+        db.add_expenses_bulk((0.1, 1, '2024-01-15', 'tea') for _ in range(1000))
+        db.add_expense(0.2, 1, '2024-01-16', 'more tea')
+        summary = db.get_category_summary(2024, 1)
+        assert summary[0]['total'] == Decimal('100.20')
+        assert db.get_expenses_by_month(2024, 1)[0]['amount'] == Decimal('0.20')
+    finally:
+        db.close()
+
+
+def test_legacy_real_amounts_are_migrated_in_batches(tmp_path, monkeypatch):
+    path = tmp_path / 'legacy.db'
+    rows = [(0.1 * (i + 1), 1 + i % 8, f'2023-{1 + i % 12:02d}-10', f'row {i}', 'expense')
+            for i in range(250)]
+    create_legacy_database(path, rows)
+    monkeypatch.setattr(migrations, 'MIGRATION_BATCH_SIZE', 100)
+
+    connection = sqlite3.connect(str(path))
+    progress = []
+    migrations.run_migrations(connection, progress=lambda migration, done, total: progress.append(
+        (migration.version, done, total)))
+    connection.close()
+    assert progress == [(2, 100, 250), (2, 200, 250), (2, 250, 250)]
+
+    db = DatabaseManager(str(path))
+    try:
+        assert db.applied_migrations == []
+        types = db.connection.execute('SELECT DISTINCT typeof(amount) FROM expenses').fetchall()
+        assert [row[0] for row in types] == ['integer']
+        amounts = [row['amount'] for batch in db.iter_expenses() for row in batch]
+        assert amounts == [Decimal(i + 1) / 10 for i in range(250)]
+        assert db.verify_category_totals() == []
+
+        new_id = db.add_expense(5, 1, '2024-01-01', 'after migration')
+        assert new_id == 251
+    finally:
+        db.close()
+
+
+def test_legacy_half_cents_round_like_new_amounts(tmp_path):
+    path = tmp_path / 'legacy.db'
+    amounts = [1.005, 2.675, 0.125, 1234.565, 10.0]
+    create_legacy_database(path, [(amount, 1, '2023-05-10', 'half', 'expense') for amount in amounts])
+
+    db = DatabaseManager(str(path))
+    try:
+        stored = [row[0] for row in db.connection.execute('SELECT amount FROM expenses ORDER BY id')]
+        assert stored == [to_minor_units(amount) for amount in amounts] == [101, 268, 13, 123457, 1000]
+        assert db.verify_category_totals() == []
+    finally:
+        db.close()
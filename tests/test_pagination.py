@@ -0,0 +1,72 @@
+import random
+
+import pytest
+
+from database.db_manager import DatabaseManager, ExpenseFilter
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(str(tmp_path / 'pages.db'))
+    rng = random.Random(3)
+    # Few distinct dates, so many rows tie on date and the id tiebreaker matters.
+    manager.add_expenses_bulk(
+        (rng.randint(1, 500), rng.randint(1, 8), f'2024-{rng.randint(1, 4):02d}-{rng.choice([1, 15, 28]):02d}',
+         f'row {i}', rng.choice(['expense', 'expense', 'income']))
+        for i in range(700))
+    yield manager
+    manager.close()
+
+
+def all_pages(db, limit, filters=None):
+    rows, after = [], None
+    while True:
+        page = db.get_expenses_page(after, limit, filters)
+        rows.extend(page)
+        if len(page) < limit:
+            return rows
+        after = (page[-1]['date'], page[-1]['id'])
+
+
+def expected(db, filters=ExpenseFilter()):
+    rows = [row for row in db.get_all_expenses()
+            if filters.category_id in (None, row['category_id'])
+            and filters.type in (None, row['type'])
+            and (filters.start is None or row['date'] >= filters.start)
+            and (filters.end is None or row['date'] < filters.end)]
+    return [row['id'] for row in rows]
+
+
+@pytest.mark.parametrize('filters', [
+    None,
+    ExpenseFilter(category_id=3),
+    ExpenseFilter(type='income'),
+    ExpenseFilter(category_id=5, type='expense', start='2024-02-01', end='2024-04-01'),
+])
+def test_keyset_pages_cover_every_row_once_in_order(db, filters):
+    ids = [row['id'] for row in all_pages(db, 37, filters)]
+    assert ids == expected(db, filters or ExpenseFilter())
+
+
+def test_listing_order_breaks_date_ties_by_id(db):
+    keys = [(row['date'], row['id']) for row in db.get_all_expenses()]
+    assert keys == sorted(keys, reverse=True)
+
+
+@pytest.mark.parametrize('filters', [
+    None,
+    ExpenseFilter(category_id=2),
+    ExpenseFilter(type='income', start='2024-01-15'),
+    ExpenseFilter(end='2024-03-15'),
+    ExpenseFilter(category_id=4, start='2024-01-10', end='2024-04-20'),
+    ExpenseFilter(start='2024-02-02', end='2024-02-20'),
+    ExpenseFilter(start='2024-02-01', end='2024-03-01'),
+])
+def test_count_matches_listing(db, filters):
+    assert db.count_expenses(filters) == len(expected(db, filters or ExpenseFilter()))
+
+
+def test_next_month_start():
+    assert DatabaseManager.next_month_start('2024-03-01') == '2024-03-01'
+    assert DatabaseManager.next_month_start('2024-03-02') == '2024-04-01'
+    assert DatabaseManager.next_month_start('2024-12-31') == '2025-01-01'
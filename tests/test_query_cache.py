@@ -0,0 +1,53 @@
+import sqlite3
+
+import pytest
+
+from database.db_manager import DatabaseManager
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(str(tmp_path / 'cache.db'), cache_capacity=2)
+    manager.add_expense(5, 1, '2024-03-01', 'tea')
+    yield manager
+    manager.close()
+
+
+def test_repeated_queries_are_served_from_memory(db):
+    first = db.get_category_summary(2024, 3)
+    assert db.get_category_summary(2024, 3) is first
+    info = db.cache_info()
+    assert (info['hits'], info['misses']) == (1, 1)
+
+
+def test_own_writes_invalidate(db):
+    before = db.get_category_summary(2024, 3)
+    db.add_expense(7, 1, '2024-03-02', 'cake')
+    after = db.get_category_summary(2024, 3)
+    assert after is not before
+    assert str(after[0]['total']) == '12.00'
+    assert db.cache_info()['invalidations'] == 1
+
+
+def test_writes_from_other_connections_invalidate(db):
+    db.get_expenses_by_month(2024, 3)
+    other = sqlite3.connect(str(db.db_path))
+    other.execute("INSERT INTO expenses (amount, category_id, date, description, type) "
+                  "VALUES (100, 1, '2024-03-05', 'other process', 'expense')")
+    other.commit()
+    other.close()
+
+    assert len(db.get_expenses_by_month(2024, 3)) == 2
+    assert db.cache_info()['misses'] == 2
+
+
+def test_least_recently_used_entry_is_evicted(db):
+    db.get_category_summary(2024, 1)
+    db.get_category_summary(2024, 2)
+    db.get_category_summary(2024, 1)
+    db.get_category_summary(2024, 3)
+
+    info = db.cache_info()
+    assert (info['evictions'], info['size']) == (1, 2)
+    db.get_category_summary(2024, 1)
+    assert db.cache_info()['hits'] == 2
@@ -0,0 +1,148 @@
+import inspect
+import types
+
+import pytest
+
+from database.db_manager import DatabaseManager, ExpenseFilter
+
+QUERY_METHODS = {
+    'get_all_expenses': (),
+    'get_expenses_slice': (0, 50),
+    'get_expenses_page': (('2024-06-15', 100), 20),
+    'get_expenses_by_month': ('2024', 3),
+    'count_expenses': (ExpenseFilter(category_id=2, start='2024-02-10', end='2024-07-15'),),
+    'get_category_summary': ('2024', 12),
+    'get_categories': (),
+    'iter_expenses': ('2024', 3),
+    'iter_expense_columns': ('2024-01-01', '2025-01-01'),
+    'search_expenses': ('row 1', 20),
+    'get_balance_before': ('2024-06-15',),
+    'get_balance': ('2024-06-30',),
+    'get_daily_balances': ('2024-06-01', '2024-07-01'),
+    'update_expense': (2, 15.0, 3, '2024-05-05', 'edited', 'expense'),
+    'delete_expense': (1,),
+    'get_recurring_rules': (),
+    'delete_recurring_rule': (1,),
+    'verify_category_totals': (),
+    'verify_balance_checkpoints': (),
+}
+
+# Rules are read whole to project them; the table holds a handful of rows.
+WHOLE_TABLE_READS = {'get_recurring_rules'}
+
+# Checks compare every stored rollup row with the expenses, so the rollup is
+# read whole; the expenses are read through the covering index.
+ROLLUP_CHECKS = {'verify_category_totals': 'monthly_category_totals',
+                 'verify_balance_checkpoints': 'balance_checkpoints'}
+
+MONTH_FILTERED = {'get_expenses_by_month', 'iter_expenses'}
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(str(tmp_path / 'plans.db'))
+    for i in range(200):
+        manager.add_expense(10 + i, 1 + i % 8, f'2024-{1 + i % 12:02d}-{1 + i % 28:02d}',
+                            f'row {i}', 'income' if i % 5 == 0 else 'expense')
+    manager.connection.execute('ANALYZE')
+    yield manager
+    manager.close()
+
+
+def capture_statements(db, method, args):
+    statements = []
+    db.connection.set_trace_callback(statements.append)
+    try:
+        result = getattr(db, method)(*args)
+        if isinstance(result, types.GeneratorType):
+            list(result)
+    finally:
+        db.connection.set_trace_callback(None)
+    # Lines starting with "--" are statements SQLite runs internally (FTS5
+    # shadow tables), not ones issued by the method.
+    return [sql for sql in statements
+            if not sql.lstrip().upper().startswith(('BEGIN', 'COMMIT', 'ROLLBACK', '--'))]
+
+
+def query_plan(db, sql):
+    return [row['detail'] for row in db.connection.execute('EXPLAIN QUERY PLAN ' + sql)]
+
+
+def is_full_table_scan(detail, tables):
+    if 'VIRTUAL TABLE INDEX' in detail:
+        # FTS5 reports a MATCH lookup as a scan of the virtual table with an
+        # index plan such as "32:M1"; plan 0 means no constraint was used.
+        return 'INDEX 0:' in detail
+    # Scans of CTEs and subquery results are not table scans.
+    return detail.startswith('SCAN') and 'USING' not in detail and detail.split()[1] in tables
+
+
+def table_names(db):
+    return {row['name'] for row in db.connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def test_every_query_method_is_covered():
+    # Static helpers such as search_match build SQL text but run none.
+    public = {name for name in dir(DatabaseManager)
+              if name.startswith(('get_', 'iter_', 'update_', 'delete_', 'count_', 'search_', 'verify_'))
+              and not isinstance(inspect.getattr_static(DatabaseManager, name), staticmethod)}
+    assert public <= set(QUERY_METHODS)
+
+
+@pytest.mark.parametrize('method', sorted(QUERY_METHODS))
+def test_query_plan_has_no_full_table_scan(db, method):
+    if method in WHOLE_TABLE_READS:
+        pytest.skip('reads the whole table by design')
+    statements = capture_statements(db, method, QUERY_METHODS[method])
+    assert statements
+
+    tables = table_names(db) - {ROLLUP_CHECKS.get(method)}
+    for sql in statements:
+        plan = query_plan(db, sql)
+        scans = [detail for detail in plan if is_full_table_scan(detail, tables)]
+        assert not scans, f'{method} scans a table without an index: {scans}\n{sql}'
+
+
+@pytest.mark.parametrize('method', sorted(MONTH_FILTERED))
+def test_month_filters_use_date_range_search(db, method):
+    statements = capture_statements(db, method, QUERY_METHODS[method])
+    plan = [detail for sql in statements for detail in query_plan(db, sql)]
+    assert any(detail.startswith('SEARCH') and 'date>? AND date<?' in detail
+               for detail in plan), plan
+
+
+@pytest.mark.parametrize('method', sorted(ROLLUP_CHECKS))
+def test_rollup_checks_read_expenses_through_covering_index(db, method):
+    statements = capture_statements(db, method, QUERY_METHODS[method])
+    plan = [detail for sql in statements for detail in query_plan(db, sql)]
+    assert 'SCAN expenses USING COVERING INDEX idx_expenses_date_category_type_amount' in plan, plan
+    assert f'SCAN {ROLLUP_CHECKS[method]}' in plan, plan
+
+
+def test_category_summary_reads_rollup_by_period(db):
+    statements = capture_statements(db, 'get_category_summary', QUERY_METHODS['get_category_summary'])
+    plan = [detail for sql in statements for detail in query_plan(db, sql)]
+    assert any(detail.startswith('SEARCH monthly_category_totals USING PRIMARY KEY (period=?)')
+               for detail in plan), plan
+    assert not any('expenses' in sql for sql in statements)
+
+
+@pytest.mark.parametrize('method', ['get_all_expenses', 'get_expenses_slice',
+                                    'get_expenses_by_month', 'get_category_summary'])
+def test_list_queries_do_not_join_categories(db, method):
+    statements = capture_statements(db, method, QUERY_METHODS[method])
+    assert not any('categories' in sql for sql in statements)
+
+
+def test_month_range_is_half_open():
+    assert DatabaseManager.month_range('2024', 2) == ('2024-02-01', '2024-03-01')
+    assert DatabaseManager.month_range(2023, 12) == ('2023-12-01', '2024-01-01')
+
+
+@pytest.mark.parametrize('filters', [None, ExpenseFilter(category_id=3)])
+def test_keyset_page_seeks_without_sorting(db, filters):
+    statements = capture_statements(db, 'get_expenses_page', (('2024-06-15', 100), 20, filters))
+    plan = [detail for sql in statements for detail in query_plan(db, sql)]
+    assert any(detail.startswith('SEARCH expenses USING INDEX idx_expenses_') for detail in plan), plan
+    assert not any('TEMP B-TREE' in detail for detail in plan), plan
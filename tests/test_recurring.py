@@ -0,0 +1,78 @@
+import types
+
+import pytest
+
+from database.db_manager import DatabaseManager
+from database.recurring import RecurringRule, rule_dates
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(str(tmp_path / 'recurring.db'))
+    yield manager
+    manager.close()
+
+
+def rule(start_date, day_of_month, interval_months=1, end_date=None):
+    return RecurringRule(1, 10, 1, 'rent', 'expense', start_date, interval_months, day_of_month,
+                         end_date, None)
+
+
+def test_dates_clamp_to_short_months_and_respect_interval_and_end():
+    assert list(rule_dates(rule('2024-01-31', 31), '2024-01-01', '2024-05-01')) == [
+        '2024-01-31', '2024-02-29', '2024-03-31', '2024-04-30']
+    assert list(rule_dates(rule('2024-01-15', 10, 2), '2024-01-01', '2024-08-01')) == [
+        '2024-03-10', '2024-05-10', '2024-07-10']
+    assert list(rule_dates(rule('2020-01-05', 5, 3, '2024-04-05'), '2024-01-01', '2030-01-01')) == [
+        '2024-01-05', '2024-04-05']
+
+
+def test_catch_up_is_one_transaction_and_idempotent(db):
+    db.add_recurring_rule(1200, 6, '2022-01-01', 'rent')
+    db.add_recurring_rule(5000, 8, '2022-01-25', 'salary', 'income')
+    db.add_recurring_rule(99, 3, '2022-03-10', 'yearly', interval_months=12, end_date='2023-12-31')
+    commits = db.write_info()['commits']
+
+    assert db.materialize_recurring('2023-12-31') == 24 + 24 + 2
+    assert db.write_info()['commits'] == commits + 1
+    assert db.materialize_recurring('2023-12-31') == 0
+    assert db.count_expenses() == 50
+    assert db.verify_category_totals() == [] and db.verify_balance_checkpoints() == []
+
+
+def test_deleted_occurrences_are_not_recreated(db):
+    db.add_recurring_rule(10, 1, '2024-01-05', 'gym')
+    db.materialize_recurring('2024-03-31')
+    db.delete_expense(db.get_expenses_by_month(2024, 2)[0]['id'])
+
+    assert db.materialize_recurring('2024-04-30') == 1
+    assert [row['date'] for row in db.get_all_expenses()] == ['2024-04-05', '2024-03-05', '2024-01-05']
+
+
+def test_projection_is_lazy_and_starts_after_written_occurrences(db):
+    db.add_recurring_rule(10, 1, '2024-01-05', 'gym')
+    db.add_recurring_rule(20, 2, '2024-01-20', 'bus', interval_months=2)
+    db.materialize_recurring('2024-02-10')
+
+    projected = db.project_recurring('2024-01-01', '2024-05-01')
+    assert isinstance(projected, types.GeneratorType)
+    assert [(item.date, item.rule_id) for item in projected] == [
+        ('2024-03-05', 1), ('2024-03-20', 2), ('2024-04-05', 1)]
+    assert db.count_expenses() == 3
+
+
+def test_rules_are_validated(db):
+    with pytest.raises(ValueError):
+        db.add_recurring_rule(10, 99, '2024-01-05')
+    with pytest.raises(ValueError):
+        db.add_recurring_rule(10, 1, '2024-01-05', interval_months=0)
+    with pytest.raises(ValueError):
+        db.add_recurring_rule(10, 1, '2024-01-05', end_date='2023-01-01')
+    with pytest.raises(ValueError):
+        db.add_recurring_rule(10, 1, '2024-02-30', day_of_month=5)
+    with pytest.raises(ValueError):
+        db.add_recurring_rule(10, 1, '2024-01-05', end_date='soon')
+    with pytest.raises(ValueError):
+        db.add_recurring_rule(10, 1, '2024-01-05', end_date='2024-1-31')
+    assert db.get_recurring_rules() == []
+    assert db.materialize_recurring('2024-03-01') == 0
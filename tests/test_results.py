@@ -0,0 +1,53 @@
+from decimal import Decimal
+
+import pytest
+
+from database.db_manager import DatabaseManager, from_minor_units
+from database.results import ExpenseColumns
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(str(tmp_path / 'results.db'))
+    manager.add_expenses_bulk([
+        (12.5, 1, '2024-03-01', 'coffee', 'expense'),
+        (3000, 8, '2024-03-02', 'salary', 'income'),
+        (7.25, 1, '1999-12-31', 'coffee', 'expense'),
+        (40, 3, '2024-02-29', None, 'expense'),
+    ])
+    yield manager
+    manager.close()
+
+
+def test_rows_match_the_table(db):
+    expected = db.connection.execute(
+        'SELECT id, amount, category_id, date, description, type FROM expenses '
+        'ORDER BY date DESC, id DESC').fetchall()
+    rows = db.get_all_expenses()
+    assert [tuple(row) for row in rows] == \
+        [(row[0], from_minor_units(row[1])) + tuple(row[2:]) for row in expected]
+
+    row = rows[0]
+    assert row['amount'] == row.amount == row[1] == Decimal('3000.00')
+    assert row.date == '2024-03-02' and row.type == 'income'
+    assert dict(row)['description'] == 'salary'
+    assert rows.key(len(rows) - 1) == ('1999-12-31', rows[len(rows) - 1].id)
+
+
+def test_repeated_descriptions_are_stored_once(db):
+    rows = db.get_all_expenses()
+    coffee = [text for text in rows.descriptions if text == 'coffee']
+    assert len(coffee) == 2 and coffee[0] is coffee[1]
+
+
+def test_extend_insert_and_delete(db):
+    rows = db.get_expenses_page(None, 2)
+    rows.extend(db.get_expenses_page(rows.key(1), 2))
+    assert rows == db.get_all_expenses()
+
+    rows.insert(1, {'id': 99, 'amount': Decimal('1.05'), 'category_id': 5,
+                    'date': '2024-03-01', 'description': 'new', 'type': 'expense'})
+    assert tuple(rows[1]) == (99, Decimal('1.05'), 5, '2024-03-01', 'new', 'expense')
+    del rows[1]
+    assert rows == db.get_all_expenses()
+    assert ExpenseColumns() == []
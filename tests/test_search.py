@@ -0,0 +1,75 @@
+import sqlite3
+
+import pytest
+
+from database import migrations
+from database.db_manager import DatabaseManager
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(str(tmp_path / 'search.db'))
+    for i, description in enumerate(['coffee beans', 'Coffee shop downtown', 'bus ticket',
+                                     'قهوة الصباح', 'coffee coffee coffee']):
+        manager.add_expense(1 + i, 1, f'2024-01-{1 + i:02d}', description)
+    yield manager
+    manager.close()
+
+
+def descriptions(rows):
+    return [row['description'] for row in rows]
+
+
+def test_prefix_words_must_all_match(db):
+    assert sorted(descriptions(db.search_expenses('coff'))) == \
+        ['Coffee shop downtown', 'coffee beans', 'coffee coffee coffee']
+    assert descriptions(db.search_expenses('coff down')) == ['Coffee shop downtown']
+    assert descriptions(db.search_expenses('قهو')) == ['قهوة الصباح']
+    assert db.search_expenses('   ') == []
+
+
+def test_results_are_ranked_and_limited(db):
+    assert descriptions(db.search_expenses('coffee', 1)) == ['coffee coffee coffee']
+
+
+def test_operators_in_user_input_are_literal(db):
+    for query in ('coffee OR bus', '"unbalanced', 'NEAR(', '*', 'bus -'):
+        db.search_expenses(query)
+    assert descriptions(db.search_expenses('bus -')) == ['bus ticket']
+
+
+def test_index_follows_updates_and_deletes(db):
+    row = db.search_expenses('bus')[0]
+    db.update_expense(row['id'], 5, 2, row['date'], 'train pass')
+    assert db.search_expenses('bus') == []
+    assert descriptions(db.search_expenses('trai')) == ['train pass']
+
+    db.delete_expense(row['id'])
+    assert db.search_expenses('train') == []
+    db.connection.execute("INSERT INTO expenses_fts (expenses_fts) VALUES ('integrity-check')")
+
+
+def test_migration_indexes_existing_rows(tmp_path):
+    path = tmp_path / 'legacy.db'
+    connection = sqlite3.connect(str(path))
+    migrations.run_migrations(connection, migrations.MIGRATIONS[:4])
+    connection.execute("INSERT INTO expenses (amount, category_id, date, description) "
+                       "VALUES (100, 1, '2023-05-01', 'old gym membership')")
+    connection.commit()
+    connection.close()
+
+    db = DatabaseManager(str(path))
+    try:
+        assert descriptions(db.search_expenses('gym')) == ['old gym membership']
+    finally:
+        db.close()
+
+
+def test_only_recent_matches_are_ranked_unless_asked(db):
+    # With a window of two, only the newest two "coffee" rows are candidates.
+    assert descriptions(db.search_expenses('coffee', rank_window=2)) == \
+        ['coffee coffee coffee', 'Coffee shop downtown']
+    assert descriptions(db.search_expenses('coffee', 1, rank_window=None)) == ['coffee coffee coffee']
+    db.add_expense(1, 1, '2024-02-01', 'coffee refill')
+    assert descriptions(db.search_expenses('coffee', 1, rank_window=1)) == ['coffee refill']
+    assert descriptions(db.search_expenses('coffee', 1, rank_window=None)) == ['coffee coffee coffee']
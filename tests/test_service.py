@@ -0,0 +1,116 @@
+import asyncio
+import json
+
+import pytest
+
+from database.db_manager import DatabaseManager
+from service.server import ExpenseService
+
+
+async def request(service, method, path, payload=None):
+    reader, writer = await asyncio.open_connection(service.host, service.port)
+    body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+    writer.write((f'{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n'
+                  'Connection: close\r\n\r\n').encode('latin-1') + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(body)
+
+
+def run_service(tmp_path, scenario):
+    async def main():
+        service = ExpenseService(str(tmp_path / 'service.db'), port=0, pool_size=2)
+        await service.start()
+        try:
+            return await scenario(service)
+        finally:
+            await service.close()
+    return asyncio.run(main())
+
+
+def test_concurrent_adds_are_committed_in_batches(tmp_path):
+    async def scenario(service):
+        records = [{'amount': 1 + i, 'category_id': 1, 'date': '2024-05-01'} for i in range(40)]
+        responses = await asyncio.gather(*(request(service, 'POST', '/expenses', record)
+                                           for record in records))
+        return responses, service.batcher
+
+    responses, batcher = run_service(tmp_path, scenario)
+    assert all(status == 201 for status, _ in responses)
+    assert len({body['id'] for _, body in responses}) == 40
+    assert batcher.requests == 40 and batcher.batches < 40
+
+
+def test_pages_summary_and_categories(tmp_path):
+    async def scenario(service):
+        status, body = await request(service, 'POST', '/expenses/bulk', [
+            {'amount': 10.5, 'category_id': 1, 'date': '2024-03-02', 'description': 'lunch'},
+            {'amount': 100, 'category_id': 8, 'date': '2024-03-01', 'type': 'income'},
+            {'amount': 4, 'category_id': 2, 'date': '2024-02-01'},
+        ])
+        assert status == 201 and len(body['ids']) == 3
+
+        first = await request(service, 'GET', '/expenses?limit=2')
+        after = first[1]['next']
+        second = await request(service, 'GET',
+                               f"/expenses?limit=2&after_date={after['after_date']}&after_id={after['after_id']}")
+        summary = await request(service, 'GET', '/summary?year=2024&month=3')
+        categories = await request(service, 'GET', '/categories')
+        return first, second, summary, categories
+
+    first, second, summary, categories = run_service(tmp_path, scenario)
+    assert [row['description'] for row in first[1]['items']] == ['lunch', None]
+    assert [row['date'] for row in second[1]['items']] == ['2024-02-01']
+    assert second[1]['next'] is None
+    assert summary[1]['income'] == 100 and summary[1]['expenses'] == 10.5
+    assert summary[1]['balance'] == 89.5
+    assert len(categories[1]) == 8
+
+
+def test_bad_requests_do_not_affect_others(tmp_path):
+    async def scenario(service):
+        results = await asyncio.gather(
+            request(service, 'POST', '/expenses', {'amount': 5, 'category_id': 99, 'date': '2024-01-01'}),
+            request(service, 'POST', '/expenses', {'amount': 5, 'category_id': 1, 'date': '2024-01-01'}),
+            request(service, 'POST', '/expenses', {'amount': 5, 'category_id': 1, 'date': 'soon'}),
+            request(service, 'GET', '/summary?year=2024&month=13'),
+            request(service, 'GET', '/nothing'),
+            request(service, 'DELETE', '/expenses'),
+        )
+        return [status for status, _ in results]
+
+    assert run_service(tmp_path, scenario) == [400, 201, 400, 400, 404, 405]
+    db = DatabaseManager(str(tmp_path / 'service.db'))
+    assert len(db.get_all_expenses()) == 1
+    db.close()
+
+
+def test_expense_groups_share_one_commit(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'groups.db'))
+    results = db.add_expense_groups([
+        [(1, 1, '2024-01-01', 'a')],
+        [(2, 2, '2024-01-02', 'b'), (3, 99, '2024-01-03', 'bad')],
+        [{'amount': 4, 'category_id': 3, 'date': '2024-01-04'}],
+    ])
+    assert results[0] == [1] and isinstance(results[1], ValueError) and results[2] == [2]
+    assert [row['description'] for row in db.get_all_expenses()] == [None, 'a']
+    db.close()
+
+
+def test_start_materializes_rules_and_forecast_projects_the_rest(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'service.db'))
+    db.add_recurring_rule(1200, 6, '2020-01-31', 'rent')
+    db.close()
+
+    async def scenario(service):
+        forecast = await request(service, 'GET', '/forecast?start=2020-01-01&end=2099-12-01&limit=3')
+        page = await request(service, 'GET', '/expenses?limit=1')
+        return service.materialized, forecast, page
+
+    materialized, (status, body), (_, page) = run_service(tmp_path, scenario)
+    assert materialized > 12
+    assert status == 200 and len(body['items']) == 3
+    assert body['items'][0]['date'] > page['items'][0]['date']
+    assert body['items'][0]['rule_id'] == 1 and body['items'][0]['amount'] == 1200
@@ -0,0 +1,29 @@
+import io
+import subprocess
+import sys
+from pathlib import Path
+
+from utils.startup import StartupProfile
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_charts_module_does_not_import_matplotlib():
+    code = "import sys, utils.charts; print('matplotlib' in sys.modules)"
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == 'False'
+
+
+def test_profile_reports_each_phase():
+    profile = StartupProfile(started=0.0)
+    profile.mark('open database')
+    profile.mark('first paint')
+
+    output = io.StringIO()
+    profile.report(output)
+    lines = output.getvalue().splitlines()
+
+    assert [line.split()[0] for line in lines[:3]] == ['open', 'first', 'total']
+    assert lines[-1].startswith('heavy modules loaded:')
+    assert profile.elapsed() == sum(seconds for name, seconds in profile.phases)
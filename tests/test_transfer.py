@@ -0,0 +1,37 @@
+import pytest
+
+from database.db_manager import DatabaseManager
+from database import transfer
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(str(tmp_path / 'source.db'))
+    manager.add_expenses_bulk(
+        (12.5 + i, 1 + i % 8, f'2024-{1 + i % 12:02d}-{1 + i % 28:02d}', f'row, "{i}"',
+         'income' if i % 4 == 0 else 'expense')
+        for i in range(120)
+    )
+    yield manager
+    manager.close()
+
+
+@pytest.mark.parametrize('suffix', ['.csv', '.jsonl'])
+def test_export_import_round_trip(db, tmp_path, suffix):
+    path = tmp_path / f'ledger{suffix}'
+    assert transfer.export_expenses(db, str(path), batch_size=7) == 120
+
+    target = DatabaseManager(str(tmp_path / f'target{suffix}.db'))
+    try:
+        assert transfer.import_expenses(target, str(path), chunk_size=50)['rows'] == 120
+        source_rows = [tuple(row)[1:] for batch in db.iter_expenses() for row in batch]
+        target_rows = [tuple(row)[1:] for batch in target.iter_expenses() for row in batch]
+        assert target_rows == source_rows
+    finally:
+        target.close()
+
+
+def test_export_honours_month_filter(db, tmp_path):
+    path = tmp_path / 'march.csv'
+    assert transfer.export_expenses(db, str(path), year=2024, month=3) == 10
+    assert len(db.get_expenses_by_month(2024, 3)) == 10
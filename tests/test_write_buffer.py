@@ -0,0 +1,72 @@
+import sqlite3
+
+import pytest
+
+from database.db_manager import DatabaseManager
+
+
+def committed_rows(db):
+    other = sqlite3.connect(str(db.db_path))
+    try:
+        return other.execute('SELECT COUNT(*) FROM expenses').fetchone()[0]
+    finally:
+        other.close()
+
+
+@pytest.fixture
+def db(tmp_path):
+    manager = DatabaseManager(str(tmp_path / 'buffer.db'), durability='grouped',
+                              commit_rows=3, commit_interval=60)
+    yield manager
+    manager.close()
+
+
+def test_immediate_commits_every_write(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'immediate.db'))
+    db.add_expense(5, 1, '2024-03-01', 'tea')
+    assert committed_rows(db) == 1
+    assert db.write_info()['pending'] == 0
+    db.close()
+
+
+def test_grouped_reads_see_own_writes_before_commit(db):
+    expense_id = db.add_expense(5, 1, '2024-03-01', 'tea')
+    db.add_expense(7, 1, '2024-03-02', 'cake')
+
+    assert len(db.get_expenses_by_month(2024, 3)) == 2
+    assert str(db.get_category_summary(2024, 3)[0]['total']) == '12.00'
+    assert committed_rows(db) == 0
+
+    db.delete_expense(expense_id)
+    assert committed_rows(db) == 1
+    assert db.write_info() == {'writes': 3, 'commits': 1, 'pending': 0, 'durability': 'grouped'}
+
+
+def test_grouped_commits_after_the_interval(db):
+    db.commit_interval = 0
+    db.add_expense(5, 1, '2024-03-01', 'tea')
+    assert committed_rows(db) == 1
+
+    db.commit_interval = 60
+    db.add_expense(5, 1, '2024-03-01', 'tea')
+    db.flush_if_due()
+    assert committed_rows(db) == 1
+
+
+def test_bulk_writes_and_close_flush_pending_rows(db):
+    db.add_expense(5, 1, '2024-03-01', 'tea')
+    results = db.add_expense_groups([[(1, 1, '2024-03-03', 'a')], [(1, 99, '2024-03-03', 'bad')]])
+    assert isinstance(results[1], ValueError)
+    assert committed_rows(db) == 2
+
+    db.add_expense(5, 1, '2024-03-01', 'tea')
+    db.close()
+    assert committed_rows(db) == 3
+
+
+def test_relaxed_turns_off_synchronous(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'relaxed.db'), durability='relaxed')
+    assert db.connection.execute('PRAGMA synchronous').fetchone()[0] == 0
+    db.close()
+    with pytest.raises(ValueError):
+        DatabaseManager(str(tmp_path / 'bad.db'), durability='eventually')
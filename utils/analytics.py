@@ -0,0 +1,122 @@
+from collections import namedtuple
+
+import numpy as np
+
+from database.money import MINOR_UNIT_DIGITS
+
+MonthlyTotals = namedtuple('MonthlyTotals', 'months income expenses balance')
+YearOverYear = namedtuple('YearOverYear', 'years income expenses income_change expenses_change')
+CategoryTrends = namedtuple('CategoryTrends', 'category_ids slope average last')
+CumulativeBalance = namedtuple('CumulativeBalance', 'months balance')
+
+ROLLING_WINDOWS = (3, 6, 12)
+
+
+class ExpenseSnapshot:
+    # Column arrays of every transaction, loaded with one query. All reports
+    # are computed from a dense (month x category) matrix built with bincount,
+    # so months without transactions count as zero.
+
+    def __init__(self, days, category_ids, income, amounts):
+        self.days = np.asarray(days, dtype=np.int64)
+        self.category_ids = np.asarray(category_ids, dtype=np.int64)
+        self.income = np.asarray(income, dtype=bool)
+        self.amounts = np.asarray(amounts, dtype=np.int64)
+
+        months = self.days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+        self.first_month = int(months.min()) if len(months) else 0
+        self.month_index = months - self.first_month
+        self.month_count = int(self.month_index.max()) + 1 if len(months) else 0
+        self.categories, self.category_index = np.unique(self.category_ids, return_inverse=True)
+        self._matrices = {}
+
+    @classmethod
+    def load(cls, db, start=None, end=None, batch_size=50000):
+        chunks = [np.array(batch, dtype=np.int64)
+                  for batch in db.iter_expense_columns(start, end, batch_size)]
+        columns = np.concatenate(chunks) if chunks else np.empty((0, 4), dtype=np.int64)
+        return cls(columns[:, 0], columns[:, 1], columns[:, 2], columns[:, 3])
+
+    def __len__(self):
+        return len(self.amounts)
+
+    def months(self):
+        return np.arange(self.first_month, self.first_month + self.month_count).astype('datetime64[M]')
+
+    def matrix(self, kind='expense'):
+        # Totals in major units, one row per month and one column per category.
+        matrix = self._matrices.get(kind)
+        if matrix is None:
+            mask = self.income if kind == 'income' else ~self.income
+            cells = self.month_index[mask] * len(self.categories) + self.category_index[mask]
+            matrix = np.bincount(cells, weights=self.amounts[mask],
+                                 minlength=self.month_count * len(self.categories))
+            matrix = matrix.reshape(self.month_count, len(self.categories)) / 10 ** MINOR_UNIT_DIGITS
+            self._matrices[kind] = matrix
+        return matrix
+
+    def monthly_totals(self):
+        income = self.matrix('income').sum(axis=1)
+        expenses = self.matrix('expense').sum(axis=1)
+        return MonthlyTotals(self.months(), income, expenses, income - expenses)
+
+    @staticmethod
+    def rolling_average(values, window):
+        # Trailing mean; the first window - 1 months have no full window and are NaN.
+        values = np.asarray(values, dtype=np.float64)
+        averages = np.full(len(values), np.nan)
+        if len(values) >= window:
+            sums = np.cumsum(np.concatenate(([0.0], values)))
+            averages[window - 1:] = (sums[window:] - sums[:-window]) / window
+        return averages
+
+    def rolling_averages(self, windows=ROLLING_WINDOWS, kind='expense'):
+        totals = self.matrix(kind).sum(axis=1)
+        return {window: self.rolling_average(totals, window) for window in windows}
+
+    def year_over_year(self):
+        years = self.months().astype('datetime64[Y]').astype(np.int64) + 1970
+        first_year = years[0] if len(years) else 0
+        year_index = years - first_year
+        count = int(year_index[-1]) + 1 if len(years) else 0
+
+        totals = self.monthly_totals()
+        income = np.bincount(year_index, weights=totals.income, minlength=count)
+        expenses = np.bincount(year_index, weights=totals.expenses, minlength=count)
+        return YearOverYear(np.arange(first_year, first_year + count), income, expenses,
+                            self._change(income), self._change(expenses))
+
+    @staticmethod
+    def _change(totals):
+        change = np.full(len(totals), np.nan)
+        previous = totals[:-1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            change[1:] = np.where(previous != 0, totals[1:] / previous - 1, np.nan)
+        return change
+
+    def category_trends(self, months=12, kind='expense'):
+        # Least-squares slope of each category's monthly total over the last
+        # `months` months, in currency units per month.
+        recent = self.matrix(kind)[-months:]
+        if not len(recent):
+            empty = np.zeros(len(self.categories))
+            return CategoryTrends(self.categories, empty, empty, empty)
+
+        steps = np.arange(len(recent), dtype=np.float64)
+        steps -= steps.mean()
+        spread = steps @ steps
+        slope = (steps @ recent) / spread if spread else np.zeros(len(self.categories))
+        return CategoryTrends(self.categories, slope, recent.mean(axis=0), recent[-1])
+
+    def cumulative_balance(self):
+        totals = self.monthly_totals()
+        return CumulativeBalance(totals.months, np.cumsum(totals.balance))
+
+    def dashboard(self, windows=ROLLING_WINDOWS, trend_months=12):
+        return {
+            'monthly': self.monthly_totals(),
+            'rolling': self.rolling_averages(windows),
+            'year_over_year': self.year_over_year(),
+            'trends': self.category_trends(trend_months),
+            'balance': self.cumulative_balance(),
+        }
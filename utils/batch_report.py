@@ -0,0 +1,135 @@
+import csv
+import json
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from database.db_manager import DatabaseManager
+from utils.charts import ChartsManager, chart_spec, render_chart
+
+CSV_COLUMNS = ('database', 'period', 'kind', 'category_id', 'category', 'type', 'total', 'count')
+CHART_TITLES = {'pie': 'توزيع المصاريف', 'bar': 'المصاريف حسب الفئة'}
+
+BatchReport = namedtuple('BatchReport', 'ledgers failures seconds workers')
+
+
+def month_periods(start, end):
+    # 'YYYY-MM' periods from start to end, both included.
+    year, month = (int(part) for part in start.split('-'))
+    last_year, last_month = (int(part) for part in end.split('-'))
+    if not 1 <= month <= 12 or not 1 <= last_month <= 12:
+        raise ValueError('periods must be YYYY-MM')
+    if (year, month) > (last_year, last_month):
+        raise ValueError(f'{start} is after {end}')
+
+    periods = []
+    while (year, month) <= (last_year, last_month):
+        periods.append(DatabaseManager.month_period(year, month))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return periods
+
+
+def ledger_report(index, path, periods, chart_dir=None):
+    # Runs in a worker process: one ledger, every period, and its charts.
+    started = time.perf_counter()
+    path = Path(path).resolve()
+    if not path.is_file():
+        raise FileNotFoundError(f'no such database: {path}')
+
+    # Read-only: reporting never migrates or otherwise changes a ledger.
+    db = DatabaseManager(str(path), cache_capacity=0, read_only=True)
+    try:
+        months = []
+        range_totals = {}
+        for period in periods:
+            year, month = period.split('-')
+            rows = [dict(row) for row in db.get_category_summary(year, month)]
+            summary = ChartsManager.create_summary_report(
+                [{'type': row['type'], 'amount': row['total']} for row in rows])
+            for row in rows:
+                row['category'] = db.categories.name(row['category_id'])
+                if row['type'] == 'expense':
+                    range_totals[row['category_id']] = range_totals.get(row['category_id'], 0) + row['total']
+            months.append(dict(summary, period=period, categories=rows))
+
+        charts = []
+        if chart_dir is not None:
+            data = [{'category_id': category_id, 'total': total}
+                    for category_id, total in sorted(range_totals.items(), key=lambda item: -item[1])]
+            for kind, title in CHART_TITLES.items():
+                image = Path(chart_dir) / f'{index:03d}-{path.stem}-{kind}.png'
+                spec = chart_spec(kind, data, f'{title}\n{periods[0]} – {periods[-1]}', db.categories)
+                image.write_bytes(render_chart(spec))
+                charts.append(str(image))
+    finally:
+        db.close()
+
+    return {'database': str(path), 'periods': months, 'charts': charts,
+            'seconds': round(time.perf_counter() - started, 3)}
+
+
+def run_batch_report(paths, start, end, chart_dir=None, workers=None):
+    # One ledger per task; ledgers are independent, so the wall time falls
+    # with the number of worker processes up to one per core.
+    periods = month_periods(start, end)
+    workers = min(workers or os.cpu_count() or 1, len(paths))
+    if chart_dir is not None:
+        Path(chart_dir).mkdir(parents=True, exist_ok=True)
+
+    started = time.perf_counter()
+    ledgers = [None] * len(paths)
+    failures = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(ledger_report, index, path, periods, chart_dir): index
+                   for index, path in enumerate(paths)}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                ledgers[index] = future.result()
+            except Exception as e:
+                # A broken ledger is reported; the others still finish.
+                failures.append({'database': str(paths[index]), 'error': str(e)})
+
+    return BatchReport([ledger for ledger in ledgers if ledger is not None], failures,
+                       round(time.perf_counter() - started, 3), workers)
+
+
+def consolidated_totals(ledgers):
+    # Income, expenses and balance of every period across all ledgers.
+    totals = {}
+    for ledger in ledgers:
+        for month in ledger['periods']:
+            period = totals.setdefault(month['period'], {'income': 0, 'expenses': 0, 'balance': 0})
+            for name in period:
+                period[name] += month[name]
+    return [dict(values, period=period) for period, values in sorted(totals.items())]
+
+
+def csv_rows(ledgers):
+    for ledger in ledgers:
+        for month in ledger['periods']:
+            for row in month['categories']:
+                yield (ledger['database'], month['period'], 'category', row['category_id'],
+                       row['category'], row['type'], row['total'], row['count'])
+            for name in ('income', 'expenses', 'balance'):
+                yield (ledger['database'], month['period'], 'summary', '', '', name, month[name], '')
+    for period in consolidated_totals(ledgers):
+        for name in ('income', 'expenses', 'balance'):
+            yield ('*', period['period'], 'summary', '', '', name, period[name], '')
+
+
+def write_batch_report(report, path, file_format=None):
+    file_format = file_format or ('json' if str(path).lower().endswith('.json') else 'csv')
+    if file_format == 'json':
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'ledgers': report.ledgers, 'totals': consolidated_totals(report.ledgers),
+                       'failures': report.failures, 'seconds': report.seconds, 'workers': report.workers},
+                      f, ensure_ascii=False, indent=2, default=float)
+        return
+
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        writer.writerows(csv_rows(report.ledgers))
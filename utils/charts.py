@@ -1,28 +1,132 @@
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
-import matplotlib.patches as mpatches
+import hashlib
+import io
+import math
+from collections import namedtuple, OrderedDict
 from datetime import datetime
 
+from utils.diagnostics import diagnostics
+
+CHART_DPI = 100
+EMPTY_TEXT = 'لا توجد بيانات'
+
+ChartSpec = namedtuple('ChartSpec', 'kind title labels values colors size')
+
+
+def new_figure(figsize):
+    # matplotlib takes longer to import than the rest of the app together, so
+    # it is loaded on the first chart rather than at startup.
+    from matplotlib.figure import Figure
+    return Figure(figsize=figsize, dpi=CHART_DPI)
+
+
+def chart_spec(kind, data, title="", registry=None, size=(6, 4)):
+    labels, colors = ChartsManager.labels_and_colors(data, registry)
+    values = tuple(float(item['total']) for item in data)
+    return ChartSpec(kind, title, tuple(labels), values, tuple(colors), tuple(size))
+
+
+def chart_key(spec):
+    return hashlib.sha1(repr(tuple(spec)).encode('utf-8')).hexdigest()
+
+
+class ChartCache:
+    def __init__(self, capacity=32):
+        self.capacity = capacity
+        self._images = OrderedDict()
+
+    def get(self, key):
+        image = self._images.get(key)
+        if image is not None:
+            self._images.move_to_end(key)
+        return image
+
+    def put(self, key, image):
+        self._images[key] = image
+        self._images.move_to_end(key)
+        while len(self._images) > self.capacity:
+            self._images.popitem(last=False)
+
+    def __len__(self):
+        return len(self._images)
+
+
+class ChartFigure:
+    # One long-lived figure per chart kind. When only the values change the
+    # existing artists are moved in place and tight_layout() is skipped.
+
+    def __init__(self, kind, size):
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        self.kind = kind
+        self.fig = new_figure(size)
+        FigureCanvasAgg(self.fig)
+        self.ax = self.fig.add_subplot(111)
+        self.artists = None
+        self.labels = None
+        self.title = None
+
+    def update(self, spec):
+        if self.artists is not None and len(spec.labels) == len(self.labels) and sum(spec.values) > 0:
+            if self.kind == 'pie':
+                ChartsManager.update_pie(self.artists, spec.values, spec.colors)
+            else:
+                ChartsManager.update_bar(self.ax, self.artists, spec.values, spec.colors)
+            relayout = spec.labels != self.labels or spec.title != self.title
+            if relayout:
+                ChartsManager.set_labels(self.kind, self.ax, self.artists, spec.labels)
+                self.ax.set_title(spec.title, fontsize=14, fontweight='bold', pad=20)
+        else:
+            self.ax.clear()
+            draw = ChartsManager.draw_pie if self.kind == 'pie' else ChartsManager.draw_bar
+            self.artists = draw(self.ax, spec.labels, spec.values, spec.colors, spec.title)
+            relayout = True
+
+        if relayout:
+            self.fig.tight_layout()
+        self.labels = spec.labels
+        self.title = spec.title
+
+    def png(self):
+        buffer = io.BytesIO()
+        self.fig.savefig(buffer, format='png')
+        return buffer.getvalue()
+
+
+_figures = {}
+
+
+@diagnostics.timed('charts.render_chart')
+def render_chart(spec):
+    # Runs in a worker process; keeps its figures between calls.
+    figure = _figures.get((spec.kind, spec.size))
+    if figure is None:
+        figure = _figures[spec.kind, spec.size] = ChartFigure(spec.kind, spec.size)
+    figure.update(spec)
+    return figure.png()
+
+
 class ChartsManager:
     
     @staticmethod
-    def create_pie_chart(data, title=""):
-        fig = Figure(figsize=(8, 6), dpi=100)
-        ax = fig.add_subplot(111)
-        
-        if not data:
-            ax.text(0.5, 0.5, 'لا توجد بيانات', ha='center', va='center', fontsize=14)
-            ax.set_xlim(0, 1)
-            ax.set_ylim(0, 1)
-            ax.axis('off')
-            return fig
-        
-        categories = [item['name'] for item in data]
-        amounts = [item['total'] for item in data]
-        colors = [item['color'] for item in data]
+    def labels_and_colors(data, registry=None):
+        if registry is None:
+            return [item['name'] for item in data], [item['color'] for item in data]
+        return ([registry.name(item['category_id']) for item in data],
+                [registry.color(item['category_id']) for item in data])
+    
+    @staticmethod
+    def draw_empty(ax):
+        ax.text(0.5, 0.5, EMPTY_TEXT, ha='center', va='center', fontsize=14)
+        ax.set_xlim(0, 1)
+        ax.set_ylim(0, 1)
+        ax.axis('off')
+        return None
+    
+    @staticmethod
+    def draw_pie(ax, labels, values, colors, title=""):
+        if not values or sum(values) <= 0:
+            return ChartsManager.draw_empty(ax)
         
-        wedges, texts, autotexts = ax.pie(amounts, labels=categories, colors=colors,
+        wedges, texts, autotexts = ax.pie(values, labels=labels, colors=colors,
                                            autopct='%1.1f%%', startangle=90)
         
         for text in texts:
@@ -35,42 +139,98 @@ class ChartsManager:
             autotext.set_fontweight('bold')
         
         ax.set_title(title, fontsize=14, fontweight='bold', pad=20)
-        fig.tight_layout()
-        return fig
+        return wedges, texts, autotexts
     
     @staticmethod
-    def create_bar_chart(data, title=""):
-        fig = Figure(figsize=(10, 6), dpi=100)
-        ax = fig.add_subplot(111)
-        
-        if not data:
-            ax.text(0.5, 0.5, 'لا توجد بيانات', ha='center', va='center', fontsize=14)
-            ax.set_xlim(0, 1)
-            ax.set_ylim(0, 1)
-            ax.axis('off')
-            return fig
-        
-        categories = [item['name'] for item in data]
-        amounts = [item['total'] for item in data]
-        colors = [item['color'] for item in data]
+    def update_pie(artists, values, colors):
+        wedges, texts, autotexts = artists
+        total = sum(values)
+        theta = 90.0
+        for wedge, text, autotext, value, color in zip(wedges, texts, autotexts, values, colors):
+            span = 360.0 * value / total
+            wedge.set_theta1(theta)
+            wedge.set_theta2(theta + span)
+            wedge.set_facecolor(color)
+            middle = math.radians(theta + span / 2)
+            x, y = math.cos(middle), math.sin(middle)
+            text.set_position((1.1 * x, 1.1 * y))
+            text.set_horizontalalignment('left' if x > 0 else 'right')
+            autotext.set_position((0.6 * x, 0.6 * y))
+            autotext.set_text(f'{100.0 * value / total:.1f}%')
+            theta += span
+    
+    @staticmethod
+    def draw_bar(ax, labels, values, colors, title=""):
+        if not values:
+            return ChartsManager.draw_empty(ax)
         
-        bars = ax.bar(categories, amounts, color=colors, edgecolor='black', linewidth=1.5)
+        bars = ax.bar(range(len(values)), values, color=colors, edgecolor='black', linewidth=1.5)
         
+        value_texts = []
         for bar in bars:
             height = bar.get_height()
-            ax.text(bar.get_x() + bar.get_width()/2., height,
-                   f'{height:.2f}',
-                   ha='center', va='bottom', fontsize=10)
+            value_texts.append(ax.text(bar.get_x() + bar.get_width()/2., height,
+                                       f'{height:.2f}',
+                                       ha='center', va='bottom', fontsize=10))
         
         ax.set_ylabel('المبلغ', fontsize=12, fontweight='bold')
         ax.set_title(title, fontsize=14, fontweight='bold', pad=20)
-        ax.set_xticklabels(categories, rotation=45, ha='right')
+        ax.set_xticks(range(len(values)))
+        ax.set_xticklabels(labels, rotation=45, ha='right')
         ax.grid(axis='y', alpha=0.3)
+        return bars, value_texts
+    
+    @staticmethod
+    def update_bar(ax, artists, values, colors):
+        bars, value_texts = artists
+        for bar, value_text, value, color in zip(bars, value_texts, values, colors):
+            bar.set_height(value)
+            bar.set_facecolor(color)
+            value_text.set_position((bar.get_x() + bar.get_width()/2., value))
+            value_text.set_text(f'{value:.2f}')
+        ax.relim()
+        ax.autoscale_view()
+    
+    @staticmethod
+    def set_labels(kind, ax, artists, labels):
+        if kind == 'pie':
+            for text, label in zip(artists[1], labels):
+                text.set_text(label)
+        else:
+            ax.set_xticklabels(labels, rotation=45, ha='right')
+    
+    @staticmethod
+    @diagnostics.timed('ChartsManager.create_pie_chart')
+    def create_pie_chart(data, title="", registry=None):
+        fig = new_figure((8, 6))
+        ax = fig.add_subplot(111)
+        
+        if not data:
+            ChartsManager.draw_empty(ax)
+            return fig
+        
+        spec = chart_spec('pie', data, title, registry)
+        ChartsManager.draw_pie(ax, spec.labels, spec.values, spec.colors, title)
+        fig.tight_layout()
+        return fig
+    
+    @staticmethod
+    @diagnostics.timed('ChartsManager.create_bar_chart')
+    def create_bar_chart(data, title="", registry=None):
+        fig = new_figure((10, 6))
+        ax = fig.add_subplot(111)
+        
+        if not data:
+            ChartsManager.draw_empty(ax)
+            return fig
         
+        spec = chart_spec('bar', data, title, registry)
+        ChartsManager.draw_bar(ax, spec.labels, spec.values, spec.colors, title)
         fig.tight_layout()
         return fig
     
     @staticmethod
+    @diagnostics.timed('ChartsManager.create_summary_report')
     def create_summary_report(expenses_data):
         income = 0
         expenses = 0
@@ -0,0 +1,298 @@
+import bisect
+import functools
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the histogram buckets, in milliseconds; the last bucket is open.
+BUCKET_BOUNDS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+SLOW_QUERY_MS = 50
+STALL_MS = 100
+SLOW_LOG_SIZE = 100
+SPAN_LOG_SIZE = 256
+EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms):
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+
+    def percentile(self, fraction):
+        # Upper bound of the bucket holding the percentile (the max for the open bucket).
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return BUCKET_BOUNDS_MS[index] if index < len(BUCKET_BOUNDS_MS) else self.max
+        return 0.0
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total_ms': round(self.total, 3),
+            'mean_ms': round(self.total / self.count, 3) if self.count else 0.0,
+            'max_ms': round(self.max, 3),
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'buckets': dict(zip([f'<={bound}' for bound in BUCKET_BOUNDS_MS] + ['>'], self.buckets))
+        }
+
+
+class Diagnostics:
+    # Process-wide counters, timing histograms, the slow-query log and
+    # recent spans. Everything is a no-op until enable() is called.
+
+    def __init__(self):
+        self.enabled = False
+        self.slow_query_ms = SLOW_QUERY_MS
+        self.stall_ms = STALL_MS
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.histograms = {}
+            self.statements = {}
+            self.slow_queries = deque(maxlen=SLOW_LOG_SIZE)
+            self.stalls = deque(maxlen=SLOW_LOG_SIZE)
+            self.spans = deque(maxlen=SPAN_LOG_SIZE)
+
+    def enable(self, slow_query_ms=SLOW_QUERY_MS, stall_ms=STALL_MS):
+        self.enabled = True
+        self.slow_query_ms = slow_query_ms
+        self.stall_ms = stall_ms
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, ms):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(ms)
+
+    def span(self, name, started, ms):
+        self.observe(name, ms)
+        with self._lock:
+            self.spans.append((name, started, ms, threading.get_ident()))
+
+    @contextmanager
+    def timer(self, name):
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.span(name, started, (time.perf_counter() - started) * 1000)
+
+    def timed(self, name=None):
+        def decorator(func):
+            label = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.timer(label):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def statement(self, sql, ms, rows):
+        key = ' '.join(sql.split())
+        with self._lock:
+            stats = self.statements.get(key)
+            if stats is None:
+                stats = self.statements[key] = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0}
+            stats['count'] += 1
+            stats['total_ms'] += ms
+            stats['max_ms'] = max(stats['max_ms'], ms)
+            stats['rows'] += rows
+        self.observe('sql', ms)
+
+    def slow_query(self, sql, params, ms, plan):
+        logger.warning('Slow query (%.1f ms): %s', ms, ' '.join(sql.split()))
+        with self._lock:
+            self.slow_queries.append({
+                'sql': ' '.join(sql.split()),
+                'params': [repr(value) for value in params] if isinstance(params, (list, tuple))
+                          else {name: repr(value) for name, value in dict(params).items()},
+                'ms': round(ms, 3),
+                'plan': plan,
+                'at': time.time()
+            })
+        self.count('sql.slow')
+
+    def stall(self, ms, ended):
+        # Spans on this thread that ran during the stall are the likely cause.
+        thread = threading.get_ident()
+        started = ended - ms / 1000
+        with self._lock:
+            culprits = [name for name, begun, span_ms, span_thread in self.spans
+                        if span_thread == thread and begun + span_ms / 1000 >= started and begun <= ended]
+            self.stalls.append({'ms': round(ms, 3), 'during': culprits, 'at': time.time()})
+        self.observe('qt.stall', ms)
+        self.count('qt.stalls')
+
+    def to_dict(self):
+        with self._lock:
+            statements = sorted(self.statements.items(), key=lambda item: item[1]['total_ms'], reverse=True)
+            return {
+                'enabled': self.enabled,
+                'slow_query_ms': self.slow_query_ms,
+                'stall_ms': self.stall_ms,
+                'counters': dict(self.counters),
+                'histograms': {name: histogram.to_dict() for name, histogram in sorted(self.histograms.items())},
+                'statements': [dict(stats, sql=sql, total_ms=round(stats['total_ms'], 3),
+                                    max_ms=round(stats['max_ms'], 3)) for sql, stats in statements],
+                'slow_queries': list(self.slow_queries),
+                'stalls': list(self.stalls)
+            }
+
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+
+diagnostics = Diagnostics()
+
+if os.environ.get('EXPENSE_DIAGNOSTICS'):
+    diagnostics.enable()
+
+
+def query_plan(connection, sql, params):
+    if not sql.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+    try:
+        cursor = sqlite3.Cursor(connection)
+        cursor.row_factory = None
+        return [detail for _, _, _, detail in cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)]
+    except sqlite3.Error as e:
+        return [f'unavailable: {e}']
+
+
+class TracedCursor(sqlite3.Cursor):
+    # Times each statement from execute() until its rows are consumed: the
+    # last fetch, the next execute() or close(). Statements over the
+    # slow-query threshold are logged with their EXPLAIN QUERY PLAN.
+
+    _sql = None
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._start(sql, parameters, started)
+            if self.description is None:
+                self._finish()
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._start(sql, None, started)
+            self._finish()
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(started, row is not None)
+        self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._fetched(started, len(rows))
+        if len(rows) < (self.arraysize if size is None else size):
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(started, len(rows))
+        self._finish()
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._finish()
+            raise
+        self._fetched(started, 1)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
+
+    def _start(self, sql, parameters, started):
+        self._sql = sql
+        self._params = parameters
+        self._elapsed = time.perf_counter() - started
+        self._rows = 0
+
+    def _fetched(self, started, rows):
+        if self._sql is not None:
+            self._elapsed += time.perf_counter() - started
+            self._rows += rows
+
+    def _finish(self):
+        if self._sql is None:
+            return
+        sql, params, ms = self._sql, self._params, self._elapsed * 1000
+        self._sql = None
+        diagnostics.statement(sql, ms, self._rows)
+        if ms >= diagnostics.slow_query_ms:
+            plan = query_plan(self.connection, sql, params) if params is not None else None
+            diagnostics.slow_query(sql, params or (), ms, plan)
+
+
+class TracedConnection(sqlite3.Connection):
+    # The C implementations of Connection.execute() and friends create a
+    # plain cursor without calling cursor(), so they are routed through it.
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
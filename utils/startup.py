@@ -0,0 +1,28 @@
+import sys
+import time
+
+WATCHED_MODULES = ('matplotlib', 'numpy')
+
+
+class StartupProfile:
+    def __init__(self, started=None):
+        self.started = time.perf_counter() if started is None else started
+        self.last = self.started
+        self.phases = []
+        self.finished = False
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last))
+        self.last = now
+
+    def elapsed(self):
+        return self.last - self.started
+
+    def report(self, stream=None):
+        stream = stream or sys.stdout
+        for name, seconds in self.phases:
+            print(f'{name:<28} {seconds * 1000:9.1f} ms', file=stream)
+        print(f"{'total':<28} {self.elapsed() * 1000:9.1f} ms", file=stream)
+        loaded = [name for name in WATCHED_MODULES if name in sys.modules]
+        print(f"heavy modules loaded: {', '.join(loaded) or 'none'}", file=stream)